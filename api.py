@@ -0,0 +1,240 @@
+"""Request parsing, validation and response bodies shared by ``app.py`` (Flask) and ``asgi_app.py`` (Quart).
+
+The apps only fetch what a route needs, blocking or awaited, and wrap the
+bodies built here in their framework's responses. Invalid requests raise
+``ApiError``, which both apps answer as ``{"error": message}`` with its
+status, so the two serving modes cannot drift apart.
+"""
+import math
+
+import catalog_export
+import config
+from image_index import parse_product_id
+from sale_insight import CAMPAIGN_STRATEGIES, SalesTable
+from seo_audit import SeoAuditor, competitor_analysis, keyword_analysis, seo_engine
+
+
+class ApiError(Exception):
+    """Error answered to the client as ``{"error": message}`` with HTTP ``status``."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def to_dict(self):
+        return {"error": self.message}
+
+
+def synced(snapshot, source):
+    """Return ``snapshot``; raise a 503 ApiError when ``source`` has no snapshot (or view) yet."""
+    if not snapshot:
+        raise ApiError(f"No {source} snapshot yet, the first sync has not finished", 503)
+    return snapshot
+
+
+def product_dicts(catalog):
+    return (product.to_dict() for product in catalog.data)
+
+
+def high_sales_not_in_stock(product_index):
+    high_sales_not_in_stock, data_age = product_index.get_high_sales_not_in_stock()
+    return {
+        "products": high_sales_not_in_stock,
+        "data_age": data_age
+    }
+
+
+def audit_rules(args):
+    """The SEO rules selected by ``?rules=a,b`` of a single product audit, or None for all."""
+    rules = args.get('rules')
+    rules = rules.split(',') if rules else None
+    try:
+        seo_engine.select(rules)
+    except ValueError as e:
+        raise ApiError(str(e))
+    return rules
+
+
+def product_info(product_id, seo_info):
+    seo_info['competitor_analysis'] = competitor_analysis(product_id)
+    seo_info['top_keyword_analysis'] = keyword_analysis()
+    return seo_info
+
+
+def similar_images_params(product_id, args):
+    """``(product_id, distance, limit)`` of a similar images request."""
+    try:
+        product_id = parse_product_id(product_id)
+        distance = int(args.get('distance', config.IMAGE_SIMILAR_DISTANCE))
+        limit = int(args.get('limit', 50))
+    except ValueError:
+        raise ApiError("product_id, distance and limit must be integers")
+    if not 0 <= distance <= 64:
+        raise ApiError("distance must be between 0 and 64")
+    return product_id, distance, limit
+
+
+def similar_images(image_index, scheduler, product_id, args):
+    """Catalog products whose main image is the same as or close to this product's.
+
+    ``distance`` is the largest Hamming distance (of 64 bits) between the
+    perceptual hashes that still counts as similar.
+    """
+    if image_index is None:
+        raise ApiError("The image index is disabled; set IMAGE_INDEX_ENABLED=true to enable it", 404)
+    product_id, distance, limit = similar_images_params(product_id, args)
+
+    scheduler.start()
+    similar = image_index.similar_to(product_id, distance, limit)
+    if similar is None:
+        synced(scheduler.snapshot("images"), "images")
+        raise ApiError(f"Product {product_id} has no indexed image", 404)
+
+    image_src, phash, matches = similar
+    return {
+        "product_id": product_id,
+        "image_src": image_src,
+        "phash": phash,
+        "distance": distance,
+        "similar": matches
+    }
+
+
+def wants_catalog_audit(payload):
+    return bool(payload.get('catalog'))
+
+
+def seo_audit(payload, catalog=None, executor=None):
+    """``(auditor, product_ids)`` of a batch SEO audit.
+
+    ``catalog`` is the catalog snapshot, fetched by the app when
+    ``wants_catalog_audit(payload)``; ``executor`` is passed to the
+    ``SeoAuditor`` of the blocking app.
+    """
+    if wants_catalog_audit(payload):
+        product_ids = [product.product_id for product in synced(catalog, "catalog").data]
+    elif isinstance(payload.get('product_ids'), list):
+        product_ids = payload['product_ids']
+    else:
+        raise ApiError("Provide a list of product_ids or catalog: true")
+
+    rules = payload.get('rules')
+    try:
+        seo_engine.select(rules)
+        SeoAuditor.check_product_ids(product_ids)
+        auditor = SeoAuditor(executor, workers=payload.get('workers'), rules=rules)
+    except ValueError as e:
+        raise ApiError(str(e))
+    return auditor, product_ids
+
+
+class CampaignRequest:
+    """Parameters of a campaign recommendation request."""
+
+    def __init__(self, args):
+        self.ranges = args.get('range', 'last_7_days').split(',')
+        self.dates = {key: args[key] for key in ('start_date', 'end_date') if key in args}
+        self.strategy = args.get('strategy', 'above_mean')
+        self.metric = args.get('metric', 'conversion_rate')
+        if self.strategy not in CAMPAIGN_STRATEGIES:
+            raise ApiError(f"Unknown campaign strategy: {self.strategy}")
+        if self.metric not in SalesTable.METRIC_KEYS:
+            raise ApiError(f"Unknown metric: {self.metric}")
+
+        self.params = {}
+        if 'k' in args:
+            self.params['k'] = _parse(int, args['k'], "k must be an integer")
+        if 'percentile' in args:
+            percentile = _parse(float, args['percentile'], "percentile must be a number between 0 and 100")
+            if not 0 <= percentile <= 100:
+                raise ApiError("percentile must be a number between 0 and 100")
+            self.params['percentile'] = percentile
+        if 'z' in args:
+            z = _parse(float, args['z'], "z must be a number")
+            if not math.isfinite(z):
+                raise ApiError("z must be a number")
+            self.params['z'] = z
+
+    @property
+    def synced(self):
+        """Whether the requested reports are in the "sales" snapshot; custom date ranges are not synced."""
+        return not self.dates and set(self.ranges) <= set(config.SYNC_SALES_RANGES)
+
+    def snapshot_reports(self, sales):
+        return {report_range: synced(sales, "sales").data[report_range] for report_range in self.ranges}
+
+    def suggestions(self, sales_reports):
+        campaign_suggestions = {
+            report_range: sales_report.suggest_campaigns(self.strategy, self.metric, **self.params)
+            for report_range, sales_report in sales_reports.items()
+        }
+        if len(self.ranges) == 1:
+            return {"campaign_suggestions": campaign_suggestions[self.ranges[0]]}
+        return {"campaign_suggestions": campaign_suggestions}
+
+
+def _parse(cast, value, message):
+    """``cast(value)``, raising an ApiError with ``message`` instead of the parser's own error."""
+    try:
+        return cast(value)
+    except ValueError:
+        raise ApiError(message)
+
+
+def inventory_since(args):
+    try:
+        return int(args.get('since', 0))
+    except ValueError:
+        raise ApiError("since must be an inventory version number")
+
+
+def inventory_changes(inventory, since):
+    """Stock changes after inventory version ``since``, oldest first.
+
+    ``full`` means the change log does not reach back to ``since`` and
+    every current row is returned; store ``version`` for the next call.
+    """
+    version, changes, full = inventory.changes_since(since)
+    return {
+        "version": version,
+        "full": full,
+        "changes": [change.to_dict() for change in changes]
+    }
+
+
+def wants_fresh_export(args):
+    return args.get('fresh', 'false').lower() == 'true'
+
+
+def export_catalog(products, product_index, args):
+    """``(chunks, mimetype, headers)`` of a catalog export, see ``catalog_export.export_catalog``.
+
+    ``format`` is ndjson (default), csv, arrow (IPC stream) or parquet and
+    ``fields`` a comma-separated projection.
+    """
+    fields = args.get('fields')
+    try:
+        chunks, mimetype, extension = catalog_export.export_catalog(
+            products, product_index, args.get('format', 'ndjson'), fields.split(',') if fields else None)
+    except ValueError as e:
+        raise ApiError(str(e))
+    return chunks, mimetype, {'Content-Disposition': f'attachment; filename=catalog.{extension}'}
+
+
+def sync_sources(scheduler, source):
+    """The sources of ``POST /api/sync/<source>``: None for ``all``."""
+    if source != 'all' and source not in scheduler.jobs:
+        raise ApiError(f"Unknown source: {source}", 404)
+    return None if source == 'all' else [source]
+
+
+def sync_wait(args):
+    return args.get('wait', 'false').lower() == 'true'
+
+
+def sync_status(scheduler, sources, wait, finished):
+    """``(body, status)`` answering a sync request; 200 once a waited for sync finished, else 202."""
+    status = scheduler.get_status()
+    body = {name: status[name] for name in (sources or status)}
+    return body, 200 if wait and finished else 202
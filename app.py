@@ -1,151 +1,225 @@
-from flask import Flask, jsonify
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
-from digikala_order_history import DigikalaOrderHistory
+import api
+import config
+import http_encoding
+import metrics
 from digikala_inventory import DigikalaInventory
 from sale_insight import DigikalaSalesReport
-from digikala_product import DigikalaProduct
+from image_index import CatalogImageIndex
+from order_store import OrderCountStore
+from product_index import ProductIndex
+from rate_limiter import get_rate_limiter
+from response_cache import ResponseCache, create_backend
+from scheduler import create_scheduler
 from seller_products import SellerProducts
+from seo_audit import audit_product
+
+logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+
+
+class JSONProvider(http_encoding.FastJSONProvider, DefaultJSONProvider):
+    pass
+
 
 app = Flask(__name__)
+app.json = JSONProvider(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# Shared pool for upstream calls that a single request can run in parallel
+executor = ThreadPoolExecutor(max_workers=config.FETCH_WORKERS)
 
-def extract_image_url(url):
-    end_pos = url.find('.jpg') + len('.jpg')
-    return url[:end_pos]
+# Incremental per-day order counts; set ORDER_STORE_PATH to an empty string to disable
+order_store = OrderCountStore() if config.ORDER_STORE_PATH else None
 
+# Catalog, stock and sales joined by product_id
+product_index = ProductIndex()
 
-@app.route('/api/products', methods=['GET'])
-def get_product_list():
-    seller_product = SellerProducts(None)  # Initialize with no specific ID for listing
-    seller_products = seller_product.get_and_parse_products()
+# Warehouse stock indexed by product_id, with a log of the rows each sync changed
+inventory = DigikalaInventory()
 
-    inventory = DigikalaInventory()
-    products_with_stock = inventory.extract_product_ids_from_stock()
+# Perceptual hashes of the catalog's main images; off unless IMAGE_INDEX_ENABLED=true, as it downloads them all
+image_index = CatalogImageIndex() if config.IMAGE_INDEX_ENABLED else None
 
-    return jsonify({"products": seller_products})
+# Background sync of catalog, inventory, orders, sales reports and images; routes read its snapshots
+scheduler = create_scheduler(order_store, product_index, inventory, image_index)
 
+response_cache = ResponseCache(create_backend())
+
+metrics.register_app_collectors(product_index, response_cache, scheduler, image_index)
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe_http(request.url_rule and request.url_rule.rule, request.method, response.status_code,
+                             time.perf_counter() - started)
+    return response
+
+
+@app.after_request
+def encode_response(response):
+    return http_encoding.finalize(response, request)
+
+
+def stream_json_list(key, items):
+    """Stream ``{key: [...items]}`` as chunked JSON without building the list.
+
+    The first item is pulled before the response starts, so upstream errors
+    on the first page still fail the request instead of truncating the body.
+    """
+    items = iter(items)
+    first = next(items, None)
+
+    def generate():
+        yield f'{{"{key}": ['.encode()
+        if first is not None:
+            yield http_encoding.dumps(first)
+            for item in items:
+                yield b',' + http_encoding.dumps(item)
+        yield b']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def latest_snapshot(source):
+    """Latest snapshot of ``source``, waiting for the first sync after startup; None if it never came."""
+    scheduler.start()
+    return scheduler.wait_for(source, config.SNAPSHOT_READY_TIMEOUT)
+
+
+def product_index_ready():
+    scheduler.start()
+    return api.synced(product_index.wait_ready(config.SNAPSHOT_READY_TIMEOUT), "product index")
 
-@app.route('/api/high-sales-products-not-in-stock', methods=['GET'])
-def get_products_not_in_stock():
-    # Fetch products with stock data
-    inventory = DigikalaInventory()
-    inventory.fetch_inventory_data()
-    products_with_stock = inventory.extract_product_ids_from_stock()
-    print("Products with warehouse stock >= 0: ", products_with_stock)
 
-    # Fetch all products
-    seller_product = SellerProducts()  # Initialize SellerProduct
-    all_products = seller_product.get_and_parse_products()  # Get the list of all products
-    print("All products: ", all_products)
+@app.errorhandler(api.ApiError)
+def api_error(e):
+    return jsonify(e.to_dict()), e.status
 
-    # Identify products not in stock
-    products_not_in_stock = [product for product in all_products if product['product_id'] not in products_with_stock]
-    print("Products not in stock: ", products_not_in_stock)
 
-    # Fetch high sales products
-    order_history = DigikalaOrderHistory()
-    high_sales_products = order_history.get_high_sales_products()
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness check for the load balancer; never calls upstream."""
+    return jsonify({"status": "ok"})
 
-    # Filter products not in stock to include only those in high sales
-    high_sales_not_in_stock = [product for product in products_not_in_stock if product['product_id'] in high_sales_products]
-    print("High sales products not in stock: ", high_sales_not_in_stock)
 
-    return jsonify({
-        "products": high_sales_not_in_stock
-    })
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/products', methods=['GET'])
+@response_cache.cached(*config.CACHE_TTL_PRODUCTS)
+def get_product_list():
+    catalog = api.synced(latest_snapshot("catalog"), "catalog")
+    return stream_json_list("products", api.product_dicts(catalog))
+
+
+@app.route('/api/high-sales-products-not-in-stock', methods=['GET'])
+@response_cache.cached(*config.CACHE_TTL_HIGH_SALES)
+def get_products_not_in_stock():
+    product_index_ready()
+    return jsonify(api.high_sales_not_in_stock(product_index))
 
 
 @app.route('/api/product/<product_id>', methods=['GET'])
+@response_cache.cached(*config.CACHE_TTL_PRODUCT)
 def get_product_info(product_id):
-    product = DigikalaProduct(product_id)
-    product.fetch_product_data()
-    product.fetch_product_edit_data()
-    product_info = product.extract_product_info()
-
-    # Collecting the information
-    seo_info = {
-        'title_emoji': product.check_emojies(),
-        'title_length_valid': product.is_title_length_valid(),
-        'white_background': product.is_white_background(),
-        'image_size_valid': product.is_image_size_valid(),
-        'seven_or_more_images': product.has_seven_or_more_images(),
-        'video_content': product.has_video_content(),
-        'long_description': product.has_long_description(),
-        'at_least_five_attributes': product.has_at_least_five_attributes(),
-        'main_image_link': extract_image_url(product_info.get('productImage', 'Not available')),
-        'product_title': product_info.get('name', 'Not available')
-    }
-
-    # Competitor analysis
-    competitor_analysis = {
-        "Sales": {
-            "product_id": product_id,
-            "value": 76953,
-            "top_5_competitors_avg": 52907
-        },
-        "Revenue": {
-            "product_id": product_id,
-            "value": 768760.47,
-            "top_5_competitors_avg": 531363.81
-        },
-        "Price": {
-            "product_id": product_id,
-            "value": 9.99,
-            "top_5_competitors_avg": 10.97
-        },
-        "BSR": {
-            "product_id": product_id,
-            "value": 106,
-            "top_5_competitors_avg": 1283
-        },
-        "Number of Reviews": {
-            "product_id": product_id,
-            "value": 2250,
-            "top_5_competitors_avg": 43525
-        },
-        "Rating": {
-            "product_id": product_id,
-            "value": 4.4,
-            "top_5_competitors_avg": 4.5
-        }
-    }
-    seo_info['competitor_analysis'] = competitor_analysis
-
-    # Keyword analysis
-    top_keyword_analysis = {
-        "total_keywords": 5451,
-        "top_10_keywords": 877,
-        "total_search_volume": 6491241,
-        "top_10_search_volume": 1905035
-    }
-
-    seo_info['top_keyword_analysis'] = top_keyword_analysis
-
-    # Calculate score and percentage
-    boolean_checks = [v for v in seo_info.values() if isinstance(v, bool)]
-    total_checks = len(boolean_checks)
-    score = sum(1 for value in boolean_checks if value)
-    score_percent = (score / total_checks) * 100 if total_checks > 0 else 0
-
-    # Add the score and percentage to the result
-    seo_info['score'] = score
-    seo_info['score_percent'] = score_percent
-
-    return jsonify(seo_info)
+    seo_info = audit_product(product_id, executor, api.audit_rules(request.args))
+    return jsonify(api.product_info(product_id, seo_info))
+
+
+@app.route('/api/product/<product_id>/similar-images', methods=['GET'])
+def get_similar_images(product_id):
+    return jsonify(api.similar_images(image_index, scheduler, product_id, request.args))
+
+
+@app.route('/api/products/seo-audit', methods=['POST'])
+def audit_products():
+    payload = request.get_json(silent=True) or {}
+    catalog = latest_snapshot("catalog") if api.wants_catalog_audit(payload) else None
+    auditor, product_ids = api.seo_audit(payload, catalog, executor)
+    return Response(stream_with_context(auditor.iter_ndjson(product_ids)), mimetype='application/x-ndjson')
 
 
 @app.route('/api/campaign-recommendation', methods=['GET'])
+@response_cache.cached(*config.CACHE_TTL_CAMPAIGNS)
 def get_sales_report():
-    api_url = "https://sandbox.diginext.ir/api/v3/insight/sales-reports?range=last_7_days"
-    sales_report = DigikalaSalesReport(api_url)
-    sales_report.fetch_sales_report()
+    campaigns = api.CampaignRequest(request.args)
+    if campaigns.synced:
+        sales_reports = campaigns.snapshot_reports(latest_snapshot("sales"))
+    else:
+        sales_reports = DigikalaSalesReport.fetch_ranges(campaigns.ranges, executor, **campaigns.dates)
+    return jsonify(campaigns.suggestions(sales_reports))
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(response_cache.get_stats())
+
+
+@app.route('/api/inventory/changes', methods=['GET'])
+def get_inventory_changes():
+    since = api.inventory_since(request.args)
+    api.synced(latest_snapshot("inventory"), "inventory")
+    return jsonify(api.inventory_changes(inventory, since))
+
+
+@app.route('/api/export', methods=['GET'])
+def export_products():
+    """Stream the whole catalog joined with warehouse stock and sales counts.
+
+    ``fresh=true`` walks the catalog from Diginext page by page instead of
+    the latest snapshot; see ``api.export_catalog`` for the other parameters.
+    """
+    if api.wants_fresh_export(request.args):
+        scheduler.start()
+        products = SellerProducts().iter_records()
+    else:
+        products = api.synced(latest_snapshot("catalog"), "catalog").data
+    chunks, mimetype, headers = api.export_catalog(products, product_index, request.args)
+
+    product_index_ready()
+    # Pull the first chunk before responding, so a failing first catalog page still fails the request
+    first = next(chunks, b'')
+    return Response(stream_with_context(chain([first], chunks)), mimetype=mimetype, headers=headers)
+
+
+@app.route('/api/sync/status', methods=['GET'])
+def get_sync_status():
+    return jsonify(scheduler.get_status())
+
+
+@app.route('/api/sync/<source>', methods=['POST'])
+def refresh_source(source):
+    """Sync one source (or ``all``) now; ``?wait=true`` answers once the new snapshot is published."""
+    sources = api.sync_sources(scheduler, source)
+    wait = api.sync_wait(request.args)
+    finished = scheduler.refresh(sources, wait=wait, timeout=config.SNAPSHOT_READY_TIMEOUT)
+    body, status = api.sync_status(scheduler, sources, wait, finished)
+    return jsonify(body), status
+
 
-    high_conversion_campaigns = sales_report.suggest_campaigns()
-    return jsonify({"campaign_suggestions": high_conversion_campaigns})
+@app.route('/api/rate-limit/stats', methods=['GET'])
+def get_rate_limit_stats():
+    return jsonify(get_rate_limiter().get_stats())
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
-    # app.run(debug=True)
+    # Development server only; production runs gunicorn with gunicorn.conf.py
+    app.run(host='0.0.0.0', port=5000, debug=config.FLASK_DEBUG)
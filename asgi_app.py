@@ -0,0 +1,262 @@
+"""Async (ASGI) serving mode: the same routes and JSON shapes as ``app.py`` on Quart.
+
+Request parsing, validation and response bodies are shared with
+``app.py`` through ``api``; the routes here only fetch and await. Upstream
+calls go through the non-blocking ``AsyncDiginextClient``, so a request
+waiting on Diginext holds no worker thread. The background sync jobs run
+in their own threads with the blocking client, as in ``app.py``. Run it
+with an ASGI server, e.g.::
+
+    hypercorn asgi_app:app --bind 0.0.0.0:5000
+
+The response cache is tied to Flask and is not used in this mode, so there
+is no ``/api/cache/stats`` route.
+"""
+import asyncio
+import logging
+import time
+from itertools import chain
+
+from quart import Quart, Response, g, jsonify, request
+from quart.json.provider import DefaultJSONProvider
+from quart_cors import cors
+
+import api
+import config
+import http_encoding
+import metrics
+from digikala_inventory import DigikalaInventory
+from diginext_client import close_async_client
+from image_index import CatalogImageIndex
+from order_store import OrderCountStore
+from product_index import ProductIndex
+from rate_limiter import get_rate_limiter
+from sale_insight import DigikalaSalesReport
+from scheduler import create_scheduler
+from seller_products import SellerProducts
+from seo_audit import aaudit_product
+
+logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+
+
+class JSONProvider(http_encoding.FastJSONProvider, DefaultJSONProvider):
+    pass
+
+
+app = Quart(__name__)
+app.json = JSONProvider(app)
+app = cors(app, allow_origin="*")
+# Catalog-wide streams (product list, batch audits) may take longer than Quart's 60s default
+app.config['RESPONSE_TIMEOUT'] = None
+
+# Incremental per-day order counts; set ORDER_STORE_PATH to an empty string to disable
+order_store = OrderCountStore() if config.ORDER_STORE_PATH else None
+
+# Catalog, stock and sales joined by product_id
+product_index = ProductIndex()
+
+# Warehouse stock indexed by product_id, with a log of the rows each sync changed
+inventory = DigikalaInventory()
+
+# Perceptual hashes of the catalog's main images; off unless IMAGE_INDEX_ENABLED=true, as it downloads them all
+image_index = CatalogImageIndex() if config.IMAGE_INDEX_ENABLED else None
+
+# Background sync of catalog, inventory, orders, sales reports and images (threads); routes read its snapshots
+scheduler = create_scheduler(order_store, product_index, inventory, image_index)
+
+metrics.register_app_collectors(product_index, scheduler=scheduler, image_index=image_index)
+
+
+@app.before_request
+async def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+async def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe_http(request.url_rule and request.url_rule.rule, request.method, response.status_code,
+                             time.perf_counter() - started)
+    return response
+
+
+@app.after_request
+async def encode_response(response):
+    return await http_encoding.afinalize(response, request)
+
+
+@app.after_serving
+async def shutdown():
+    scheduler.stop()
+    await close_async_client()
+
+
+async def aiter_items(items):
+    for item in items:
+        yield item
+
+
+async def stream_json_list(key, items):
+    """Async version of ``app.stream_json_list`` over an async iterator of items."""
+    first = await anext(items, None)
+
+    async def generate():
+        yield f'{{"{key}": ['.encode()
+        if first is not None:
+            yield http_encoding.dumps(first)
+            async for item in items:
+                yield b',' + http_encoding.dumps(item)
+        yield b']}'
+
+    return Response(generate(), mimetype='application/json')
+
+
+async def aiter_in_thread(iterator):
+    """Yield from a blocking iterator, producing each item in a worker thread."""
+    done = object()
+    while (item := await asyncio.to_thread(next, iterator, done)) is not done:
+        yield item
+
+
+def iter_from_loop(aiterator, loop):
+    """Blocking iterator over an async iterator that runs on ``loop``; for code in a worker thread."""
+    done = object()
+    try:
+        while (item := asyncio.run_coroutine_threadsafe(anext(aiterator, done), loop).result()) is not done:
+            yield item
+    finally:
+        asyncio.run_coroutine_threadsafe(aiterator.aclose(), loop)
+
+
+async def latest_snapshot(source):
+    """Async version of ``app.latest_snapshot``; only waits in a thread before the first sync."""
+    scheduler.start()
+    snapshot = scheduler.snapshot(source)
+    if snapshot is None:
+        snapshot = await asyncio.to_thread(scheduler.wait_for, source, config.SNAPSHOT_READY_TIMEOUT)
+    return snapshot
+
+
+async def product_index_ready():
+    scheduler.start()
+    return api.synced(await asyncio.to_thread(product_index.wait_ready, config.SNAPSHOT_READY_TIMEOUT),
+                      "product index")
+
+
+@app.errorhandler(api.ApiError)
+async def api_error(e):
+    return jsonify(e.to_dict()), e.status
+
+
+@app.route('/healthz', methods=['GET'])
+async def healthz():
+    """Liveness check for the load balancer; never calls upstream."""
+    return jsonify({"status": "ok"})
+
+
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/products', methods=['GET'])
+async def get_product_list():
+    catalog = api.synced(await latest_snapshot("catalog"), "catalog")
+    return await stream_json_list("products", aiter_items(api.product_dicts(catalog)))
+
+
+@app.route('/api/high-sales-products-not-in-stock', methods=['GET'])
+async def get_products_not_in_stock():
+    await product_index_ready()
+    return jsonify(api.high_sales_not_in_stock(product_index))
+
+
+@app.route('/api/product/<product_id>', methods=['GET'])
+async def get_product_info(product_id):
+    seo_info = await aaudit_product(product_id, api.audit_rules(request.args))
+    return jsonify(api.product_info(product_id, seo_info))
+
+
+@app.route('/api/product/<product_id>/similar-images', methods=['GET'])
+async def get_similar_images(product_id):
+    return jsonify(api.similar_images(image_index, scheduler, product_id, request.args))
+
+
+@app.route('/api/products/seo-audit', methods=['POST'])
+async def audit_products():
+    payload = await request.get_json(silent=True) or {}
+    catalog = await latest_snapshot("catalog") if api.wants_catalog_audit(payload) else None
+    auditor, product_ids = api.seo_audit(payload, catalog)
+    return Response(auditor.aiter_ndjson(product_ids), mimetype='application/x-ndjson')
+
+
+@app.route('/api/campaign-recommendation', methods=['GET'])
+async def get_sales_report():
+    campaigns = api.CampaignRequest(request.args)
+    if campaigns.synced:
+        sales_reports = campaigns.snapshot_reports(await latest_snapshot("sales"))
+    else:
+        sales_reports = await DigikalaSalesReport.afetch_ranges(campaigns.ranges, **campaigns.dates)
+    return jsonify(campaigns.suggestions(sales_reports))
+
+
+@app.route('/api/inventory/changes', methods=['GET'])
+async def get_inventory_changes():
+    since = api.inventory_since(request.args)
+    api.synced(await latest_snapshot("inventory"), "inventory")
+    return jsonify(api.inventory_changes(inventory, since))
+
+
+@app.route('/api/export', methods=['GET'])
+async def export_products():
+    """Async version of ``app.export_products``; every chunk is joined and encoded in a worker thread.
+
+    With ``fresh=true`` the catalog pages are fetched on the event loop
+    and the worker thread takes their records as it needs them.
+    """
+    if api.wants_fresh_export(request.args):
+        scheduler.start()
+        pages = iter_from_loop(SellerProducts().aiter_record_pages(), asyncio.get_running_loop())
+        products = chain.from_iterable(pages)
+    else:
+        products = api.synced(await latest_snapshot("catalog"), "catalog").data
+    chunks, mimetype, headers = api.export_catalog(products, product_index, request.args)
+
+    await product_index_ready()
+    first = await asyncio.to_thread(next, chunks, b'')
+
+    async def generate():
+        yield first
+        async for chunk in aiter_in_thread(chunks):
+            yield chunk
+
+    return Response(generate(), mimetype=mimetype, headers=headers)
+
+
+@app.route('/api/sync/status', methods=['GET'])
+async def get_sync_status():
+    return jsonify(scheduler.get_status())
+
+
+@app.route('/api/sync/<source>', methods=['POST'])
+async def refresh_source(source):
+    """Sync one source (or ``all``) now; ``?wait=true`` answers once the new snapshot is published."""
+    sources = api.sync_sources(scheduler, source)
+    wait = api.sync_wait(request.args)
+    if wait:
+        finished = await asyncio.to_thread(scheduler.refresh, sources, True, config.SNAPSHOT_READY_TIMEOUT)
+    else:
+        finished = scheduler.refresh(sources)
+    body, status = api.sync_status(scheduler, sources, wait, finished)
+    return jsonify(body), status
+
+
+@app.route('/api/rate-limit/stats', methods=['GET'])
+async def get_rate_limit_stats():
+    return jsonify(get_rate_limiter().get_stats())
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,75 @@
+"""Catalog export throughput and peak memory per format, vs. building the joined catalog as one JSON document.
+
+The catalog and the product index are synthetic, so only joining and
+encoding are measured. The streamed formats hold one batch (a row group
+for Parquet) at a time; the baseline builds every joined row as a dict and
+serializes the whole list, as a client joining ``/api/products`` with the
+other endpoints would. Run from the repository root:
+
+    python benchmarks/bench_export.py --products 100000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog_export  # noqa: E402
+from http_encoding import dumps  # noqa: E402
+from product_index import ProductIndex  # noqa: E402
+from records import ProductRecord, StockChange  # noqa: E402
+
+
+def catalog(products):
+    items = ({
+        "product_id": index, "title": f"Product {index} with a reasonably long catalog title", "active": True,
+        "brand_id": index % 300, "brand_title_en": "Brand", "variants_count": index % 5,
+        "product_url": f"/product/dkp-{index}/", "image_src": f"https://img/{index}.jpg",
+        "moderation_status": {"title": "approved"}, "status_data": {"code": 1},
+    } for index in range(1, products + 1))
+    return [ProductRecord.from_item(item, {"moderation_status": lambda item: item["moderation_status"]["title"]})
+            for item in items]
+
+
+def materialized(products, index):
+    rows = [dict(zip(catalog_export.EXPORT_FIELDS, row))
+            for row in catalog_export.iter_rows(products, index, catalog_export.EXPORT_FIELDS)]
+    return [dumps(rows)]
+
+
+def measure(name, export):
+    """Wall time of one export, then the peak traced memory of another (pyarrow's own buffers are not traced)."""
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in export())
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    for _ in export():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<12} {elapsed:7.2f}s {size / 2 ** 20:9.1f} MiB out {peak / 2 ** 20:9.1f} MiB peak")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    args = parser.parse_args()
+
+    products = catalog(args.products)
+    index = ProductIndex()
+    index.apply_stock_changes([StockChange(1, product.product_id, None, product.product_id % 7)
+                               for product in products])
+    index.update_sales({product.product_id: product.product_id % 40 for product in products[::3]})
+
+    measure("materialized", lambda: materialized(products, index))
+    for fmt, (writer, _, _) in catalog_export.EXPORT_FORMATS.items():
+        if writer is None:
+            print(f"{fmt:<12} skipped, pyarrow is not installed")
+            continue
+        measure(fmt, lambda: catalog_export.export_catalog(products, index, fmt)[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Cost of one inventory poll in the product index: full stock replacement vs. applying the diff.
+
+Each poll changes ``--churn`` of the rows. The full path rebuilds the
+``{product_id: stock}`` map and compares every entry of the product
+index with it, as the index did before inventory deltas; the delta path
+diffs the poll in ``DigikalaInventory`` and applies only the changed
+rows. Run from the repository root:
+
+    python benchmarks/bench_inventory_delta.py --products 100000 --churn 0.01 --polls 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from digikala_inventory import DigikalaInventory  # noqa: E402
+from product_index import ProductIndex  # noqa: E402
+from records import InventoryRow  # noqa: E402
+
+
+def polls(products, churn, count):
+    """``count`` inventory responses; each one moves a different ``churn`` slice of the stock."""
+    period = max(round(1 / churn), 1)
+    for poll in range(count):
+        items = [{"product_id": index, "warehouse_stock": index % 17} for index in range(products)]
+        for item in items[poll % period::period]:
+            item["warehouse_stock"] = poll % 2 * (item["product_id"] % 17 + 1)
+        yield items
+
+
+def full(index, inventory, items):
+    rows = (InventoryRow.from_item(item) for item in items)
+    stock = {row.product_id: row.warehouse_stock or 0 for row in rows}
+    changed = set()
+    with index._lock:
+        for product_id, warehouse_stock in stock.items():
+            entry = index._entry(product_id)
+            if entry.warehouse_stock != warehouse_stock:
+                entry.warehouse_stock = warehouse_stock
+                changed.add(product_id)
+        for product_id, entry in index.entries.items():
+            if product_id not in stock and entry.warehouse_stock:
+                entry.warehouse_stock = 0
+                changed.add(product_id)
+        index._reevaluate(changed)
+
+
+def delta(index, inventory, items):
+    index.apply_stock_changes(inventory.apply(items))
+
+
+def measure(name, func, args):
+    index, inventory = ProductIndex(), DigikalaInventory()
+    timings = []
+    for items in polls(args.products, args.churn, args.polls + 1):
+        started = time.perf_counter()
+        func(index, inventory, items)
+        timings.append(time.perf_counter() - started)
+    # The first poll loads the whole inventory in both paths
+    timings = timings[1:]
+    print(f"{name:<6} mean={statistics.mean(timings) * 1000:8.1f}ms p50={statistics.median(timings) * 1000:8.1f}ms "
+          f"max={max(timings) * 1000:8.1f}ms")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--churn", type=float, default=0.01, help="fraction of rows changed per poll")
+    parser.add_argument("--polls", type=int, default=20)
+    args = parser.parse_args()
+
+    full_index = measure("full", full, args)
+    delta_index = measure("delta", delta, args)
+    stock = {product_id: entry.warehouse_stock for product_id, entry in full_index.entries.items()}
+    assert stock == {product_id: entry.warehouse_stock for product_id, entry in delta_index.entries.items()}
+
+
+if __name__ == "__main__":
+    main()
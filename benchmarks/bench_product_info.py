@@ -0,0 +1,66 @@
+"""Latency of /api/product/<id>: serial upstream calls vs. the concurrent path.
+
+Run from the repository root:
+
+    python benchmarks/bench_product_info.py --latency 0.1 --runs 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubDiginext  # noqa: E402
+
+
+def serial(product):
+    product.fetch_product_data()
+    product.fetch_product_edit_data()
+    product.run_image_checks()
+
+
+def measure(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:<12} mean={statistics.mean(timings) * 1000:8.1f}ms "
+          f"p50={statistics.median(timings) * 1000:8.1f}ms max={max(timings) * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="stub latency per upstream call (s)")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with StubDiginext(latency=args.latency) as stub:
+        os.environ["DIGINEXT_BASE_URL"] = stub.base_url
+
+        from diginext_client import DiginextClient
+        from digikala_product import DigikalaProduct
+        from seo_audit import seo_engine
+        import app
+
+        client = DiginextClient(base_url=stub.base_url)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            report("serial", measure(lambda: serial(DigikalaProduct("dkp-1", client=client)), args.runs))
+            report("concurrent", measure(
+                lambda: seo_engine.evaluate(DigikalaProduct("dkp-1", client=client), executor=executor), args.runs))
+
+        # A new product id per run so the response cache never answers
+        test_client = app.app.test_client()
+        product_ids = iter(range(args.runs))
+        report("route", measure(lambda: test_client.get(f"/api/product/dkp-{next(product_ids)}"), args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Throughput of a wide product fan-out against a rate-limited upstream, with and without the client limiter.
+
+Without a client-side rate the fan-out overruns the upstream limit, gets
+429s and stalls on every Retry-After; with the limiter set just under
+the upstream limit requests are spread out instead, and a limiter set
+too high backs off after the first 429s. Run from the
+repository root:
+
+    python benchmarks/bench_rate_limiter.py --upstream-limit 50 --products 300 --workers 32
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubDiginext  # noqa: E402
+from diginext_client import DiginextClient  # noqa: E402
+from rate_limiter import RateLimiter  # noqa: E402
+
+
+def fetch_all(client, product_ids, workers):
+    def fetch(product_id):
+        return client.get(f"product-creation/be-seller/{product_id}", endpoint="product").status_code
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, product_ids))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--upstream-limit", type=int, default=50, help="stub requests/s before 429")
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    runs = [
+        ("unlimited", 0),
+        ("limited", args.upstream_limit * 0.9),
+        # Configured too high: the limiter has to find the upstream rate from the 429s
+        ("adaptive", args.upstream_limit * 2),
+    ]
+    for name, rate in runs:
+        with StubDiginext(latency=args.latency, rate_limit=args.upstream_limit) as stub:
+            limiter = RateLimiter({"default": (rate, 1), "product": (rate, max(int(rate // 10), 1))})
+            client = DiginextClient(base_url=stub.base_url, rate_limiter=limiter, pool_maxsize=args.workers)
+            started = time.perf_counter()
+            statuses = fetch_all(client, range(args.products), args.workers)
+            elapsed = time.perf_counter() - started
+            stats = limiter.get_stats()["product"]
+            print(f"{name:<10} {elapsed:6.2f}s  {statuses.count(200) / elapsed:6.1f} ok/s  "
+                  f"failed={len(statuses) - statuses.count(200)}  upstream 429s={stub.throttled}  "
+                  f"waited={stats['waited']} avg_wait={stats['wait_seconds_avg'] * 1000:.0f}ms "
+                  f"max_wait={stats['wait_seconds_max'] * 1000:.0f}ms")
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
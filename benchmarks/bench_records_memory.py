@@ -0,0 +1,67 @@
+"""Memory held by a parsed catalog: dicts vs. __slots__ records vs. a projection.
+
+Run from the repository root:
+
+    python benchmarks/bench_records_memory.py --products 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import InventoryRow, ProductRecord, record_type  # noqa: E402
+from seller_products import SellerProducts  # noqa: E402
+
+
+def raw_item(index):
+    return {
+        "variants_count": index % 5, "site": "digikala", "title": f"Product title {index}", "status": "active",
+        "product_id": index, "fake": False, "status_data": None, "is_owner": True,
+        "main_category_title": "Mobile", "active": True, "title_fa": f"محصول شماره {index}",
+        "title_en": f"Product {index}", "brand_id": index % 300, "brand_title_en": "Brand",
+        "brand_title_fa": "برند", "product_url": f"/product/dkp-{index}/", "image_src": f"https://img/{index}.jpg",
+        "dimension_level": "B", "brand_title": "Brand", "moderation_status": {"title": "approved"},
+        "adverge_url": None, "warehouse_stock": index % 7,
+    }
+
+
+def measure(build, items):
+    gc.collect()
+    tracemalloc.start()
+    held = build(items)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    args = parser.parse_args()
+
+    items = [raw_item(index) for index in range(args.products)]
+    seller_products = SellerProducts(client=object())
+    projection = record_type("ProductRecord", ("product_id", "title", "image_src"))
+
+    results = {
+        "product dicts": measure(lambda rows: [seller_products.parse_product(item) for item in rows], items),
+        "ProductRecord": measure(
+            lambda rows: [ProductRecord.from_item(item, SellerProducts.FIELD_GETTERS) for item in rows], items),
+        "projected (3 fields)": measure(lambda rows: [projection.from_item(item) for item in rows], items),
+        "inventory dicts": measure(
+            lambda rows: [{"product_id": item["product_id"], "warehouse_stock": item["warehouse_stock"]}
+                          for item in rows], items),
+        "InventoryRow": measure(lambda rows: [InventoryRow.from_item(item) for item in rows], items),
+    }
+
+    print(f"products={args.products}")
+    for name, size in results.items():
+        print(f"{name:<22} {size / 2 ** 20:8.1f} MiB  {size / args.products:6.0f} B/item")
+
+
+if __name__ == "__main__":
+    main()
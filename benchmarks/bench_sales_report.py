@@ -0,0 +1,91 @@
+"""Campaign suggestions: pure-Python loops vs. the sales table and its ranking strategies.
+
+The default above_mean strategy is a single pass over the report items,
+as the pure-Python baseline is; the other strategies rank the columns
+loaded into NumPy.
+
+Run from the repository root:
+
+    python benchmarks/bench_sales_report.py --products 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sale_insight import DigikalaSalesReport  # noqa: E402
+
+
+def report_items(size):
+    return [
+        {
+            "product_id": index,
+            "title": f"Product {index}",
+            "image": f"https://img/{index}.jpg?resize",
+            "conversion_rate": (index * 37 % 1000) / 100,
+            "revenue": index * 7919 % 100000,
+            "units": index * 31 % 500,
+        }
+        for index in range(size)
+    ]
+
+
+def legacy_suggest_campaigns(items):
+    """The previous implementation, kept here only as the benchmark baseline."""
+    average = sum(item.get('conversion_rate', 0) for item in items) / len(items) if items else 0
+    suggestions = []
+    for item in items:
+        if item.get('conversion_rate', 0) > average:
+            suggestions.append({
+                "product_id": item['product_id'],
+                "title": item['title'],
+                "image": DigikalaSalesReport.extract_image_url(item['image']),
+                "conversion_rate": item['conversion_rate'],
+                "avg_conversion_rate": average,
+                "suggested_campaign": f"Campaign for {item['title']}"
+            })
+    return suggestions
+
+
+def timed(func, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = func()
+    return (time.perf_counter() - start) / runs, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    items = report_items(args.products)
+
+    def fresh_report():
+        report = DigikalaSalesReport("unused", client=object())
+        report.data = {"items": [items]}
+        return report
+
+    legacy_time, legacy = timed(lambda: legacy_suggest_campaigns(items), args.runs)
+    report_time, suggested = timed(lambda: fresh_report().suggest_campaigns(), args.runs)
+    assert legacy == suggested
+
+    report = fresh_report()
+    load_time, _ = timed(lambda: fresh_report().table.column("conversion_rate"), args.runs)
+    print(f"products={args.products}")
+    print(f"legacy above_mean          {legacy_time * 1000:8.2f} ms")
+    print(f"report above_mean          {report_time * 1000:8.2f} ms (including table setup)")
+    print(f"columnar column load       {load_time * 1000:8.2f} ms")
+    for strategy, metric, params in (("above_mean", "conversion_rate", {}),
+                                     ("percentile", "revenue", {"percentile": 95}),
+                                     ("zscore", "units", {"z": 1.5}),
+                                     ("top_k", "revenue", {"k": 50})):
+        elapsed, suggestions = timed(lambda: report.suggest_campaigns(strategy, metric, **params), args.runs)
+        print(f"{strategy:<10} {metric:<15} {elapsed * 1000:8.2f} ms  {len(suggestions)} suggestions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Title checks: per-call regex compilation vs. the precompiled single-pass analyzer.
+
+Run from the repository root:
+
+    python benchmarks/bench_title_analyzer.py --titles 100000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from digikala_product import DigikalaProduct  # noqa: E402
+from title_analyzer import analyze_title  # noqa: E402
+
+SAMPLE_TITLES = [
+    "گوشی موبایل سامسونگ مدل Galaxy A54 5G دو سیم کارت ظرفیت 256 گیگابایت و رم 8 گیگابایت",
+    "هدفون بی سیم شیائومی مدل Redmi Buds 4 Lite",
+    "لپ تاپ 15.6 اینچی ایسوس مدل Vivobook 15 X1504VA-NJ816 - i5 1335U 16GB 512SSD",
+    "کتاب ملت عشق اثر الیف شافاک انتشارات ققنوس",
+    "ماگ سرامیکی طرح قلب ❤️ مناسب هدیه",
+    "Apple iPhone 13 CH Dual SIM 128GB And 4GB RAM Mobile Phone",
+    "Xiaomi Mi Band 8 Smart Band - Global Version",
+    "کفش پیاده روی مردانه نایکی مدل Air Zoom Pegasus 40 کد DV3853-001",
+    "ست قابلمه ۱۰ پارچه عروس مدل آرتمیس گرانیتی",
+    "Philips HD9252/90 Essential Airfryer 4.1L, 1400W",
+    "اسباب بازی ساختنی لگو سری Technic مدل 42151 🚀",
+    "شامپو ضد شوره کلیر مردانه حجم ۴۰۰ میلی لیتر",
+    "Logitech MX Master 3S Wireless Performance Mouse (Graphite)",
+    "ساعت هوشمند امیزفیت مدل GTR 4 بند سیلیکونی",
+    "قهوه اسپرسو ۱۰۰٪ عربیکا لاوازا Crema e Aroma یک کیلوگرمی",
+]
+
+
+class _LegacyTitleChecks(DigikalaProduct):
+    """The previous implementation, kept here only as the benchmark baseline."""
+
+    def contains_symbols_or_emojis(self, text):
+        symbol_pattern = re.compile(r'[^\w\s]', re.UNICODE)
+        emoji_pattern = re.compile(
+            "["
+            "\U0001F600-\U0001F64F"
+            "\U0001F300-\U0001F5FF"
+            "\U0001F680-\U0001F6FF"
+            "\U0001F1E0-\U0001F1FF"
+            "\U00002702-\U000027B0"
+            "\U000024C2-\U0001F251"
+            "]+", flags=re.UNICODE)
+        return bool(symbol_pattern.search(text)) or bool(emoji_pattern.search(text))
+
+    def is_title_length_valid(self):
+        product_info = self.extract_product_info()
+        return bool(product_info and len(product_info["name"]) >= 60)
+
+    def check_emojies(self):
+        product_info = self.extract_product_info()
+        return not self.contains_symbols_or_emojis(product_info["name"])
+
+
+def build_corpus(size, seed=0):
+    """Sample titles with random model numbers and the odd emoji so they are not all identical."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        title = rng.choice(SAMPLE_TITLES)
+        if rng.random() < 0.5:
+            title += f" {rng.randint(100, 99999)}"
+        if rng.random() < 0.05:
+            title += rng.choice(" 😀 ✨ ⭐ ! #".split())
+        corpus.append(title)
+    return corpus
+
+
+def run(product_class, corpus):
+    results = []
+    start = time.perf_counter()
+    for title in corpus:
+        product = product_class("dkp-1", client=object())
+        product.product_data = {"name": title}
+        results.append((product.check_emojies(), product.is_title_length_valid()))
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--titles", type=int, default=100000)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.titles)
+    legacy_time, legacy_results = run(_LegacyTitleChecks, corpus)
+    analyzer_time, analyzer_results = run(DigikalaProduct, corpus)
+    assert legacy_results == analyzer_results, "title checks disagree"
+
+    start = time.perf_counter()
+    for title in corpus:
+        analyze_title(title)
+    stats_time = time.perf_counter() - start
+
+    print(f"titles={len(corpus)}")
+    print(f"legacy checks    {legacy_time * 1e6 / len(corpus):8.2f} us/title")
+    print(f"analyzer checks  {analyzer_time * 1e6 / len(corpus):8.2f} us/title")
+    print(f"analyze_title    {stats_time * 1e6 / len(corpus):8.2f} us/title")
+
+
+if __name__ == "__main__":
+    main()
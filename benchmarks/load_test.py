@@ -0,0 +1,157 @@
+"""Load test of the sync (Flask, threaded), async (Quart on Hypercorn) and gunicorn serving modes.
+
+Both servers run as subprocesses against the stub Diginext API, which runs
+in a third process. Every request uses a new product id, so the sync
+mode's response cache never answers and both modes do the same upstream
+work. Run from the repository root:
+
+    python benchmarks/load_test.py --latency 0.05 --concurrency 64 --requests 1000 --modes sync,async,gunicorn
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+
+SERVERS = {
+    "sync": lambda port: [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port),
+                          "--with-threads", "--no-reload", "--no-debugger"],
+    "async": lambda port: [sys.executable, "-m", "hypercorn", "asgi_app:app", "--bind", f"127.0.0.1:{port}"],
+    # Production WSGI setup from gunicorn.conf.py
+    "gunicorn": lambda port: [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise Exception(f"Server exited with status {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise Exception(f"Server on port {port} did not start within {timeout}s")
+
+
+def start(command, env, port):
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, process)
+    except Exception:
+        process.kill()
+        raise
+    return process
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def run_load(base_url, path, requests, concurrency, offset):
+    """Send ``requests`` GETs from ``concurrency`` workers; returns (latencies, errors, elapsed)."""
+    counter = iter(range(offset, offset + requests))
+    latencies = []
+    errors = 0
+
+    async def worker(client):
+        nonlocal errors
+        for n in counter:
+            start_time = time.perf_counter()
+            try:
+                async with client.get(base_url + path.format(n=n)) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start_time)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q / 100), len(values) - 1)] if values else float("nan")
+
+
+def report(mode, latencies, errors, elapsed):
+    print(f"{mode:<8} {len(latencies) / elapsed:8.1f} req/s  "
+          f"mean={statistics.mean(latencies) * 1000 if latencies else float('nan'):8.1f}ms  "
+          f"p50={percentile(latencies, 50) * 1000:8.1f}ms  "
+          f"p99={percentile(latencies, 99) * 1000:8.1f}ms  errors={errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency per upstream call (s)")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent client connections")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per mode")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--path", default="/api/product/dkp-{n}", help="request path; {n} is a unique counter")
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = subprocess.Popen([sys.executable, os.path.join("benchmarks", "stub_server.py"), "--port", str(stub_port),
+                             "--latency", str(args.latency)], cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(stub_port, stub)
+        with tempfile.TemporaryDirectory() as state_dir:
+            env = dict(os.environ,
+                       DIGINEXT_BASE_URL=f"http://127.0.0.1:{stub_port}/api/v3",
+                       IMAGE_CACHE_DIR="",
+                       IMAGE_INDEX_ENABLED="false",
+                       ORDER_STORE_PATH=os.path.join(state_dir, "orders.sqlite3"))
+            # The stub has no quota, so serving capacity is measured without client-side rate limits
+            env.update({f"RATE_LIMIT_{family.upper()}": "0" for family in config.RATE_LIMITS})
+            offset = 0
+            for mode in args.modes.split(","):
+                port = free_port()
+                server = start(SERVERS[mode](port), env, port)
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    asyncio.run(run_load(base_url, args.path, args.warmup, min(args.concurrency, args.warmup),
+                                         offset))
+                    offset += args.warmup
+                    latencies, errors, elapsed = asyncio.run(
+                        run_load(base_url, args.path, args.requests, args.concurrency, offset))
+                    offset += args.requests
+                    report(mode, latencies, errors, elapsed)
+                finally:
+                    stop(server)
+    finally:
+        stop(stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Local mock of the Diginext API used by the benchmarks.
+
+Responses are generated for a catalog of configurable size, or read from a
+directory of recorded fixtures where one exists for the request (see
+``StubDiginext.fixture``). Every route sleeps for a configurable latency
+before answering so that the difference between serial and parallel
+upstream calls is measurable. It can also run on its own for servers
+started in another process:
+
+    python benchmarks/stub_server.py --port 8900 --latency 0.05 --catalog-size 10000 --image-size 800x800
+"""
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+
+def make_image(width=1200, height=1200, color=(255, 255, 255)):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when a pool opens many at once
+    request_queue_size = 128
+
+
+class StubDiginext:
+    def __init__(self, latency=0.1, image_latency=None, image_size=(1200, 1200), catalog_size=120,
+                 orders_per_day=120, port=0, rate_limit=None, max_page_size=None, fixtures_dir=None,
+                 stock_churn=0.0):
+        self.latency = latency
+        self.catalog_size = catalog_size
+        self.orders_per_day = orders_per_day
+        # Upstream cap on ``size``: larger requested pages are cut, so the client needs more pages
+        self.max_page_size = max_page_size
+        self.fixtures_dir = os.path.realpath(fixtures_dir) if fixtures_dir else None
+        # Fraction of the inventory whose stock changes between two inventory requests
+        self.stock_churn = stock_churn
+        self.inventory_requests = 0
+        self.image_latency = latency if image_latency is None else image_latency
+        # Upstream rate limit (requests/s over all routes); excess requests get 429 + Retry-After
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.throttled = 0
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+        self.image = make_image(*image_size)
+        self.image_etag = '"%s"' % hashlib.sha256(self.image).hexdigest()[:16]
+        self.server = StubHTTPServer(("127.0.0.1", port), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/api/v3"
+
+    def product(self, product_id):
+        return {
+            "name": f"Stub product {product_id} " + "x" * 60,
+            "productId": product_id,
+            "productImage": f"{self.base_url}/images/{product_id}.jpg",
+            "images": ["a"] * 7,
+            "videos": [],
+            "description": "d" * 1200,
+            "attributes": {"general": [1, 2, 3, 4, 5]},
+        }
+
+    def catalog_item(self, index):
+        return {
+            "product_id": index,
+            "title": f"Stub catalog product {index}",
+            "image_src": f"{self.base_url}/images/{index}.jpg",
+            "active": True,
+            "moderation_status": {"title": "approved"},
+        }
+
+    def page_size(self, query):
+        size = int(query.get("size", ["50"])[0])
+        return min(size, self.max_page_size) if self.max_page_size else size
+
+    def catalog_page(self, query):
+        page = int(query.get("page", ["1"])[0])
+        size = self.page_size(query)
+        start = (page - 1) * size
+        items = [self.catalog_item(index) for index in range(start + 1, min(start + size, self.catalog_size) + 1)]
+        total_pages = (self.catalog_size + size - 1) // size
+        return {"data": {"items": items, "pager": {"current_page": page, "item_per_page": size,
+                                                   "total_pages": total_pages, "total_rows": self.catalog_size}}}
+
+    def orders_page(self, query):
+        """Orders are spread evenly over time: ``orders_per_day`` per UTC day, ids increasing."""
+        def parse(value):
+            return datetime.fromisoformat(value.rstrip("Z"))
+
+        page = int(query.get("page", ["1"])[0])
+        size = self.page_size(query)
+        created_from = parse(query["order_created_at_from"][0]).timestamp()
+        created_to = parse(query["order_created_at_to"][0]).timestamp()
+        seconds_per_order = 86400 / self.orders_per_day
+        first_id = int(created_from // seconds_per_order) + 1
+        last_id = int(created_to // seconds_per_order)
+        total_rows = max(last_id - first_id + 1, 0)
+        start = first_id + (page - 1) * size
+        items = [
+            {
+                "id": order_id,
+                # Quadratic residues give a skewed, repeatable sales distribution
+                "product_id": (order_id * order_id) % max(self.catalog_size, 1) + 1,
+                "created_at": datetime.utcfromtimestamp(order_id * seconds_per_order).isoformat() + "Z",
+            }
+            for order_id in range(start, min(start + size - 1, last_id) + 1)
+        ]
+        return {"data": {"items": items, "pager": {"current_page": page, "item_per_page": size,
+                                                   "total_pages": (total_rows + size - 1) // size,
+                                                   "total_rows": total_rows}}}
+
+    def inventory(self):
+        """Every third catalog product is out of warehouse stock.
+
+        The ones picked include best sellers of ``orders_page``, so the
+        high-sales, out-of-stock view is never empty.
+        """
+        items = [{"product_id": index, "warehouse_stock": 0 if index % 3 == 1 else index % 17 + 1}
+                 for index in range(1, self.catalog_size + 1)]
+        with self._lock:
+            self.inventory_requests += 1
+            request_number = self.inventory_requests
+        if self.stock_churn:
+            # A different slice of the catalog moves on every request; stock is 0 on odd requests
+            period = max(round(1 / self.stock_churn), 1)
+            for item in items[request_number % period::period]:
+                item["warehouse_stock"] = (request_number % 2 == 0) * (item["product_id"] % 17 + 1)
+        return {"data": {"items": items}}
+
+    def sales_report(self, query):
+        items = [
+            {
+                "product_id": index,
+                "title": f"Stub catalog product {index}",
+                "image": f"{self.base_url}/images/{index}.jpg?x-oss-process=image/resize",
+                "conversion_rate": (index * 37 % 1000) / 100,
+                "revenue": index * 7919 % 100000,
+                "units": index * 31 % 500,
+            }
+            for index in range(1, self.catalog_size + 1)
+        ]
+        return {"data": {"range": query.get("range", ["last_7_days"])[0], "items": [items]}}
+
+    def admit(self):
+        """Count a request against the one-second window; False once the window is full."""
+        with self._lock:
+            self.requests += 1
+            if not self.rate_limit:
+                return True
+            second = int(time.monotonic())
+            window, count = self._window
+            count = count + 1 if window == second else 1
+            self._window = (second, count)
+            if count > self.rate_limit:
+                self.throttled += 1
+                return False
+            return True
+
+    def fixture(self, url, query):
+        """Recorded response for a request, as ``(content_type, body)``, or None.
+
+        A request for ``/api/v3/<path>`` is answered from
+        ``<fixtures_dir>/<path>/page-<page>.json``, ``<fixtures_dir>/<path>.json``
+        or ``<fixtures_dir>/<path>``, the first that exists; query parameters
+        other than ``page`` are ignored.
+        """
+        if not self.fixtures_dir or not url.path.startswith("/api/v3/"):
+            return None
+        relative = url.path[len("/api/v3/"):]
+        candidates = [f"{relative}.json", relative]
+        if "page" in query:
+            candidates.insert(0, f"{relative}/page-{query['page'][0]}.json")
+        for candidate in candidates:
+            path = os.path.realpath(os.path.join(self.fixtures_dir, candidate))
+            if path.startswith(self.fixtures_dir + os.sep) and os.path.isfile(path):
+                with open(path, "rb") as f:
+                    return mimetypes.guess_type(path)[0] or "application/octet-stream", f.read()
+        return None
+
+    def route(self, path):
+        """Return ``(status, content_type, body, latency)`` for a request path."""
+        url = urlsplit(path)
+        query = parse_qs(url.query)
+        recorded = self.fixture(url, query)
+        if recorded is not None:
+            content_type, body = recorded
+            latency = self.image_latency if content_type.startswith("image/") else self.latency
+            return 200, content_type, body, latency
+        if url.path == "/api/v3/products/seller":
+            return 200, "application/json", json.dumps(self.catalog_page(query)).encode(), self.latency
+        if url.path == "/api/v3/insight/sales-reports":
+            return 200, "application/json", json.dumps(self.sales_report(query)).encode(), self.latency
+        if url.path == "/api/v3/inventories":
+            return 200, "application/json", json.dumps(self.inventory()).encode(), self.latency
+        if url.path == "/api/v3/orders/history":
+            return 200, "application/json", json.dumps(self.orders_page(query)).encode(), self.latency
+
+        if path.startswith("/api/v3/images/"):
+            return 200, "image/jpeg", self.image, self.image_latency
+
+        match = re.match(r"/api/v3/product-creation/be-seller/([^/?]+)", path)
+        if match:
+            return 200, "application/json", json.dumps({"data": self.product(match.group(1))}).encode(), self.latency
+
+        match = re.match(r"/api/v3/product-edit/([^/?]+)", path)
+        if match:
+            body = {"data": {"status": "ok", "product_data": {"id": match.group(1)}}}
+            return 200, "application/json", json.dumps(body).encode(), self.latency
+
+        return 404, "application/json", b'{"data": {}}', 0
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if not stub.admit():
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status, content_type, body, latency = stub.route(self.path)
+                if latency:
+                    time.sleep(latency)
+                etag = stub.image_etag if content_type.startswith("image/") else None
+                if etag and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the mock Diginext API until interrupted.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.1, help="latency per upstream call (s)")
+    parser.add_argument("--image-latency", type=float, default=None)
+    parser.add_argument("--catalog-size", type=int, default=120)
+    parser.add_argument("--orders-per-day", type=int, default=120)
+    parser.add_argument("--rate-limit", type=int, default=None, help="requests/s before answering 429")
+    parser.add_argument("--max-page-size", type=int, default=None, help="largest page the API returns")
+    parser.add_argument("--image-size", default="1200x1200", help="WIDTHxHEIGHT of the served image")
+    parser.add_argument("--fixtures", default=None, help="directory of recorded responses served instead")
+    parser.add_argument("--stock-churn", type=float, default=0.0, help="fraction of stock changed per request")
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.image_size.lower().split("x"))
+    stub = StubDiginext(latency=args.latency, image_latency=args.image_latency, image_size=(width, height),
+                        catalog_size=args.catalog_size, orders_per_day=args.orders_per_day, port=args.port,
+                        rate_limit=args.rate_limit, max_page_size=args.max_page_size, fixtures_dir=args.fixtures,
+                        stock_churn=args.stock_churn)
+    print(stub.base_url, flush=True)
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Benchmark suite: every API route and wrapper method against the mock Diginext API at several catalog sizes.
+
+Each catalog size runs in its own worker process against its own mock
+server process, so module-level clients, the product index and peak
+memory are per size. For every case the suite reports throughput (items
+per second), p50/p99 latency of one call and the peak Python memory
+allocated during one call, and writes everything to a JSON file that a
+later run can be compared against. Run from the repository root:
+
+    python benchmarks/suite.py --sizes 100,10000,100000 --output bench_results.json
+    python benchmarks/suite.py --sizes 100,10000 --baseline bench_results.json --only route
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+from benchmarks.load_test import free_port, percentile, stop, wait_for_port  # noqa: E402
+
+SEO_AUDIT_BATCH = 20
+
+
+def orders_per_day(size):
+    return max(size // 10, 10)
+
+
+def cases(size, window_days):
+    """``(name, func, items per call, calls[, setup])`` for every benchmarked path; imported inside the worker.
+
+    With a ``setup`` the case times ``func(setup())`` and the setup is not timed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from itertools import count
+
+    import app
+    from digikala_inventory import DigikalaInventory
+    from digikala_order_history import DigikalaOrderHistory
+    from digikala_product import DigikalaProduct
+    from product_index import ProductIndex
+    from sale_insight import DigikalaSalesReport
+    from seller_products import SellerProducts
+
+    # Fresh product ids, so neither the response cache nor the image cache answers
+    product_ids = count(1)
+    executor = ThreadPoolExecutor(max_workers=4)
+    client = app.app.test_client()
+    catalog_runs, request_runs = (3, 50) if size <= 10000 else (1, 20)
+
+    def get(path):
+        response = client.get(path)
+        response.get_data()
+        if response.status_code != 200:
+            raise Exception(f"GET {path} returned {response.status_code}")
+
+    def product():
+        return DigikalaProduct(f"dkp-{next(product_ids)}")
+
+    def fetched_product():
+        fetched = product()
+        fetched.fetch_product_data()
+        return fetched
+
+    def sales_report():
+        report = DigikalaSalesReport(DigikalaSalesReport.url_for())
+        report.fetch_sales_report()
+        report.suggest_campaigns()
+
+    def index_sync():
+        # The product index fed from upstream, as the scheduler's catalog, inventory and orders jobs do
+        index = ProductIndex()
+        index.update_catalog(SellerProducts().iter_records())
+        index.apply_stock_changes(DigikalaInventory().fetch_inventory_data())
+        index.update_sales(DigikalaOrderHistory().get_orders_last_month())
+
+    def seo_audit():
+        batch = [f"dkp-{next(product_ids)}" for _ in range(SEO_AUDIT_BATCH)]
+        response = client.post("/api/products/seo-audit", json={"product_ids": batch})
+        response.get_data()
+
+    def high_sales():
+        app.scheduler.start()
+        app.product_index.wait_ready(600)
+        get("/api/high-sales-products-not-in-stock")
+
+    return [
+        ("wrapper SellerProducts.get_products", lambda: SellerProducts().get_products(), 50, request_runs),
+        ("wrapper SellerProducts.iter_products", lambda: sum(1 for _ in SellerProducts().iter_products()),
+         size, catalog_runs),
+        ("wrapper DigikalaInventory.fetch_inventory_data", lambda: DigikalaInventory().fetch_inventory_data(),
+         size, catalog_runs),
+        ("wrapper DigikalaOrderHistory.get_orders_last_month",
+         lambda: DigikalaOrderHistory().get_orders_last_month(), orders_per_day(size) * window_days, catalog_runs),
+        ("wrapper DigikalaProduct.fetch_product_data", lambda: product().fetch_product_data(), 1, request_runs),
+        ("wrapper DigikalaProduct.run_image_checks", DigikalaProduct.run_image_checks, 1, request_runs,
+         fetched_product),
+        ("wrapper DigikalaSalesReport.suggest_campaigns", sales_report, size, catalog_runs),
+        ("wrapper ProductIndex sync", index_sync, size, catalog_runs),
+        ("route GET /api/products", lambda: get("/api/products"), size, catalog_runs),
+        ("route GET /api/product/<id>", lambda: get(f"/api/product/dkp-{next(product_ids)}"), 1, request_runs),
+        ("route GET /api/campaign-recommendation", lambda: get("/api/campaign-recommendation"), size,
+         catalog_runs),
+        ("route GET /api/high-sales-products-not-in-stock", high_sales, 1, request_runs),
+        ("route POST /api/products/seo-audit", seo_audit, SEO_AUDIT_BATCH, max(request_runs // 10, 2)),
+    ], executor
+
+
+def measure(func, calls, setup=None):
+    """Wall time of ``calls`` calls, then the peak traced memory of one more."""
+    def call():
+        if setup is None:
+            started = time.perf_counter()
+            func()
+        else:
+            arg = setup()
+            started = time.perf_counter()
+            func(arg)
+        return time.perf_counter() - started
+
+    timings = [call() for _ in range(calls)]
+
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return timings, peak
+
+
+def run_worker(size, only):
+    results = []
+    case_list, executor = cases(size, config.ORDER_HISTORY_DAYS)
+    for name, func, items, calls, *setup in case_list:
+        if only and not any(part in name for part in only):
+            continue
+        measure(func, 1, *setup)  # warm up connections and lazily built state
+        timings, peak = measure(func, calls, *setup)
+        total = sum(timings)
+        results.append({
+            "name": name,
+            "size": size,
+            "calls": calls,
+            "items_per_call": items,
+            "throughput": items * calls / total if total else None,
+            "calls_per_second": calls / total if total else None,
+            "p50_ms": percentile(timings, 50) * 1000,
+            "p99_ms": percentile(timings, 99) * 1000,
+            "peak_memory_bytes": peak,
+        })
+        print(f"{name} size={size} done", file=sys.stderr, flush=True)
+    executor.shutdown()
+    return results
+
+
+def run_size(size, args):
+    """Start a mock server and a worker process for one catalog size; returns the worker's results."""
+    stub_port = free_port()
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join("benchmarks", "stub_server.py"), "--port", str(stub_port),
+         "--latency", str(args.latency), "--catalog-size", str(size), "--orders-per-day", str(orders_per_day(size)),
+         "--image-size", args.image_size] + (["--fixtures", args.fixtures] if args.fixtures else []),
+        cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(stub_port, stub)
+        env = dict(os.environ,
+                   DIGINEXT_BASE_URL=f"http://127.0.0.1:{stub_port}/api/v3",
+                   IMAGE_CACHE_DIR="",
+                   IMAGE_INDEX_ENABLED="false",
+                   ORDER_STORE_PATH="",
+                   SNAPSHOT_READY_TIMEOUT="600",
+                   LOG_LEVEL="WARNING")
+        # Measure the code, not the production quotas and caches
+        env.update({f"RATE_LIMIT_{family.upper()}": "0" for family in config.RATE_LIMITS})
+        # One sync per source at startup; routes then read those snapshots
+        env.update({f"SYNC_INTERVAL_{source.upper()}": "3600" for source in config.SYNC_INTERVALS})
+        env.update({f"CACHE_{kind}_{route}": "0" for kind in ("TTL", "STALE")
+                    for route in ("PRODUCTS", "PRODUCT", "CAMPAIGNS", "HIGH_SALES")})
+        command = [sys.executable, os.path.abspath(__file__), "--worker", "--sizes", str(size)]
+        if args.only:
+            command += ["--only", args.only]
+        output = subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, check=True).stdout
+        return json.loads(output)
+    finally:
+        stop(stub)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(row["name"], row["size"]): row for row in json.load(f)["results"]}
+    print(f"\nchange vs. {baseline_path} (p50 latency, throughput, peak memory):")
+    for row in results:
+        old = baseline.get((row["name"], row["size"]))
+        if old is None:
+            continue
+        changes = [
+            f"{(new / previous - 1) * 100:+6.1f}%" if previous else "   n/a"
+            for new, previous in ((row["p50_ms"], old["p50_ms"]), (row["throughput"], old["throughput"]),
+                                  (row["peak_memory_bytes"], old["peak_memory_bytes"]))
+        ]
+        print(f"{row['name']:<52} {row['size']:>7}  " + "  ".join(changes))
+
+
+def report(results):
+    print(f"{'case':<52} {'size':>7} {'items/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'peak MiB':>9}")
+    for row in results:
+        print(f"{row['name']:<52} {row['size']:>7} {row['throughput']:11.1f} {row['p50_ms']:9.1f} "
+              f"{row['p99_ms']:9.1f} {row['peak_memory_bytes'] / 2 ** 20:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,10000,100000", help="comma-separated catalog sizes")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock latency per upstream call (s)")
+    parser.add_argument("--image-size", default="1200x1200", help="WIDTHxHEIGHT of the mock product image")
+    parser.add_argument("--fixtures", default=None, help="directory of recorded responses for the mock server")
+    parser.add_argument("--only", default=None, help="comma-separated substrings of the cases to run")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    only = args.only.split(",") if args.only else None
+
+    if args.worker:
+        json.dump(run_worker(sizes[0], only), sys.stdout)
+        return
+
+    results = []
+    for size in sizes:
+        results.extend(run_size(size, args))
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {"sizes": sizes, "latency": args.latency, "image_size": args.image_size,
+                         "fixtures": args.fixtures},
+            "results": results,
+        }, f, indent=2)
+    report(results)
+    print(f"\nresults written to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Streaming export of the catalog joined with warehouse stock and sales counts.
+
+The export is a generator pipeline: catalog records are joined one by one
+with the product index, grouped into batches of ``EXPORT_BATCH_ROWS`` and
+handed to a format writer that yields encoded bytes per batch, so memory
+is bounded by a batch (a row group for Parquet) however large the
+catalog is.
+"""
+import csv
+import io
+import logging
+import time
+from itertools import islice
+from operator import attrgetter
+
+import config
+from http_encoding import dumps
+from records import PRODUCT_FIELDS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+log = logging.getLogger(__name__)
+
+# Columns added to the catalog fields from the product index
+ENRICHED_FIELDS = ("warehouse_stock", "in_stock", "sales", "high_sales")
+EXPORT_FIELDS = PRODUCT_FIELDS + ENRICHED_FIELDS
+
+# Column types of the columnar formats; every other field is a string
+INT_FIELDS = {"product_id", "variants_count", "brand_id", "warehouse_stock", "sales"}
+BOOL_FIELDS = {"fake", "is_owner", "active", "in_stock", "high_sales"}
+
+# Registered export formats: name -> (writer, mimetype, file extension)
+EXPORT_FORMATS = {}
+
+
+def export_format(name, mimetype, extension):
+    """Register ``func(batches, fields) -> bytes chunks`` as an export format."""
+    def decorator(func):
+        EXPORT_FORMATS[name] = (func, mimetype, extension)
+        return func
+    return decorator
+
+
+def iter_rows(products, product_index, fields):
+    """Yield one tuple of ``fields`` per catalog record, joined with its product index entry."""
+    catalog_fields = [field for field in fields if field not in ENRICHED_FIELDS]
+    getter = attrgetter(*catalog_fields) if len(catalog_fields) > 1 else None
+    # Rows are built as catalog values then ENRICHED_FIELDS, and reordered only for a custom projection
+    built = catalog_fields + list(ENRICHED_FIELDS)
+    order = [built.index(field) for field in fields]
+    reorder = order != list(range(len(built)))
+    entries = product_index.entries
+    high_sales = product_index.high_sales
+    for product in products:
+        if getter is not None:
+            values = getter(product)
+        else:
+            values = tuple(getattr(product, field) for field in catalog_fields)
+        entry = entries.get(product.product_id)
+        warehouse_stock = entry.warehouse_stock if entry else 0
+        row = (*values, warehouse_stock, warehouse_stock > 0, entry.sales if entry else 0,
+               product.product_id in high_sales)
+        yield tuple(row[position] for position in order) if reorder else row
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def select_fields(fields=None):
+    """Validate a projection of ``EXPORT_FIELDS``; raises ValueError for unknown fields."""
+    if not fields:
+        return EXPORT_FIELDS
+    unknown = [field for field in fields if field not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+    return tuple(fields)
+
+
+def export_catalog(products, product_index, fmt="ndjson", fields=None, batch_size=None):
+    """Return ``(chunks, mimetype, extension)`` for exporting ``products`` in format ``fmt``.
+
+    ``products`` is an iterable of ``ProductRecord``s (a catalog snapshot
+    or a live ``SellerProducts.iter_records`` walk); ``chunks`` is a lazy
+    iterator of bytes. Raises ValueError for an unknown format or field.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}; use one of {', '.join(EXPORT_FORMATS)}")
+    writer, mimetype, extension = EXPORT_FORMATS[fmt]
+    if writer is None:
+        raise ValueError(f"The {fmt} export format requires the pyarrow package")
+    fields = select_fields(fields)
+    rows = iter_rows(products, product_index, fields)
+    batches = batched(rows, batch_size or config.EXPORT_BATCH_ROWS)
+    return _logged(writer(batches, fields), fmt), mimetype, extension
+
+
+def _logged(chunks, fmt):
+    started = time.monotonic()
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    log.info("catalog export format=%s bytes=%d seconds=%.1f", fmt, size, time.monotonic() - started)
+
+
+@export_format("ndjson", "application/x-ndjson", "ndjson")
+def write_ndjson(batches, fields):
+    for batch in batches:
+        yield b"".join(dumps(dict(zip(fields, row))) + b"\n" for row in batch)
+
+
+@export_format("csv", "text/csv", "csv")
+def write_csv(batches, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode()
+    return value
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file object that collects what pyarrow writes until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def arrow_schema(fields):
+    def arrow_type(field):
+        if field in INT_FIELDS:
+            return pyarrow.int64()
+        if field in BOOL_FIELDS:
+            return pyarrow.bool_()
+        return pyarrow.string()
+
+    return pyarrow.schema([(field, arrow_type(field)) for field in fields])
+
+
+def arrow_batch(batch, fields, schema):
+    """``pyarrow.RecordBatch`` of ``batch`` rows; values that do not fit their column type become null."""
+    columns = []
+    for position, field in enumerate(fields):
+        values = [row[position] for row in batch]
+        if field in INT_FIELDS:
+            values = [_as_int(value) for value in values]
+        elif field in BOOL_FIELDS:
+            values = [None if value is None else bool(value) for value in values]
+        else:
+            values = [_as_str(value) for value in values]
+        columns.append(pyarrow.array(values, schema.field(field).type))
+    return pyarrow.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _as_int(value):
+    try:
+        return None if value is None else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_str(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode()
+    return str(value)
+
+
+def write_arrow(batches, fields):
+    """Arrow IPC stream: one record batch per batch of rows, readable as it arrives."""
+    schema = arrow_schema(fields)
+    sink = ChunkSink()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(arrow_batch(batch, fields, schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def write_parquet(batches, fields):
+    """Parquet file with row groups of ``EXPORT_PARQUET_ROW_GROUP`` rows; the footer comes last."""
+    schema = arrow_schema(fields)
+    sink = ChunkSink()
+    pending = []
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            pending.append(arrow_batch(batch, fields, schema))
+            rows += len(batch)
+            if rows >= config.EXPORT_PARQUET_ROW_GROUP:
+                writer.write_table(pyarrow.Table.from_batches(pending, schema))
+                pending, rows = [], 0
+                yield sink.drain()
+        if pending:
+            writer.write_table(pyarrow.Table.from_batches(pending, schema))
+    yield sink.drain()
+
+
+# Columnar formats are listed either way, so a missing pyarrow is reported instead of an unknown format
+export_format("arrow", "application/vnd.apache.arrow.stream", "arrows")(write_arrow if pyarrow else None)
+export_format("parquet", "application/vnd.apache.parquet", "parquet")(write_parquet if pyarrow else None)
@@ -0,0 +1,162 @@
+import os
+import tempfile
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _cpu_count():
+    # CPUs this process may run on, which can be fewer than the host has
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Diginext API
+DIGINEXT_BASE_URL = os.environ.get("DIGINEXT_BASE_URL", "https://sandbox.diginext.ir/api/v3")
+DIGINEXT_HEADERS = {
+    "accept": "application/json",
+    "x-response-code": os.environ.get("DIGINEXT_RESPONSE_CODE", "200")
+}
+
+# HTTP client
+HTTP_CONNECT_TIMEOUT = _env_float("HTTP_CONNECT_TIMEOUT", 3.05)
+HTTP_READ_TIMEOUTS = {
+    "default": _env_float("HTTP_READ_TIMEOUT", 10),
+    "products": _env_float("HTTP_READ_TIMEOUT_PRODUCTS", 15),
+    "inventory": _env_float("HTTP_READ_TIMEOUT_INVENTORY", 15),
+    "orders": _env_float("HTTP_READ_TIMEOUT_ORDERS", 20),
+    "product": _env_float("HTTP_READ_TIMEOUT_PRODUCT", 10),
+    "insight": _env_float("HTTP_READ_TIMEOUT_INSIGHT", 20),
+    "image": _env_float("HTTP_READ_TIMEOUT_IMAGE", 20),
+}
+HTTP_RETRIES = _env_int("HTTP_RETRIES", 3)
+HTTP_BACKOFF_FACTOR = _env_float("HTTP_BACKOFF_FACTOR", 0.5)
+HTTP_POOL_CONNECTIONS = _env_int("HTTP_POOL_CONNECTIONS", 10)
+# Connections kept per host; with HTTP_POOL_BLOCK this also caps concurrent requests per host
+HTTP_POOL_MAXSIZE = _env_int("HTTP_POOL_MAXSIZE", 20)
+HTTP_POOL_BLOCK = os.environ.get("HTTP_POOL_BLOCK", "true").lower() == "true"
+
+# Client-side rate limits per endpoint family: (requests/s, burst); a rate of 0 disables the limit.
+# Set them just under the upstream quota; a rate set too high is cut back on the first 429s.
+RATE_LIMITS = {
+    family: (_env_float(f"RATE_LIMIT_{family.upper()}", rate), _env_int(f"RATE_LIMIT_BURST_{family.upper()}", burst))
+    for family, rate, burst in (
+        ("default", 50, 20),
+        ("products", 20, 10),
+        ("inventory", 10, 5),
+        ("orders", 50, 20),
+        ("product", 100, 20),
+        ("insight", 20, 10),
+        ("image", 100, 20),
+    )
+}
+# On a 429 the rate is multiplied by RATE_LIMIT_DECREASE (never below RATE_LIMIT_MIN_FRACTION of the
+# configured rate) and each successful response adds back RATE_LIMIT_RECOVERY of it
+RATE_LIMIT_DECREASE = _env_float("RATE_LIMIT_DECREASE", 0.5)
+RATE_LIMIT_MIN_FRACTION = _env_float("RATE_LIMIT_MIN_FRACTION", 0.05)
+# The reduced rate paces the requests, so it must stay above 0
+if not 0 < RATE_LIMIT_MIN_FRACTION <= 1:
+    raise ValueError(f"RATE_LIMIT_MIN_FRACTION must be above 0 and at most 1, got {RATE_LIMIT_MIN_FRACTION}")
+RATE_LIMIT_RECOVERY = _env_float("RATE_LIMIT_RECOVERY", 0.02)
+# Retries of a throttled (429) request; other statuses use HTTP_RETRIES
+RATE_LIMIT_RETRIES = _env_int("RATE_LIMIT_RETRIES", 3)
+# Directory holding the rate limiters' buckets, so the processes of one server share the limits above
+# instead of each sending at the full rate. Empty (the default, right for a single process) keeps them
+# in memory; gunicorn.conf.py sets one per server
+RATE_LIMIT_SHARE_DIR = os.environ.get("RATE_LIMIT_SHARE_DIR", "")
+
+# Fan-out of upstream calls within a single API request
+FETCH_WORKERS = _env_int("FETCH_WORKERS", 16)
+
+# Image analysis cache; set IMAGE_CACHE_DIR to an empty string to disable it
+IMAGE_CACHE_DIR = os.environ.get(
+    "IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "digi-seller-central", "image-cache"))
+IMAGE_CACHE_MAX_BYTES = _env_int("IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+IMAGE_CACHE_MAX_AGE = _env_float("IMAGE_CACHE_MAX_AGE", 3600)
+
+# Perceptual hash index of catalog main images ("images" sync job): parallel downloads, products
+# indexed per batch, and the default Hamming distance (of 64 bits) for a near-duplicate. Opt-in, as it
+# downloads every catalog image after startup; /api/product/<id>/similar-images needs it
+IMAGE_INDEX_ENABLED = os.environ.get("IMAGE_INDEX_ENABLED", "false").lower() == "true"
+IMAGE_INDEX_WORKERS = _env_int("IMAGE_INDEX_WORKERS", 8)
+IMAGE_INDEX_BATCH = _env_int("IMAGE_INDEX_BATCH", 50)
+IMAGE_SIMILAR_DISTANCE = _env_int("IMAGE_SIMILAR_DISTANCE", 8)
+
+# Catalog pages fetched ahead of the one being consumed
+CATALOG_PAGES_IN_FLIGHT = _env_int("CATALOG_PAGES_IN_FLIGHT", 4)
+
+# Order history aggregation
+ORDER_HISTORY_DAYS = _env_int("ORDER_HISTORY_DAYS", 30)
+ORDER_FETCH_WORKERS = _env_int("ORDER_FETCH_WORKERS", 8)
+ORDER_STORE_PATH = os.environ.get(
+    "ORDER_STORE_PATH", os.path.join(tempfile.gettempdir(), "digi-seller-central", "orders.sqlite3"))
+
+# Background sync of the Diginext sources into snapshots: seconds between runs per source,
+# the random +/- fraction applied to each interval, and how long a request waits for the first sync
+SYNC_INTERVALS = {
+    "catalog": _env_float("SYNC_INTERVAL_CATALOG", 300),
+    "inventory": _env_float("SYNC_INTERVAL_INVENTORY", 60),
+    "orders": _env_float("SYNC_INTERVAL_ORDERS", 60),
+    "sales": _env_float("SYNC_INTERVAL_SALES", 900),
+    "images": _env_float("SYNC_INTERVAL_IMAGES", 300),
+}
+SYNC_JITTER = _env_float("SYNC_JITTER", 0.1)
+SYNC_SALES_RANGES = os.environ.get("SYNC_SALES_RANGES", "last_7_days,last_30_days").split(",")
+SNAPSHOT_HISTORY = _env_int("SNAPSHOT_HISTORY", 10)
+SNAPSHOT_READY_TIMEOUT = _env_float("SNAPSHOT_READY_TIMEOUT", 120)
+# Directory through which the worker processes of one server share their snapshots: only the process
+# holding its lock syncs, the others load its snapshots every SNAPSHOT_SHARE_POLL seconds. Empty (the
+# default, and right for a single process) syncs in every process; gunicorn.conf.py sets one per server
+SNAPSHOT_SHARE_DIR = os.environ.get("SNAPSHOT_SHARE_DIR", "")
+SNAPSHOT_SHARE_POLL = _env_float("SNAPSHOT_SHARE_POLL", 1)
+# Changed inventory rows kept for /api/inventory/changes; older consumers get the full inventory
+INVENTORY_CHANGE_LOG = _env_int("INVENTORY_CHANGE_LOG", 200000)
+
+# Catalog export (/api/export): rows joined and encoded per batch, and rows per Parquet row group
+EXPORT_BATCH_ROWS = _env_int("EXPORT_BATCH_ROWS", 1000)
+EXPORT_PARQUET_ROW_GROUP = _env_int("EXPORT_PARQUET_ROW_GROUP", 50000)
+
+# API response cache: "memory" (per process LRU), "redis" (shared) or "shared" (local stand-in)
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_MAX_ENTRIES = _env_int("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+RESPONSE_CACHE_MAX_BODY_BYTES = _env_int("RESPONSE_CACHE_MAX_BODY_BYTES", 32 * 1024 * 1024)
+RESPONSE_CACHE_COALESCE_TIMEOUT = _env_float("RESPONSE_CACHE_COALESCE_TIMEOUT", 60)
+# Compression of API responses (brotli needs the optional brotli package; gzip is always available)
+COMPRESS_MIN_BYTES = _env_int("COMPRESS_MIN_BYTES", 1024)
+GZIP_LEVEL = _env_int("GZIP_LEVEL", 6)
+BROTLI_QUALITY = _env_int("BROTLI_QUALITY", 5)
+# (ttl, stale) seconds per route
+CACHE_TTL_PRODUCTS = (_env_float("CACHE_TTL_PRODUCTS", 300), _env_float("CACHE_STALE_PRODUCTS", 600))
+CACHE_TTL_PRODUCT = (_env_float("CACHE_TTL_PRODUCT", 600), _env_float("CACHE_STALE_PRODUCT", 3600))
+CACHE_TTL_CAMPAIGNS = (_env_float("CACHE_TTL_CAMPAIGNS", 900), _env_float("CACHE_STALE_CAMPAIGNS", 3600))
+CACHE_TTL_HIGH_SALES = (_env_float("CACHE_TTL_HIGH_SALES", 15), _env_float("CACHE_STALE_HIGH_SALES", 60))
+
+# Batch SEO audit worker pool
+SEO_AUDIT_WORKERS = _env_int("SEO_AUDIT_WORKERS", 8)
+SEO_AUDIT_MAX_WORKERS = _env_int("SEO_AUDIT_MAX_WORKERS", 32)
+
+# Production WSGI server (gunicorn.conf.py): processes x threads per container
+SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:5000")
+SERVER_WORKERS = _env_int("SERVER_WORKERS", _cpu_count())
+SERVER_THREADS = _env_int("SERVER_THREADS", 8)
+SERVER_TIMEOUT = _env_int("SERVER_TIMEOUT", 120)
+SERVER_GRACEFUL_TIMEOUT = _env_int("SERVER_GRACEFUL_TIMEOUT", 30)
+SERVER_KEEPALIVE = _env_int("SERVER_KEEPALIVE", 5)
+# Recycle a worker after this many requests (plus up to 10% jitter); 0 never recycles
+SERVER_MAX_REQUESTS = _env_int("SERVER_MAX_REQUESTS", 0)
+# Debug mode of the development server (python app.py) only
+FLASK_DEBUG = os.environ.get("FLASK_DEBUG", "false").lower() == "true"
+
+# Observability: latency histograms on /metrics and the log level of every module logger
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "%(asctime)s %(levelname)s %(name)s %(message)s")
@@ -1,29 +1,155 @@
-import requests
+import threading
+from collections import deque
 
-from seller_products import SellerProducts
+import config
+from diginext_client import get_client
+from metrics import timed
+from records import INVENTORY_FIELDS, StockChange, record_type
 
 
 class DigikalaInventory:
-    def __init__(self):
-        self.api_url = 'https://sandbox.diginext.ir/api/v3/inventories'
-        self.headers = {
-            "accept": "application/json",
-            "x-response-code": "200"
-        }
+    """Warehouse stock, indexed by product_id across fetches.
+
+    Every fetch is diffed against the previous one: it gets a new
+    ``version`` and only the products whose ``warehouse_stock`` (summed
+    over their variant rows) changed are returned and appended to a
+    bounded change log, so consumers can catch up with ``changes_since``
+    instead of rescanning the whole inventory.
+    """
+
+    def __init__(self, client=None, change_log_size=None):
+        self.api_url = 'inventories'
+        self.client = client or get_client()
         self.inventory_data = {}
+        self.stock = {}
+        self.in_stock = set()
+        self.version = 0
+        # ``(version, changes)`` batches, oldest first, bounded by the number of changed rows they hold
+        self.change_log = deque()
+        self.change_log_rows = 0
+        # Versions up to this one are not in the change log, even when it is empty
+        self.change_log_floor = 0
+        self.change_log_size = change_log_size or config.INVENTORY_CHANGE_LOG
+        self._lock = threading.Lock()
+
+    @timed()
+    def fetch_inventory_data(self, on_changes=None):
+        """Fetch inventory data from the API; returns the ``StockChange``s since the previous fetch.
 
-    def fetch_inventory_data(self):
-        """Fetch inventory data from the API."""
-        response = requests.get(self.api_url, headers=self.headers)
+        ``on_changes`` is passed to ``apply``.
+        """
+        return self._set_inventory_data(self.client.get(self.api_url, endpoint="inventory"), on_changes)
+
+    def _set_inventory_data(self, response, on_changes=None):
         if response.status_code == 200:
-            self.inventory_data = response.json().get('data', {})
+            return self.load(response.json().get('data', {}), on_changes=on_changes)
         else:
             raise Exception(f"Failed to retrieve data, status code: {response.status_code}")
 
+    def load(self, inventory_data, version=None, on_changes=None):
+        """Make ``inventory_data`` (the ``data`` of an inventory response) current; returns its ``StockChange``s.
+
+        ``version`` and ``on_changes`` are passed to ``apply``.
+        """
+        changes = self.apply(inventory_data.get('items', []), on_changes, version)
+        self.inventory_data = inventory_data
+        return changes
+
+    @staticmethod
+    def product_stock(items):
+        """Return ``{product_id: warehouse_stock}`` summed over the rows (one per variant) of each product."""
+        stock = {}
+        for item in items:
+            product_id = item.get('product_id')
+            stock[product_id] = stock.get(product_id, 0) + (item.get('warehouse_stock') or 0)
+        return stock
+
+    @classmethod
+    def diff(cls, stock, items):
+        """Yield ``(product_id, previous, warehouse_stock)`` for products of ``items`` whose stock differs from ``stock``.
+
+        Rows of the same product are summed first. Products missing from
+        ``items`` are reported with a stock of None.
+        """
+        current = cls.product_stock(items)
+        for product_id, warehouse_stock in current.items():
+            previous = stock.get(product_id)
+            if product_id not in stock or previous != warehouse_stock:
+                yield product_id, previous, warehouse_stock
+        for product_id, previous in stock.items():
+            if product_id not in current:
+                yield product_id, previous, None
+
+    @timed()
+    def apply(self, items, on_changes=None, version=None):
+        """Make ``items`` the current inventory; returns the ``StockChange``s this produced.
+
+        ``on_changes(changes)`` runs before anything is committed. If it
+        raises, the inventory keeps its previous version and stock, so the
+        next fetch diffs against the same state and produces those changes
+        again.
+
+        ``version`` numbers the changes as the inventory of another process
+        did (the snapshot share's leader). Versions it skipped are folded
+        into this one; a version that is not newer than the current one
+        starts the change log over.
+        """
+        with self._lock:
+            if version is None:
+                version = self.version + 1
+            changes = [StockChange(version, product_id, previous, warehouse_stock)
+                       for product_id, previous, warehouse_stock in self.diff(self.stock, items)]
+            if on_changes is not None:
+                on_changes(changes)
+            for change in changes:
+                if change.warehouse_stock is None:
+                    self.stock.pop(change.product_id, None)
+                else:
+                    self.stock[change.product_id] = change.warehouse_stock
+                if change.warehouse_stock and change.warehouse_stock > 0:
+                    self.in_stock.add(change.product_id)
+                else:
+                    self.in_stock.discard(change.product_id)
+
+            if version <= self.version:
+                self.change_log.clear()
+                self.change_log_rows = 0
+                self.change_log_floor = version
+            self.version = version
+            if changes:
+                self.change_log.append((version, changes))
+                self.change_log_rows += len(changes)
+                # The newest batch is always kept, even when it alone is over the limit
+                while self.change_log_rows > self.change_log_size and len(self.change_log) > 1:
+                    self.change_log_rows -= len(self.change_log.popleft()[1])
+        return changes
+
+    def changes_since(self, since):
+        """Return ``(version, changes, full)`` for a consumer that has seen up to version ``since``.
+
+        When the change log no longer reaches back to ``since`` (or ``since``
+        is from another inventory), ``full`` is True and ``changes`` holds
+        every current row instead, with ``previous`` set to None.
+        """
+        with self._lock:
+            # The log holds every change made after ``floor``
+            floor = max(self.change_log[0][0] - 1 if self.change_log else 0, self.change_log_floor)
+            if floor <= since <= self.version:
+                changes = [change for version, batch in self.change_log if version > since for change in batch]
+                return self.version, changes, False
+            return self.version, [StockChange(self.version, product_id, None, warehouse_stock)
+                                  for product_id, warehouse_stock in self.stock.items()], True
+
     def get_inventory_info(self):
         """Return the inventory information."""
         return self.inventory_data
 
+    def iter_rows(self, fields=None):
+        """Yield compact ``InventoryRow``s, projected to ``fields`` when given."""
+        row_cls = record_type("InventoryRow", fields or INVENTORY_FIELDS)
+        for item in self.inventory_data.get('items', []):
+            yield row_cls.from_item(item)
+
     def get_products_with_warehouse_stock(self):
         """Filter and return products where warehouse_stock > 0."""
         products_with_stock = []
@@ -36,7 +162,6 @@ class DigikalaInventory:
         return products_with_stock
 
     def extract_product_ids_from_stock(self):
-        """Extract and return a set of product IDs from products with warehouse stock."""
-        products_with_stock = self.get_products_with_warehouse_stock()
-        product_ids = {item.get('product_id') for item in products_with_stock}
-        return product_ids
\ No newline at end of file
+        """Return the set of product IDs with warehouse stock, kept up to date by every fetch."""
+        with self._lock:
+            return set(self.in_stock)
@@ -1,67 +1,235 @@
-import requests
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 
-from digikala_inventory import DigikalaInventory
-from seller_products import SellerProducts
+import config
+from diginext_client import get_client
+from metrics import timed
+from records import ORDER_FIELDS, record_type
 
 
 class DigikalaOrderHistory:
-    def __init__(self):
-        self.api_url = "https://sandbox.diginext.ir/api/v3/orders/history"
-        self.headers = {
-            "accept": "application/json",
-            "x-response-code": "200"
-        }
+    def __init__(self, client=None, window_days=None, page_size=50, max_workers=None):
+        self.api_url = "orders/history"
+        self.client = client or get_client()
+        self.window_days = window_days or config.ORDER_HISTORY_DAYS
+        self.page_size = page_size
+        self.max_workers = max_workers or config.ORDER_FETCH_WORKERS
+
+    @timed()
+    def fetch_orders(self, page=1, size=50, created_from=None, created_to=None, window_from=None, window_to=None):
+        """Fetch one page of processed orders created in ``[created_from, created_to]``.
 
-    def fetch_orders(self, page=1, size=50):
-        params = {
+        The warehouse exit/return filters use ``[window_from, window_to]``,
+        which defaults to the creation range. Both default to the last 30 days.
+        """
+        params = self.order_params(page, size, created_from, created_to, window_from, window_to)
+        return self.orders_json(self.client.get(self.api_url, endpoint="orders", params=params))
+
+    @staticmethod
+    def order_params(page, size, created_from, created_to, window_from, window_to):
+        created_to = created_to or datetime.utcnow()
+        created_from = created_from or created_to - timedelta(days=30)
+        window_from = window_from or created_from
+        window_to = window_to or created_to
+        return {
             "page": page,
             "size": size,
             "sort": "id",
             "order": "asc",
             "order_type": "processed",
             "category_id": "123",
-            "order_created_at_to": datetime.utcnow().isoformat() + 'Z',
-            "order_created_at_from": (datetime.utcnow() - timedelta(days=30)).isoformat() + 'Z',
-            "exit_from_warehouse_date_to": datetime.utcnow().isoformat() + 'Z',
-            "exit_from_warehouse_date_from": (datetime.utcnow() - timedelta(days=30)).isoformat() + 'Z',
-            "returned_to_warehouse_date_to": datetime.utcnow().isoformat() + 'Z',
-            "returned_to_warehouse_date_from": (datetime.utcnow() - timedelta(days=30)).isoformat() + 'Z',
+            "order_created_at_to": created_to.isoformat() + 'Z',
+            "order_created_at_from": created_from.isoformat() + 'Z',
+            "exit_from_warehouse_date_to": window_to.isoformat() + 'Z',
+            "exit_from_warehouse_date_from": window_from.isoformat() + 'Z',
+            "returned_to_warehouse_date_to": window_to.isoformat() + 'Z',
+            "returned_to_warehouse_date_from": window_from.isoformat() + 'Z',
             "search_text_all": "1234",
             "b2b_active": "true"
         }
 
-        response = requests.get(self.api_url, headers=self.headers, params=params)
-        if response.status_code == 200:
-            try:
-                return response.json()
-            except ValueError:
-                print("Error: Response is not in JSON format")
-                return {}
-        else:
-            print(f"Error fetching orders: {response.status_code}")
-            return {}
+    @staticmethod
+    def orders_json(response):
+        """Body of an order page; raises on a failed or unreadable page so no aggregate silently skips it."""
+        if response.status_code != 200:
+            raise Exception(f"Failed to retrieve orders, status code: {response.status_code}")
+        try:
+            return response.json()
+        except ValueError:
+            raise Exception("Failed to retrieve orders, the response is not JSON")
 
-    def get_orders_last_month(self):
-        data = self.fetch_orders()
+    @staticmethod
+    def page_items(data):
         if not data or not isinstance(data, dict) or 'data' not in data or 'items' not in data['data']:
-            return {}
+            return []
+        return data['data']['items']
 
-        orders = data['data']['items']
-        orders_per_product = {}
+    @staticmethod
+    def total_pages(data):
+        pager = data.get('data', {}).get('pager') or {}
+        return pager.get('total_pages')
 
+    @staticmethod
+    def count_orders(orders, orders_per_product):
+        """Fold a page of orders into the ``orders_per_product`` counter."""
         for order in orders:
             if not isinstance(order, dict):
                 continue
 
             product_id = order.get('product_id')
             if product_id:
-                orders_per_product[product_id] = orders_per_product.get(product_id, 0) + 1
+                orders_per_product[product_id] += 1
 
         return orders_per_product
 
-    def get_high_sales_products(self):
-        orders_per_product = self.get_orders_last_month()
+    def day_ranges(self, start, end):
+        """Split ``[start, end]`` into day-sized ``(from, to)`` sub-ranges, oldest first."""
+        ranges = []
+        range_start = start
+        while range_start < end:
+            range_end = min(range_start + timedelta(days=1), end)
+            ranges.append((range_start, range_end))
+            range_start = range_end
+        return ranges
+
+    def aggregate_range(self, created_from, created_to, window_from=None, window_to=None):
+        """Count orders per product over every page of a single sub-range."""
+        orders_per_product = Counter()
+        page = 1
+        while True:
+            data = self.fetch_orders(page, self.page_size, created_from, created_to, window_from, window_to)
+            items = self.page_items(data)
+            self.count_orders(items, orders_per_product)
+
+            total_pages = self.total_pages(data) if items else None
+            if not items or (total_pages is not None and page >= total_pages) or \
+                    (total_pages is None and len(items) < self.page_size):
+                return orders_per_product
+            page += 1
+
+    def iter_window_pages(self, created_from, created_to, window_from=None, window_to=None):
+        """Yield the orders of every page created in ``[created_from, created_to]``, as pages arrive.
+
+        Every day of the range is fetched as its own sub-range on a bounded
+        thread pool, and the remaining pages of a day are queued once its
+        first page reports how many there are. Pages are yielded in
+        completion order, not in id order. A failed page raises and cancels
+        the pages still queued.
+        """
+        window_from = window_from or created_from
+        window_to = window_to or created_to
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+
+            def submit(range_from, range_to, page):
+                future = executor.submit(self.fetch_orders, page, self.page_size,
+                                         range_from, range_to, window_from, window_to)
+                pending[future] = (range_from, range_to, page)
+
+            try:
+                for range_from, range_to in self.day_ranges(created_from, created_to):
+                    submit(range_from, range_to, 1)
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        range_from, range_to, page = pending.pop(future)
+                        data = future.result()
+                        items = self.page_items(data)
+                        if not items:
+                            continue
+
+                        total_pages = self.total_pages(data)
+                        if total_pages is None:
+                            # No pager: walk the day sequentially until a short page
+                            if len(items) == self.page_size:
+                                submit(range_from, range_to, page + 1)
+                        elif page == 1:
+                            for next_page in range(2, total_pages + 1):
+                                submit(range_from, range_to, next_page)
+
+                        yield items
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def iter_records(self, created_from, created_to, fields=None):
+        """Yield compact ``OrderRecord``s (projected to ``fields``) for orders in the range."""
+        record_cls = record_type("OrderRecord", fields or ORDER_FIELDS)
+        for items in self.iter_window_pages(created_from, created_to):
+            for order in items:
+                if isinstance(order, dict):
+                    yield record_cls.from_item(order)
+
+    @timed()
+    def get_orders_last_month(self, store=None):
+        """Count orders per product over the whole window.
+
+        With an ``OrderCountStore`` only orders newer than its high-water mark
+        are fetched and the counts come from its rolling window; otherwise
+        every page of the window is fetched and folded into the counters as
+        it arrives.
+        """
+        if store is not None:
+            self.sync(store)
+            return store.rolling_counts(self.window_days)
+
+        window_to = datetime.utcnow()
+        window_from = window_to - timedelta(days=self.window_days)
+        orders_per_product = Counter()
+        for items in self.iter_window_pages(window_from, window_to):
+            self.count_orders(items, orders_per_product)
+
+        return dict(orders_per_product)
+
+    @timed()
+    def sync(self, store):
+        """Add orders created since the store's high-water mark to its per-day counts.
+
+        Returns False when another sync moved the mark first; its counts are
+        then discarded so no order is counted twice. A failed page raises
+        before anything is applied, so the mark never moves past orders that
+        were not counted.
+        """
+        with store.sync_lock:
+            window_to = datetime.utcnow()
+            window_from = window_to - timedelta(days=self.window_days)
+            mark = store.high_water_mark()
+            mark_id, mark_created_at = mark
+            last_id, last_created_at = mark
+
+            created_from = window_from
+            if mark_created_at:
+                created_from = max(window_from, datetime.fromisoformat(mark_created_at.rstrip('Z')))
+
+            counts = Counter()
+            for items in self.iter_window_pages(created_from, window_to, window_from, window_to):
+                for order in items:
+                    if not isinstance(order, dict) or not order.get('product_id'):
+                        continue
+                    order_id = order.get('id')
+                    if mark_id is not None and order_id is not None and order_id <= mark_id:
+                        continue
+
+                    created_at = order.get('created_at') or window_to.isoformat() + 'Z'
+                    counts[(order['product_id'], created_at[:10])] += 1
+                    if order_id is not None and (last_id is None or order_id > last_id):
+                        last_id = order_id
+                    if last_created_at is None or created_at > last_created_at:
+                        last_created_at = created_at
+
+            applied = store.apply(counts, mark, (last_id, last_created_at))
+            store.prune(self.window_days)
+            return applied
+
+    def get_high_sales_products(self, store=None):
+        return self.select_high_sales(self.get_orders_last_month(store))
+
+    @staticmethod
+    def select_high_sales(orders_per_product):
+        """Keep the products that sold more than the average product."""
         if not orders_per_product:
             return {}
 
@@ -1,30 +1,57 @@
-import requests
-import re
-from PIL import Image
-from io import BytesIO
+import logging
+import threading
+
+from diginext_client import get_async_client, get_client
+from image_analysis import IMAGE_CHECKS, aanalyze_image, analyze_image
+from image_cache import get_image_cache
+from metrics import timed
+from title_analyzer import analyze_title
+
+log = logging.getLogger(__name__)
 
 
 class DigikalaProduct:
-    def __init__(self, product_id):
+    def __init__(self, product_id, client=None, image_cache=None, async_client=None):
         self.product_id = product_id
-        self.api_url = f'https://sandbox.diginext.ir/api/v3/product-creation/be-seller/{self.product_id}'
-        self.edit_api_url = f'https://sandbox.diginext.ir/api/v3/product-edit/{self.product_id}'
+        self.api_url = f'product-creation/be-seller/{self.product_id}'
+        self.edit_api_url = f'product-edit/{self.product_id}'
+        self.client = client or get_client()
+        self.async_client = async_client
+        self.image_cache = image_cache or get_image_cache()
         self.product_data = {}
         self.edit_data = {}
-        self.headers = {
-            "accept": "application/json",
-            "x-response-code": "200"
-        }
+        self._image_checks = None
+        self._title_stats = None
+        self._image_lock = threading.Lock()
+
+    def _async_client(self):
+        return self.async_client or get_async_client()
 
+    @timed()
     def fetch_product_data(self):
-        response = requests.get(self.api_url, headers=self.headers)
+        self._set_product_data(self.client.get(self.api_url, endpoint="product"))
+
+    @timed()
+    async def afetch_product_data(self):
+        self._set_product_data(await self._async_client().get(self.api_url, endpoint="product"))
+
+    def _set_product_data(self, response):
         if response.status_code == 200:
             self.product_data = response.json().get('data', {})
+            self._image_checks = None
+            self._title_stats = None
         else:
             raise Exception(f"Failed to retrieve data, status code: {response.status_code}")
 
+    @timed()
     def fetch_product_edit_data(self):
-        response = requests.get(self.edit_api_url, headers=self.headers)
+        self._set_edit_data(self.client.get(self.edit_api_url, endpoint="product"))
+
+    @timed()
+    async def afetch_product_edit_data(self):
+        self._set_edit_data(await self._async_client().get(self.edit_api_url, endpoint="product"))
+
+    def _set_edit_data(self, response):
         if response.status_code == 200:
             self.edit_data = response.json().get('data', {})
         else:
@@ -83,90 +110,66 @@ class DigikalaProduct:
         return edit_info
 
     def contains_symbols_or_emojis(self, text):
-        # Define patterns for symbols and emojis
-        symbol_pattern = re.compile(r'[^\w\s]', re.UNICODE)
-        emoji_pattern = re.compile(
-            "["
-            "\U0001F600-\U0001F64F"  # emoticons
-            "\U0001F300-\U0001F5FF"  # symbols & pictographs
-            "\U0001F680-\U0001F6FF"  # transport & map symbols
-            "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-            "\U00002702-\U000027B0"  # Dingbats
-            "\U000024C2-\U0001F251"
-            "]+", flags=re.UNICODE)
-
-        has_symbols = bool(symbol_pattern.search(text))
-        has_emojis = bool(emoji_pattern.search(text))
-
-        return has_symbols or has_emojis
-
-    def is_white_background(self):
+        return analyze_title(text).has_symbols_or_emojis
+
+    def title_stats(self):
+        """Return the ``TitleStats`` of the product name, computed once per fetched product."""
+        if self._title_stats is None and self.product_data.get("name") is not None:
+            self._title_stats = analyze_title(self.product_data["name"])
+        return self._title_stats
+
+    @timed()
+    def run_image_checks(self):
+        """Download ``productImage`` once and run every registered image check on it.
+
+        The result is memoized, so all image-based checks share one download,
+        and is served from the image analysis cache when the image is unchanged.
+        """
+        with self._image_lock:
+            if self._image_checks is None:
+                self._image_checks = self._analyze_image()
+        return self._image_checks
+
+    @timed()
+    async def arun_image_checks(self):
+        """Async version of ``run_image_checks``; later sync calls reuse its result."""
+        if self._image_checks is None:
+            self._image_checks = await self._aanalyze_image()
+        return self._image_checks
+
+    async def _aanalyze_image(self):
         if "productImage" not in self.product_data:
-            return False
-
-        image_url = self.product_data["productImage"]
+            return {name: False for name in IMAGE_CHECKS}
 
         try:
-            response = requests.get(image_url)
-            image = Image.open(BytesIO(response.content))
-            image = image.convert("RGB")
-
-            # Define white color range (you can adjust the tolerance if needed)
-            white_color = (255, 255, 255)
-            tolerance = 10
-
-            # Check if all corners of the image are white
-            width, height = image.size
-            corners = [
-                (0, 0),  # Top-left
-                (width - 1, 0),  # Top-right
-                (0, height - 1),  # Bottom-left
-                (width - 1, height - 1)  # Bottom-right
-            ]
-
-            for corner in corners:
-                r, g, b = image.getpixel(corner)
-                if not (abs(r - white_color[0]) <= tolerance and
-                        abs(g - white_color[1]) <= tolerance and
-                        abs(b - white_color[2]) <= tolerance):
-                    return False
-
-            return True
-
+            analysis = await aanalyze_image(self._async_client(), self.product_data["productImage"], self.image_cache)
         except Exception as e:
-            print(f"An error occurred while checking the image: {e}")
-            return False
+            log.warning("image analysis failed product_id=%s error=%s", self.product_id, e)
+            return {name: False for name in IMAGE_CHECKS}
 
-    def is_title_length_valid(self):
-        product_info = self.extract_product_info()
-        if product_info and "name" in product_info:
-            title = product_info["name"]
-            if len(title) >= 60:
-                return True
-            else:
-                return False
-        else:
-            return False
+        return analysis['checks']
 
-    def is_image_size_valid(self):
+    def _analyze_image(self):
         if "productImage" not in self.product_data:
-            return False
-
-        image_url = self.product_data["productImage"]
+            return {name: False for name in IMAGE_CHECKS}
 
         try:
-            response = requests.get(image_url)
-            image = Image.open(BytesIO(response.content))
+            analysis = analyze_image(self.client, self.product_data["productImage"], self.image_cache)
+        except Exception as e:
+            log.warning("image analysis failed product_id=%s error=%s", self.product_id, e)
+            return {name: False for name in IMAGE_CHECKS}
 
-            # Check image dimensions
-            width, height = image.size
-            if width >= 1000 and height >= 1000:
-                return True
-            else:
-                return False
+        return analysis['checks']
 
-        except Exception as e:
-            return False
+    def is_white_background(self):
+        return self.run_image_checks()['white_background']
+
+    def is_title_length_valid(self):
+        title_stats = self.title_stats()
+        return title_stats is not None and title_stats.length >= 60
+
+    def is_image_size_valid(self):
+        return self.run_image_checks()['image_size_valid']
 
     def has_seven_or_more_images(self):
         if self.product_data and 'images' in self.product_data:
@@ -188,15 +191,10 @@ class DigikalaProduct:
         return attribute_count >= 5
 
     def check_emojies(self):
-        product_info = self.extract_product_info()
-        if product_info and "name" in product_info:
-            title = product_info["name"]
-            if self.contains_symbols_or_emojis(title):
-                return False
-            else:
-                return True
-        else:
+        title_stats = self.title_stats()
+        if title_stats is None:
             return None
+        return not title_stats.has_symbols_or_emojis
 
 # Example usage
 # product_id = 'dkp-16587276'
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+from urllib.parse import urljoin
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+from metrics import observe_rate_limit_wait, observe_upstream
+from rate_limiter import get_rate_limiter, retry_after_seconds
+
+log = logging.getLogger(__name__)
+
+
+class DiginextClient:
+    """Pooled HTTP client shared by all Diginext API wrappers.
+
+    Keeps connections alive across calls, applies a timeout per endpoint
+    family and retries requests on 5xx and connection errors with backoff.
+    With ``pool_block`` a host never gets more than ``pool_maxsize``
+    concurrent requests; further callers wait for a free connection.
+
+    Every attempt, retries included, first takes a token from its endpoint
+    family's bucket in the process-wide rate limiter and is recorded in the
+    upstream metrics. A 429 slows the whole family down and is retried once
+    the limiter lets requests through again.
+    """
+
+    RETRY_STATUSES = (500, 502, 503, 504)
+    THROTTLED = 429
+    BACKOFF_MAX = 120
+
+    def __init__(self, base_url=None, headers=None, connect_timeout=None, read_timeouts=None,
+                 retries=None, backoff_factor=None, pool_connections=None, pool_maxsize=None,
+                 pool_block=None, rate_limiter=None, throttle_retries=None):
+        self.base_url = (base_url or config.DIGINEXT_BASE_URL).rstrip('/') + '/'
+        self.headers = dict(headers if headers is not None else config.DIGINEXT_HEADERS)
+        self.connect_timeout = connect_timeout if connect_timeout is not None else config.HTTP_CONNECT_TIMEOUT
+        self.read_timeouts = dict(config.HTTP_READ_TIMEOUTS)
+        if read_timeouts:
+            self.read_timeouts.update(read_timeouts)
+        self.retries = retries if retries is not None else config.HTTP_RETRIES
+        self.backoff_factor = backoff_factor if backoff_factor is not None else config.HTTP_BACKOFF_FACTOR
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.throttle_retries = throttle_retries if throttle_retries is not None else config.RATE_LIMIT_RETRIES
+
+        # No retries in the adapter: ``get`` retries, so every attempt goes through the rate limiter
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections or config.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=pool_maxsize or config.HTTP_POOL_MAXSIZE,
+            pool_block=pool_block if pool_block is not None else config.HTTP_POOL_BLOCK
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def url(self, path):
+        """Resolve a path against the base URL; absolute URLs are returned unchanged."""
+        return urljoin(self.base_url, path.lstrip('/')) if '://' not in path else path
+
+    def timeout(self, endpoint):
+        read_timeout = self.read_timeouts.get(endpoint, self.read_timeouts["default"])
+        return self.connect_timeout, read_timeout
+
+    def backoff(self, attempt, response=None):
+        """Seconds to wait before retry ``attempt``, honouring a Retry-After header."""
+        retry_after = retry_after_seconds(response.headers) if response is not None else None
+        if retry_after is None:
+            retry_after = self.backoff_factor * (2 ** attempt)
+        return min(retry_after, self.BACKOFF_MAX)
+
+    def get(self, path, endpoint="default", headers=None, **kwargs):
+        """GET a Diginext path (or absolute URL) using the timeout and rate limit of the given endpoint family.
+
+        The shared Diginext headers are sent unless ``headers`` is given
+        explicitly. 429s, 5xx and connection errors are retried; the last
+        response is returned, the last connection error raised.
+        """
+        kwargs.setdefault('timeout', self.timeout(endpoint))
+        url = self.url(path)
+        headers = self.headers if headers is None else headers
+        bucket = self.rate_limiter.bucket(endpoint)
+        attempt = throttled = 0
+        while True:
+            observe_rate_limit_wait(endpoint, bucket.acquire())
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                observe_upstream(endpoint, "error", time.perf_counter() - started)
+                log.debug("GET %s endpoint=%s failed attempt=%s error=%r", url, endpoint, attempt, e)
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+            except requests.RequestException:
+                observe_upstream(endpoint, "error", time.perf_counter() - started)
+                raise
+
+            elapsed = time.perf_counter() - started
+            observe_upstream(endpoint, response.status_code, elapsed)
+            log.debug("GET %s endpoint=%s status=%s seconds=%.3f", url, endpoint, response.status_code, elapsed)
+
+            if response.status_code == self.THROTTLED:
+                log.warning("throttled by Diginext endpoint=%s attempt=%s", endpoint, throttled)
+                bucket.on_throttle(self.backoff(throttled, response))
+                if throttled == self.throttle_retries:
+                    return response
+                response.close()
+                throttled += 1
+                continue
+
+            bucket.on_success()
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                return response
+            response.close()
+            time.sleep(self.backoff(attempt, response))
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide shared client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DiginextClient()
+    return _client
+
+
+class AsyncResponse:
+    """Fully read response of ``AsyncDiginextClient`` with the ``requests.Response`` attributes the wrappers use."""
+
+    __slots__ = ('status_code', 'headers', 'content', 'url')
+
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class AsyncDiginextClient:
+    """Non-blocking counterpart of ``DiginextClient`` for the ASGI app.
+
+    Same base URL, headers, per-endpoint timeouts, retry policy and rate
+    limiter, on an ``aiohttp`` session that must be created inside the
+    event loop using it. ``pool_maxsize`` caps concurrent connections;
+    further requests wait for a free one, as with ``pool_block``.
+    """
+
+    RETRY_STATUSES = DiginextClient.RETRY_STATUSES
+    THROTTLED = DiginextClient.THROTTLED
+    BACKOFF_MAX = DiginextClient.BACKOFF_MAX
+
+    def __init__(self, base_url=None, headers=None, connect_timeout=None, read_timeouts=None,
+                 retries=None, backoff_factor=None, pool_maxsize=None, rate_limiter=None, throttle_retries=None):
+        self.base_url = (base_url or config.DIGINEXT_BASE_URL).rstrip('/') + '/'
+        self.headers = dict(headers if headers is not None else config.DIGINEXT_HEADERS)
+        self.connect_timeout = connect_timeout if connect_timeout is not None else config.HTTP_CONNECT_TIMEOUT
+        self.read_timeouts = dict(config.HTTP_READ_TIMEOUTS)
+        if read_timeouts:
+            self.read_timeouts.update(read_timeouts)
+        self.retries = retries if retries is not None else config.HTTP_RETRIES
+        self.backoff_factor = backoff_factor if backoff_factor is not None else config.HTTP_BACKOFF_FACTOR
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.throttle_retries = throttle_retries if throttle_retries is not None else config.RATE_LIMIT_RETRIES
+
+        connector = aiohttp.TCPConnector(limit=pool_maxsize or config.HTTP_POOL_MAXSIZE, limit_per_host=0)
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    url = DiginextClient.url
+
+    def timeout(self, endpoint):
+        read_timeout = self.read_timeouts.get(endpoint, self.read_timeouts["default"])
+        return aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=read_timeout)
+
+    backoff = DiginextClient.backoff
+
+    async def _get(self, url, headers, **kwargs):
+        async with self.session.get(url, headers=headers, **kwargs) as response:
+            return AsyncResponse(response.status, response.headers, await response.read(), url)
+
+    async def get(self, path, endpoint="default", headers=None, **kwargs):
+        """GET a Diginext path (or absolute URL), retrying on 429/5xx and connection errors.
+
+        Returns an ``AsyncResponse`` with the body already read.
+        """
+        kwargs.setdefault('timeout', self.timeout(endpoint))
+        url = self.url(path)
+        headers = self.headers if headers is None else headers
+        bucket = self.rate_limiter.bucket(endpoint)
+        attempt = throttled = 0
+        while True:
+            observe_rate_limit_wait(endpoint, await bucket.aacquire())
+            started = time.perf_counter()
+            try:
+                response = await self._get(url, headers, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                observe_upstream(endpoint, "error", time.perf_counter() - started)
+                log.debug("GET %s endpoint=%s failed attempt=%s error=%r", url, endpoint, attempt, e)
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            elapsed = time.perf_counter() - started
+            observe_upstream(endpoint, response.status_code, elapsed)
+            log.debug("GET %s endpoint=%s status=%s seconds=%.3f", url, endpoint, response.status_code, elapsed)
+
+            if response.status_code == self.THROTTLED:
+                log.warning("throttled by Diginext endpoint=%s attempt=%s", endpoint, throttled)
+                bucket.on_throttle(self.backoff(throttled, response))
+                if throttled == self.throttle_retries:
+                    return response
+                throttled += 1
+                continue
+
+            bucket.on_success()
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                return response
+            await asyncio.sleep(self.backoff(attempt, response))
+            attempt += 1
+
+    async def aclose(self):
+        await self.session.close()
+
+
+# aiohttp sessions are bound to the event loop that first used them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the shared async client of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncDiginextClient()
+    return client
+
+
+async def close_async_client():
+    """Close the shared async client of the running event loop, if it was created."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
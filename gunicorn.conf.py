@@ -0,0 +1,44 @@
+"""Production server settings, read by ``gunicorn app:app`` from the working directory.
+
+The app is imported once in the master and the workers are forked from
+it. Importing ``app`` starts no threads and keeps no sockets or database
+connections open, so nothing is shared across the fork; HTTP and SQLite
+connections are created in each worker on first use, and each worker
+starts its scheduler as soon as it is forked. The workers share their
+snapshots (SNAPSHOT_SHARE_DIR), so only one of them syncs with Diginext
+at a time, and their rate limits (RATE_LIMIT_SHARE_DIR), so together they
+stay within the configured rates. Both default to a directory of this
+server's master, removed when it exits.
+"""
+import os
+import shutil
+import tempfile
+
+# Set before the app's config is read, so every worker of this server uses the same directories
+server_dir = os.path.join(tempfile.gettempdir(), "digi-seller-central", f"server-{os.getpid()}")
+os.environ.setdefault("SNAPSHOT_SHARE_DIR", os.path.join(server_dir, "snapshots"))
+os.environ.setdefault("RATE_LIMIT_SHARE_DIR", os.path.join(server_dir, "rate-limits"))
+
+import config as app_config  # noqa: E402 "config" itself is a gunicorn setting name
+
+bind = app_config.SERVER_BIND
+workers = app_config.SERVER_WORKERS
+worker_class = "gthread"
+threads = app_config.SERVER_THREADS
+timeout = app_config.SERVER_TIMEOUT
+graceful_timeout = app_config.SERVER_GRACEFUL_TIMEOUT
+keepalive = app_config.SERVER_KEEPALIVE
+max_requests = app_config.SERVER_MAX_REQUESTS
+max_requests_jitter = app_config.SERVER_MAX_REQUESTS // 10
+preload_app = True
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    # Sync (or load the leader's snapshots) right away instead of on the first request
+    from app import scheduler
+    scheduler.start()
+
+
+def on_exit(server):
+    shutil.rmtree(server_dir, ignore_errors=True)
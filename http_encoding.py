@@ -0,0 +1,195 @@
+"""JSON encoding, content-hash ETags and gzip/brotli negotiation shared by the Flask and Quart apps."""
+import gzip
+import hashlib
+import json
+import zlib
+
+import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain"}
+
+
+def dumps(obj):
+    """Compact JSON as bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+class FastJSONProvider:
+    """Mixin for the Flask/Quart ``DefaultJSONProvider`` that serializes compact output with orjson.
+
+    Pretty-printed output (debug mode) and custom ``dumps`` arguments keep
+    the standard library encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {"separators"}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def etag_for(body):
+    """Content hash used as a weak ETag, so it stays valid for every content coding of the body."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def negotiate(request):
+    """Best content coding the client accepts, or None for identity."""
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    return encoding if encoding and request.accept_encodings[encoding] > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=config.BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=config.GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor for streamed bodies; chunks are buffered by the codec, not flushed each time."""
+
+    def __init__(self, encoding):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=config.BROTLI_QUALITY)
+            self._compress = self._compressor.process
+        else:
+            self._compressor = zlib.compressobj(config.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = self._compressor.compress
+        self.encoding = encoding
+
+    def compress(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        return self._compress(chunk)
+
+    def flush(self):
+        return self._compressor.finish() if self.encoding == "br" else self._compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def acompress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compressible(response):
+    return (response.status_code == 200 and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers)
+
+
+def not_modified(request, etag):
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+
+def set_not_modified(response):
+    response.status_code = 304
+    response.set_data(b"")
+    for header in ('Content-Length', 'Content-Type', 'Content-Encoding'):
+        response.headers.pop(header, None)
+
+
+def finalize(response, request):
+    """``after_request`` step of the Flask app: ETag, 304 and content coding of every response.
+
+    Bodies that are already in memory get a content-hash ETag (unless the
+    view set one) and become a 304 when ``If-None-Match`` matches.
+    Compressible bodies of at least ``COMPRESS_MIN_BYTES`` are encoded with
+    the best coding the client accepts; streamed bodies are compressed as
+    they stream and carry no ETag.
+    """
+    if response.status_code != 200 or request.method not in ('GET', 'HEAD'):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if response.is_streamed:
+        encoding = negotiate(request) if compressible(response) else None
+        if encoding:
+            response.response = compress_stream(response.iter_encoded(), encoding)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+        return response
+
+    etag, _ = response.get_etag()
+    if etag is None:
+        etag = etag_for(response.get_data())
+        response.set_etag(etag, weak=True)
+    if not_modified(request, etag):
+        set_not_modified(response)
+        return response
+
+    if compressible(response) and response.content_length >= config.COMPRESS_MIN_BYTES:
+        encoding = negotiate(request)
+        if encoding:
+            response.set_data(compress(response.get_data(), encoding))
+            response.headers['Content-Encoding'] = encoding
+    return response
+
+
+async def afinalize(response, request):
+    """Async version of ``finalize`` for the Quart app."""
+    if response.status_code != 200 or request.method not in ('GET', 'HEAD'):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if not isinstance(response.response, response.data_body_class):
+        encoding = negotiate(request) if compressible(response) else None
+        if encoding:
+            body = response.response
+            response.response = response.iterable_body_class(acompress_stream(_aiter_body(body), encoding))
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+        return response
+
+    etag, _ = response.get_etag()
+    body = await response.get_data()
+    if etag is None:
+        etag = etag_for(body)
+        response.set_etag(etag, weak=True)
+    if not_modified(request, etag):
+        set_not_modified(response)
+        return response
+
+    if compressible(response) and len(body) >= config.COMPRESS_MIN_BYTES:
+        encoding = negotiate(request)
+        if encoding:
+            response.set_data(compress(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+    return response
+
+
+async def _aiter_body(body):
+    async with body as chunks:
+        async for chunk in chunks:
+            yield chunk
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from io import BytesIO
+
+from PIL import Image
+
+from metrics import span
+
+log = logging.getLogger(__name__)
+
+# Registered image-based SEO checks, keyed by their SEO field name
+IMAGE_CHECKS = {}
+
+
+def image_check(name):
+    """Register ``func(analysis) -> bool`` as an image check run by ImageAnalysis.run_checks."""
+    def decorator(func):
+        IMAGE_CHECKS[name] = func
+        return func
+    return decorator
+
+
+class ImageAnalysis:
+    """One downloaded product image shared by every image check.
+
+    Opening is lazy: ``size`` only reads the image header, and pixels are
+    decoded the first time a check asks for ``rgb``.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self._image = None
+        self._rgb = None
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = Image.open(BytesIO(self.content))
+        return self._image
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def perceptual_hash(self):
+        """64-bit difference hash (dHash) of the image as a hex string."""
+        pixels = list(self.image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+        bits = 0
+        for row in range(8):
+            for col in range(8):
+                left = pixels[row * 9 + col]
+                right = pixels[row * 9 + col + 1]
+                bits = (bits << 1) | (left > right)
+        return f"{bits:016x}"
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = self.image if self.image.mode == "RGB" else self.image.convert("RGB")
+        return self._rgb
+
+    def run_checks(self, names=None):
+        """Run the registered checks (or only ``names``); a failing check counts as False."""
+        results = {}
+        for name, check in IMAGE_CHECKS.items():
+            if names is not None and name not in names:
+                continue
+            try:
+                results[name] = check(self)
+            except Exception as e:
+                log.warning("image check failed check=%s error=%s", name, e)
+                results[name] = False
+        return results
+
+    def summary(self):
+        """Everything worth caching about the image: dimensions, perceptual hash and check results."""
+        width, height = self.size
+        with span("image.decode"):
+            self.image.load()
+        with span("image.phash"):
+            phash = self.perceptual_hash
+        with span("image.checks"):
+            checks = self.run_checks()
+        return {
+            "width": width,
+            "height": height,
+            "phash": phash,
+            "checks": checks
+        }
+
+
+def analyze_image(client, image_url, cache=None):
+    """Return ``ImageAnalysis.summary()`` for ``image_url``, going through ``cache`` when given.
+
+    A fresh cache entry is returned without any request; a stale one is
+    revalidated with a conditional GET and reused on 304 Not Modified.
+    """
+    entry = _cache_entry(image_url, cache)
+    if entry and cache.is_fresh(entry):
+        return entry['analysis']
+
+    headers = cache.validators(entry) if entry else {}
+    response = client.get(image_url, endpoint="image", headers=headers)
+    return _analyze_response(image_url, response, entry, cache)
+
+
+async def aanalyze_image(client, image_url, cache=None):
+    """Async version of ``analyze_image`` for an ``AsyncDiginextClient``.
+
+    Decoding and checking the image runs in a worker thread.
+    """
+    entry = _cache_entry(image_url, cache)
+    if entry and cache.is_fresh(entry):
+        return entry['analysis']
+
+    headers = cache.validators(entry) if entry else {}
+    response = await client.get(image_url, endpoint="image", headers=headers)
+    return await asyncio.to_thread(_analyze_response, image_url, response, entry, cache)
+
+
+def _cache_entry(image_url, cache):
+    entry = cache.get(image_url) if cache else None
+    if entry and not set(IMAGE_CHECKS) <= set(entry['analysis'].get('checks', {})):
+        # Computed before a check was registered, so it cannot be reused
+        return None
+    return entry
+
+
+def _analyze_response(image_url, response, entry, cache):
+    if response.status_code == 304 and entry:
+        return cache.revalidated(image_url, entry)['analysis']
+    if response.status_code != 200:
+        raise Exception(f"Failed to retrieve image, status code: {response.status_code}")
+
+    analysis = ImageAnalysis(response.content).summary()
+    if cache:
+        cache.set(image_url, analysis,
+                  etag=response.headers.get('ETag'),
+                  last_modified=response.headers.get('Last-Modified'))
+    return analysis
+
+
+@image_check('white_background')
+def is_white_background(analysis):
+    # Define white color range (you can adjust the tolerance if needed)
+    white_color = (255, 255, 255)
+    tolerance = 10
+
+    # Check if all corners of the image are white
+    width, height = analysis.size
+    corners = [
+        (0, 0),  # Top-left
+        (width - 1, 0),  # Top-right
+        (0, height - 1),  # Bottom-left
+        (width - 1, height - 1)  # Bottom-right
+    ]
+
+    image = analysis.rgb
+    for corner in corners:
+        r, g, b = image.getpixel(corner)
+        if not (abs(r - white_color[0]) <= tolerance and
+                abs(g - white_color[1]) <= tolerance and
+                abs(b - white_color[2]) <= tolerance):
+            return False
+
+    return True
+
+
+@image_check('image_size_valid')
+def is_image_size_valid(analysis):
+    width, height = analysis.size
+    return width >= 1000 and height >= 1000
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import config
+
+
+class ImageAnalysisCache:
+    """On-disk LRU cache of image analysis results.
+
+    Each entry is a small JSON file named after the SHA-256 of the image URL
+    and holds the analysis together with the ETag/Last-Modified validators
+    of the response it was computed from. Entries younger than ``max_age``
+    are used as is; older ones are revalidated with a conditional GET.
+    The access time of an entry is its file mtime, and the least recently
+    used entries are evicted once the directory grows past ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes=None, max_age=None):
+        self.directory = directory
+        self.max_bytes = max_bytes if max_bytes is not None else config.IMAGE_CACHE_MAX_BYTES
+        self.max_age = max_age if max_age is not None else config.IMAGE_CACHE_MAX_AGE
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._scan())
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _scan(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, url):
+        """Return the cached entry for ``url`` (marking it as recently used) or None."""
+        path = self._path(url)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('url') == url else None
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get('checked_at', 0) < self.max_age
+
+    def validators(self, entry):
+        """Conditional request headers that revalidate ``entry``."""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def set(self, url, analysis, etag=None, last_modified=None):
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "checked_at": time.time(),
+            "analysis": analysis
+        }
+        self._write(self._path(url), json.dumps(entry).encode('utf-8'))
+        return entry
+
+    def revalidated(self, url, entry):
+        """Record that the origin confirmed ``entry`` is still current (HTTP 304)."""
+        return self.set(url, entry['analysis'], entry.get('etag'), entry.get('last_modified'))
+
+    def _write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        with self._lock:
+            try:
+                previous_size = os.path.getsize(path)
+            except OSError:
+                previous_size = 0
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries down to 90% of the budget so that
+        # eviction does not rescan the directory on every write.
+        entries = sorted(self._scan(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Return the process-wide image cache, or None when IMAGE_CACHE_DIR is empty."""
+    global _cache
+    if _cache is None and config.IMAGE_CACHE_DIR:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageAnalysisCache(config.IMAGE_CACHE_DIR)
+    return _cache
@@ -0,0 +1,261 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations, islice
+
+import config
+from diginext_client import get_client
+from image_analysis import analyze_image
+from image_cache import get_image_cache
+from metrics import timed
+
+log = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+def parse_product_id(value):
+    """Catalog product_id from a route argument, with or without the ``dkp-`` prefix; raises ValueError."""
+    return int(value.removeprefix("dkp-"))
+
+
+class MultiIndexHash:
+    """Set of 64-bit perceptual hashes with Hamming-radius search (multi-index hashing).
+
+    Each hash is split into ``chunks`` disjoint bit ranges and stored in
+    one table per range. Two hashes within distance ``r`` must agree to
+    within ``r // chunks`` bits on at least one range (pigeonhole), so a
+    search only looks up the chunk values that close to the query's in
+    each table and checks the full distance of those candidates, instead
+    of comparing against every hash. Radii whose lookups would outnumber
+    the stored hashes fall back to a scan.
+    """
+
+    def __init__(self, chunks=4):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self.chunk_mask = (1 << self.chunk_bits) - 1
+        self.tables = [{} for _ in range(chunks)]
+        self.hashes = set()
+        self._flips = {}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _chunk_values(self, value):
+        return [(value >> (chunk * self.chunk_bits)) & self.chunk_mask for chunk in range(self.chunks)]
+
+    def flips(self, radius):
+        """XOR masks of every chunk value within ``radius`` bits."""
+        masks = self._flips.get(radius)
+        if masks is None:
+            masks = self._flips[radius] = [
+                sum(1 << bit for bit in bits)
+                for distance in range(radius + 1) for bits in combinations(range(self.chunk_bits), distance)]
+        return masks
+
+    def add(self, value):
+        """Insert ``value``; returns False when it is already in the set."""
+        if value in self.hashes:
+            return False
+        self.hashes.add(value)
+        for table, chunk_value in zip(self.tables, self._chunk_values(value)):
+            table.setdefault(chunk_value, set()).add(value)
+        return True
+
+    def discard(self, value):
+        if value not in self.hashes:
+            return
+        self.hashes.discard(value)
+        for table, chunk_value in zip(self.tables, self._chunk_values(value)):
+            bucket = table[chunk_value]
+            bucket.discard(value)
+            if not bucket:
+                del table[chunk_value]
+
+    def search(self, value, max_distance):
+        """Return ``(distance, hash)`` for every hash within ``max_distance`` of ``value``."""
+        masks = self.flips(max_distance // self.chunks) if max_distance < HASH_BITS else None
+        if masks is None or len(masks) * self.chunks > len(self.hashes):
+            candidates = self.hashes
+        else:
+            candidates = set()
+            for table, chunk_value in zip(self.tables, self._chunk_values(value)):
+                for mask in masks:
+                    bucket = table.get(chunk_value ^ mask)
+                    if bucket:
+                        candidates |= bucket
+        results = []
+        for candidate in candidates:
+            distance = (value ^ candidate).bit_count()
+            if distance <= max_distance:
+                results.append((distance, candidate))
+        return results
+
+
+class CatalogImageIndex:
+    """Perceptual hashes of the catalog's main images, searchable by Hamming distance.
+
+    Each ``image_src`` is downloaded and hashed once (through the image
+    analysis cache) and its hash goes into a ``MultiIndexHash``, so
+    finding the products that reuse or nearly reuse an image is a few
+    table lookups instead of a comparison against every product. Products
+    are indexed batch by batch as the catalog is walked; a later walk only
+    hashes images it has not seen.
+    """
+
+    def __init__(self, client=None, image_cache=None, workers=None, batch_size=None):
+        self.client = client or get_client()
+        self.image_cache = image_cache if image_cache is not None else get_image_cache()
+        self.workers = workers or config.IMAGE_INDEX_WORKERS
+        self.batch_size = batch_size or config.IMAGE_INDEX_BATCH
+        self.hashes = {}
+        self.products = {}
+        self.by_hash = {}
+        self.hash_index = MultiIndexHash()
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def hash_image(self, image_src):
+        """64-bit perceptual hash of ``image_src`` as an int."""
+        return int(analyze_image(self.client, image_src, self.image_cache)["phash"], 16)
+
+    def _hash_images(self, image_srcs, executor):
+        results = {}
+        futures = {image_src: executor.submit(self.hash_image, image_src) for image_src in image_srcs}
+        for image_src, future in futures.items():
+            try:
+                results[image_src] = future.result()
+            except Exception as e:
+                self.failures += 1
+                log.warning("image hash failed image_src=%s error=%s", image_src, e)
+        return results
+
+    @timed()
+    def add_products(self, products, executor=None):
+        """Index the main image of ``products`` (``ProductRecord``s); returns the product_ids that changed.
+
+        Images that fail to download are left out and retried by the next call.
+        """
+        products = [(product.product_id, product.image_src) for product in products if product.image_src]
+        new_images = {image_src for _, image_src in products if image_src not in self.hashes}
+        hashes = self._hash_images(new_images, executor) if new_images else {}
+
+        changed = set()
+        with self._lock:
+            self.hashes.update(hashes)
+            for product_id, image_src in products:
+                if self.products.get(product_id) == image_src or image_src not in self.hashes:
+                    continue
+                self._remove(product_id)
+                phash = self.hashes[image_src]
+                self.products[product_id] = image_src
+                self.by_hash.setdefault(phash, set()).add(product_id)
+                self.hash_index.add(phash)
+                changed.add(product_id)
+        return changed
+
+    @timed()
+    def update_catalog(self, products):
+        """Make ``products`` the indexed catalog, indexing it in batches of ``batch_size``.
+
+        Every batch is searchable as soon as it is indexed; products missing
+        from ``products`` are dropped at the end.
+        """
+        products = iter(products)
+        seen = set()
+        changed = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                batch = list(islice(products, self.batch_size))
+                if not batch:
+                    break
+                seen.update(product.product_id for product in batch)
+                changed |= self.add_products(batch, executor)
+
+        with self._lock:
+            for product_id in set(self.products) - seen:
+                self._remove(product_id)
+                changed.add(product_id)
+            used = set(self.products.values())
+            self.hashes = {image_src: phash for image_src, phash in self.hashes.items() if image_src in used}
+        return changed
+
+    def export_state(self):
+        """``{product_id: (image_src, phash)}`` of the indexed products, for ``load_state`` elsewhere."""
+        with self._lock:
+            return {product_id: (image_src, self.hashes[image_src]) for product_id, image_src in self.products.items()}
+
+    @timed()
+    def load_state(self, state):
+        """Make ``state`` (from ``export_state``) the indexed catalog without downloading any image.
+
+        Returns the product_ids that changed.
+        """
+        changed = set()
+        with self._lock:
+            for product_id in set(self.products) - set(state):
+                self._remove(product_id)
+                changed.add(product_id)
+            for product_id, (image_src, phash) in state.items():
+                if self.products.get(product_id) == image_src:
+                    continue
+                self._remove(product_id)
+                phash = self.hashes.setdefault(image_src, phash)
+                self.products[product_id] = image_src
+                self.by_hash.setdefault(phash, set()).add(product_id)
+                self.hash_index.add(phash)
+                changed.add(product_id)
+            used = set(self.products.values())
+            self.hashes = {image_src: phash for image_src, phash in self.hashes.items() if image_src in used}
+        return changed
+
+    def _remove(self, product_id):
+        image_src = self.products.pop(product_id, None)
+        if image_src is None:
+            return
+        phash = self.hashes[image_src]
+        product_ids = self.by_hash[phash]
+        product_ids.discard(product_id)
+        if not product_ids:
+            del self.by_hash[phash]
+            self.hash_index.discard(phash)
+
+    def search(self, phash, max_distance=None, limit=None, exclude=None):
+        """Products whose image is within ``max_distance`` of ``phash``, closest first.
+
+        Returns ``[{"product_id", "image_src", "phash", "distance"}]``.
+        """
+        max_distance = config.IMAGE_SIMILAR_DISTANCE if max_distance is None else max_distance
+        results = []
+        with self._lock:
+            for distance, match in sorted(self.hash_index.search(phash, max_distance)):
+                for product_id in sorted(self.by_hash.get(match, ())):
+                    if product_id == exclude:
+                        continue
+                    results.append({
+                        "product_id": product_id,
+                        "image_src": self.products[product_id],
+                        "phash": f"{match:016x}",
+                        "distance": distance,
+                    })
+                    if limit is not None and len(results) >= limit:
+                        return results
+        return results
+
+    def similar_to(self, product_id, max_distance=None, limit=None):
+        """Return ``(image_src, phash, matches)`` for the image of ``product_id``, or None if it is not indexed."""
+        with self._lock:
+            image_src = self.products.get(product_id)
+            phash = self.hashes.get(image_src)
+        if phash is None:
+            return None
+        return image_src, f"{phash:016x}", self.search(phash, max_distance, limit, exclude=product_id)
+
+    def get_stats(self):
+        return {
+            "products": len(self.products),
+            "images": len(self.hashes),
+            "hashes": len(self.by_hash),
+            "failures": self.failures,
+        }
@@ -0,0 +1,244 @@
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from rate_limiter import get_rate_limiter
+
+# Upper bounds (seconds) shared by every latency histogram
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative latency histogram with one series per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        lines = []
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in sorted(values.items())]
+
+
+class Collector:
+    """Metric family read at scrape time from ``func() -> {label values: value}``."""
+
+    def __init__(self, name, help, kind, labelnames, func):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.func = func
+
+    def collect(self):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in sorted(self.func().items())]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.collect()
+            except Exception:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "diginext_request_seconds", "Duration of one Diginext HTTP request.", ("endpoint", "status")))
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "diginext_rate_limit_wait_seconds", "Time a request queued in the client rate limiter.", ("endpoint",)))
+SPAN_SECONDS = REGISTRY.register(Histogram(
+    "span_seconds", "Duration of wrapper methods and processing steps.", ("span",)))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "http_request_seconds", "Duration of API requests until the response is returned.",
+    ("route", "method", "status")))
+ERRORS = REGISTRY.register(Counter("span_errors_total", "Spans that ended with an exception.", ("span",)))
+
+
+def observe_http(route, method, status, seconds):
+    if config.METRICS_ENABLED:
+        HTTP_SECONDS.observe(seconds, route or "unmatched", method, str(status))
+
+
+def observe_upstream(endpoint, status, seconds):
+    if config.METRICS_ENABLED:
+        UPSTREAM_SECONDS.observe(seconds, endpoint, str(status))
+
+
+def observe_rate_limit_wait(endpoint, seconds):
+    if config.METRICS_ENABLED:
+        RATE_LIMIT_WAIT_SECONDS.observe(seconds, endpoint)
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block into ``span_seconds{span=name}``."""
+    if not config.METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        ERRORS.inc(name)
+        raise
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - started, name)
+
+
+def timed(name=None):
+    """Decorator recording every call of a function or coroutine function as a span.
+
+    The span is named after the method's qualified name unless ``name`` is given.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_app_collectors(product_index, response_cache=None, scheduler=None, image_index=None):
+    """Expose the rate limiter, product index, response cache, sync and image index state read at scrape time."""
+    def limiter_stat(name):
+        return lambda: {(endpoint,): stats[name] for endpoint, stats in get_rate_limiter().get_stats().items()}
+
+    REGISTRY.register(Collector(
+        "diginext_rate_limit_rate", "Current client rate limit (requests/s, 0 = unlimited).", "gauge",
+        ("endpoint",), limiter_stat("rate")))
+    REGISTRY.register(Collector(
+        "diginext_rate_limit_waiting", "Requests currently queued in the rate limiter.", "gauge",
+        ("endpoint",), limiter_stat("waiting")))
+    REGISTRY.register(Collector(
+        "diginext_throttled_total", "429 responses received from Diginext.", "counter",
+        ("endpoint",), limiter_stat("throttled")))
+
+    def data_age():
+        age = product_index.data_age()
+        return {} if age is None else {(): age}
+
+    REGISTRY.register(Collector(
+        "product_index_data_age_seconds", "Age of the least recently refreshed product index source.", "gauge",
+        (), data_age))
+
+    if response_cache is not None:
+        REGISTRY.register(Collector(
+            "response_cache_events_total", "Response cache lookups by outcome.", "counter",
+            ("event",), lambda: {(event,): count for event, count in response_cache.get_stats().items()}))
+
+    if scheduler is not None:
+        REGISTRY.register(Collector(
+            "sync_snapshot_version", "Version of the latest snapshot of each synced source.", "gauge",
+            ("source",), lambda: {(source,): snapshot.version for source, snapshot in list(scheduler.snapshots.items())}))
+        REGISTRY.register(Collector(
+            "sync_snapshot_age_seconds", "Age of the latest snapshot of each synced source.", "gauge",
+            ("source",), lambda: {(source,): snapshot.age() for source, snapshot in list(scheduler.snapshots.items())}))
+        REGISTRY.register(Collector(
+            "sync_failures_total", "Failed sync runs per source.", "counter",
+            ("source",), lambda: {(source,): job.failures for source, job in scheduler.jobs.items()}))
+
+    if image_index is not None:
+        REGISTRY.register(Collector(
+            "image_index_size", "Products, distinct images and distinct hashes in the catalog image index.",
+            "gauge", ("kind",),
+            lambda: {(kind,): count for kind, count in image_index.get_stats().items() if kind != "failures"}))
+        REGISTRY.register(Collector(
+            "image_index_failures_total", "Catalog images that could not be downloaded or hashed.", "counter",
+            (), lambda: {(): image_index.failures}))
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import config
+
+
+class OrderCountStore:
+    """Persistent per-product, per-day order counts backed by SQLite.
+
+    A high-water mark (largest order id and ``created_at`` seen) lets
+    ``DigikalaOrderHistory.sync`` fetch only newer orders, and the high
+    sales window is answered by summing the days that are still inside it.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or config.ORDER_STORE_PATH
+        self.sync_lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Schema setup uses its own connection, so none is left open to be inherited across a fork
+        connection = self._connect()
+        try:
+            # product_id has no declared type so integer ids stay integers
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS order_counts (
+                    product_id,
+                    day TEXT NOT NULL,
+                    orders INTEGER NOT NULL,
+                    PRIMARY KEY (product_id, day)
+                );
+                CREATE INDEX IF NOT EXISTS order_counts_day ON order_counts (day);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_order_id INTEGER,
+                    last_created_at TEXT
+                );
+                INSERT OR IGNORE INTO sync_state (id) VALUES (1);
+            """)
+        finally:
+            connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _connection(self):
+        # SQLite connections cannot be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def high_water_mark(self):
+        """Return ``(last_order_id, last_created_at)``; both are None before the first sync."""
+        return self._connection().execute("SELECT last_order_id, last_created_at FROM sync_state").fetchone()
+
+    def apply(self, counts, expected_mark, new_mark):
+        """Add ``{(product_id, day): orders}`` and move the mark, atomically.
+
+        Nothing is written when the mark is no longer ``expected_mark``,
+        i.e. another sync already counted these orders.
+        """
+        with self._transaction() as connection:
+            if tuple(self.high_water_mark()) != tuple(expected_mark):
+                return False
+            connection.executemany("""
+                INSERT INTO order_counts (product_id, day, orders) VALUES (?, ?, ?)
+                ON CONFLICT (product_id, day) DO UPDATE SET orders = orders + excluded.orders
+            """, [(product_id, day, orders) for (product_id, day), orders in counts.items()])
+            connection.execute("UPDATE sync_state SET last_order_id = ?, last_created_at = ?", tuple(new_mark))
+            return True
+
+    @staticmethod
+    def first_day(days):
+        return (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+
+    def rolling_counts(self, days):
+        """Orders per product summed over the days still inside the ``days``-long window."""
+        rows = self._connection().execute(
+            "SELECT product_id, SUM(orders) FROM order_counts WHERE day >= ? GROUP BY product_id",
+            (self.first_day(days),))
+        return dict(rows.fetchall())
+
+    def prune(self, days):
+        """Drop the days that aged out of the window."""
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM order_counts WHERE day < ?", (self.first_day(days),))
+
+
+class _Transaction:
+    """``BEGIN IMMEDIATE`` ... ``COMMIT`` around a block; nested use joins the outer transaction."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.owner = False
+
+    def __enter__(self):
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.owner = True
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.owner:
+            self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
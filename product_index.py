@@ -0,0 +1,139 @@
+import threading
+import time
+
+from digikala_order_history import DigikalaOrderHistory
+from metrics import timed
+
+
+class IndexEntry:
+    __slots__ = ("product", "warehouse_stock", "sales")
+
+    def __init__(self):
+        self.product = None
+        self.warehouse_stock = 0
+        self.sales = 0
+
+
+class ProductIndex:
+    """Materialized join of catalog, warehouse stock and sales keyed by product_id.
+
+    Each source is updated on its own from the scheduler's snapshots and
+    only the products whose entry changed are re-evaluated against the
+    "high sales and out of stock" view, so reading the view is O(result)
+    no matter how large the catalog is. Catalog metadata is held as
+    ``ProductRecord``s and only turned into dicts for the response.
+    """
+
+    SOURCES = ("catalog", "stock", "sales")
+
+    def __init__(self):
+        self.entries = {}
+        self.high_sales = set()
+        self.high_sales_not_in_stock = {}
+        self.updated_at = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def _entry(self, product_id):
+        entry = self.entries.get(product_id)
+        if entry is None:
+            entry = self.entries[product_id] = IndexEntry()
+        return entry
+
+    @timed()
+    def _reevaluate(self, product_ids):
+        for product_id in product_ids:
+            entry = self.entries.get(product_id)
+            if entry and entry.product is not None and product_id in self.high_sales \
+                    and entry.warehouse_stock <= 0:
+                self.high_sales_not_in_stock[product_id] = entry.product
+            else:
+                self.high_sales_not_in_stock.pop(product_id, None)
+
+    @timed()
+    def update_catalog(self, products):
+        """Replace catalog metadata with ``products`` (an iterable of ``ProductRecord``s).
+
+        ``products`` may be a lazy catalog walk; it is consumed before the
+        lock is taken so readers are not blocked on upstream pages.
+        """
+        updates = {}
+        seen = set()
+        for product in products:
+            product_id = product.product_id
+            seen.add(product_id)
+            entry = self.entries.get(product_id)
+            if entry is None or entry.product != product:
+                updates[product_id] = product
+
+        with self._lock:
+            for product_id, product in updates.items():
+                self._entry(product_id).product = product
+
+            changed = set(updates)
+            for product_id, entry in self.entries.items():
+                if product_id not in seen and entry.product is not None:
+                    entry.product = None
+                    changed.add(product_id)
+
+            self._reevaluate(changed)
+            self._mark_updated("catalog")
+        return changed
+
+    @timed()
+    def apply_stock_changes(self, changes):
+        """Apply the ``StockChange``s of an inventory fetch; only those products are re-evaluated."""
+        changed = set()
+        with self._lock:
+            for change in changes:
+                self._entry(change.product_id).warehouse_stock = change.warehouse_stock or 0
+                changed.add(change.product_id)
+
+            self._reevaluate(changed)
+            self._mark_updated("stock")
+        return changed
+
+    @timed()
+    def update_sales(self, orders_per_product):
+        """Replace sales counts with ``{product_id: orders}`` over the order history window."""
+        changed = set()
+        high_sales = set(DigikalaOrderHistory.select_high_sales(orders_per_product))
+        with self._lock:
+            for product_id, sales in orders_per_product.items():
+                entry = self._entry(product_id)
+                if entry.sales != sales:
+                    entry.sales = sales
+                    changed.add(product_id)
+
+            for product_id, entry in self.entries.items():
+                if product_id not in orders_per_product and entry.sales:
+                    entry.sales = 0
+                    changed.add(product_id)
+
+            changed |= high_sales ^ self.high_sales
+            self.high_sales = high_sales
+            self._reevaluate(changed)
+            self._mark_updated("sales")
+        return changed
+
+    def _mark_updated(self, source):
+        self.updated_at[source] = time.time()
+        if len(self.updated_at) == len(self.SOURCES):
+            self._ready.set()
+
+    def data_age(self):
+        """Seconds since the least recently refreshed source was updated, or None."""
+        if len(self.updated_at) < len(self.SOURCES):
+            return None
+        return time.time() - min(self.updated_at.values())
+
+    @timed()
+    def get_high_sales_not_in_stock(self):
+        """Return ``(products, data_age)`` for the high sales, out of stock view."""
+        with self._lock:
+            products = list(self.high_sales_not_in_stock.values())
+        return [product.to_dict() for product in products], self.data_age()
+
+    def wait_ready(self, timeout=None):
+        """Block until every source has been loaded at least once."""
+        return self._ready.wait(timeout)
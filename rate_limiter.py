@@ -0,0 +1,255 @@
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import config
+
+
+def retry_after_seconds(headers):
+    """Seconds requested by a ``Retry-After`` header (delta or HTTP date), or None."""
+    retry_after = headers.get('Retry-After')
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+
+
+class BucketState:
+    """Tokens, rate and pause of a ``TokenBucket``; read and changed only inside ``with state:``."""
+
+    def __init__(self, rate, tokens):
+        self.tokens = tokens
+        self.updated = time.monotonic()
+        self.rate = rate
+        self.blocked_until = 0.0
+        self.epoch = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+class SharedBucketState(BucketState):
+    """``BucketState`` kept in a file mapped by every process of a server, so they share one budget.
+
+    ``with state:`` holds an exclusive ``flock`` on the file, loads the
+    fields on entry and stores them on exit. Times are ``time.monotonic()``,
+    which is the same clock in every process of the host; a file left from
+    before a reboot (times far ahead of the clock) starts over.
+    """
+
+    FIELDS = struct.Struct("=ddddq")
+
+    def __init__(self, path, rate, tokens):
+        super().__init__(rate, tokens)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < self.FIELDS.size:
+                os.ftruncate(self._fd, self.FIELDS.size)
+            self._map = mmap.mmap(self._fd, self.FIELDS.size)
+            _, updated, _, blocked_until, _ = self.FIELDS.unpack_from(self._map)
+            if not updated or max(updated, blocked_until) > self.updated + 3600:
+                self._store()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _store(self):
+        self.FIELDS.pack_into(self._map, 0, self.tokens, self.updated, self.rate, self.blocked_until, self.epoch)
+
+    def __enter__(self):
+        self._lock.acquire()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self.tokens, self.updated, self.rate, self.blocked_until, self.epoch = self.FIELDS.unpack_from(self._map)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self._store()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._lock.release()
+
+
+class TokenBucket:
+    """Token bucket for one endpoint family that backs off when upstream throttles.
+
+    Callers reserve a token and then sleep outside the lock until it is
+    theirs, so waiters are served in arrival order. A 429 cuts the rate
+    (multiplicative decrease) and pauses the whole family until its
+    ``Retry-After``; every successful response wins back part of the
+    configured rate (additive increase). A rate of 0 disables the limit
+    but still honours the pause after a 429. The tokens, rate and pause
+    live in ``state``, a ``SharedBucketState`` in the file ``share_path``
+    when processes share the budget; the stats are those of this process.
+    """
+
+    def __init__(self, name, rate, burst=None, min_fraction=None, decrease=None, recovery=None, share_path=None):
+        self.name = name
+        self.max_rate = rate
+        self.burst = max(burst or 1, 1)
+        self.min_rate = rate * (min_fraction if min_fraction is not None else config.RATE_LIMIT_MIN_FRACTION)
+        self.decrease = decrease if decrease is not None else config.RATE_LIMIT_DECREASE
+        self.recovery = rate * (recovery if recovery is not None else config.RATE_LIMIT_RECOVERY)
+        if share_path:
+            self.state = SharedBucketState(share_path, rate, float(self.burst))
+        else:
+            self.state = BucketState(rate, float(self.burst))
+        self.stats = {"acquired": 0, "waited": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+                      "throttled": 0, "waiting": 0}
+
+    def _reserve(self, requeue=False):
+        """Take a token, possibly one that only exists in the future.
+
+        Returns ``(seconds to wait for it, throttle epoch)``.
+        """
+        with self.state as state:
+            now = time.monotonic()
+            delay = max(state.blocked_until - now, 0.0)
+            if self.max_rate:
+                # No tokens accrue while the family is paused
+                if now > state.updated:
+                    state.tokens = min(state.tokens + (now - state.updated) * state.rate, self.burst)
+                    state.updated = now
+                state.tokens -= 1
+                if state.tokens < 0:
+                    delay += -state.tokens / state.rate
+            if not requeue:
+                self.stats["acquired"] += 1
+                if delay > 0:
+                    self.stats["waiting"] += 1
+            return delay, state.epoch
+
+    def _epoch(self):
+        with self.state as state:
+            return state.epoch
+
+    def _done_waiting(self, waited):
+        with self.state:
+            self.stats["waiting"] -= 1
+            self.stats["waited"] += 1
+            self.stats["wait_seconds_total"] += waited
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+
+    def acquire(self):
+        """Block until a request may be sent; returns the seconds waited.
+
+        A caller still waiting when a 429 arrives gives up its slot and
+        queues again at the reduced rate behind the pause.
+        """
+        delay, epoch = self._reserve()
+        waited = 0.0
+        try:
+            while delay:
+                time.sleep(delay)
+                waited += delay
+                if epoch == self._epoch():
+                    break
+                delay, epoch = self._reserve(requeue=True)
+        finally:
+            if waited:
+                self._done_waiting(waited)
+        return waited
+
+    async def aacquire(self):
+        """Async version of ``acquire``."""
+        delay, epoch = self._reserve()
+        waited = 0.0
+        try:
+            while delay:
+                await asyncio.sleep(delay)
+                waited += delay
+                if epoch == self._epoch():
+                    break
+                delay, epoch = self._reserve(requeue=True)
+        finally:
+            if waited:
+                self._done_waiting(waited)
+        return waited
+
+    def on_success(self):
+        # The rate last seen by this process; a stale one only delays the recovery to the next request
+        if self.state.rate < self.max_rate:
+            with self.state as state:
+                state.rate = min(state.rate + self.recovery, self.max_rate)
+
+    def on_throttle(self, pause):
+        """Slow down after a 429 and hold every request of the family for ``pause`` seconds."""
+        with self.state as state:
+            self.stats["throttled"] += 1
+            now = time.monotonic()
+            # 429s of requests already in flight when the family was paused count as one event
+            if self.max_rate and now >= state.blocked_until:
+                state.rate = max(state.rate * self.decrease, self.min_rate)
+            state.blocked_until = max(state.blocked_until, now + pause)
+            # Waiting callers requeue, so their reserved tokens are handed back
+            state.epoch += 1
+            if self.max_rate:
+                state.tokens = 0.0
+                state.updated = max(state.updated, state.blocked_until)
+
+    def get_stats(self):
+        with self.state as state:
+            stats = dict(self.stats, rate=state.rate, configured_rate=self.max_rate, burst=self.burst)
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["waited"] if stats["waited"] else 0.0
+        return stats
+
+
+class RateLimiter:
+    """One ``TokenBucket`` per endpoint family, shared by every client in the process.
+
+    With a ``share_dir`` the buckets' state is kept in ``<family>.bucket``
+    files there, so every process using the directory draws on the same
+    budget instead of each getting the whole configured rate.
+    """
+
+    def __init__(self, limits=None, share_dir=None):
+        self.limits = limits if limits is not None else config.RATE_LIMITS
+        self.share_dir = share_dir if share_dir is not None else config.RATE_LIMIT_SHARE_DIR
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, endpoint):
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            with self._lock:
+                bucket = self.buckets.get(endpoint)
+                if bucket is None:
+                    rate, burst = self.limits.get(endpoint, self.limits["default"])
+                    share_path = None
+                    if self.share_dir:
+                        os.makedirs(self.share_dir, mode=0o700, exist_ok=True)
+                        share_path = os.path.join(self.share_dir, f"{endpoint}.bucket")
+                    bucket = self.buckets[endpoint] = TokenBucket(endpoint, rate, burst, share_path=share_path)
+        return bucket
+
+    def get_stats(self):
+        return {name: bucket.get_stats() for name, bucket in list(self.buckets.items())}
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter, creating it on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,58 @@
+class Record:
+    """Base for compact, ``__slots__``-based records.
+
+    Subclasses come from ``record_type`` and hold exactly the fields they
+    were created with, so a projection only materializes what it names.
+    Records are converted to dicts only at the JSON response boundary.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_item(cls, item, getters=None):
+        """Build a record from a raw API item; ``getters`` maps fields to extractors other than ``item.get``."""
+        getters = getters or {}
+        return cls(*(getters[name](item) if name in getters else item.get(name) for name in cls.__slots__))
+
+    def to_dict(self, fields=None):
+        return {name: getattr(self, name) for name in (fields or self.__slots__)}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+_RECORD_TYPES = {}
+
+
+def record_type(name, fields):
+    """Return the record class called ``name`` with ``fields`` as slots, creating it once per projection."""
+    key = (name, tuple(fields))
+    cls = _RECORD_TYPES.get(key)
+    if cls is None:
+        cls = _RECORD_TYPES[key] = type(name, (Record,), {"__slots__": tuple(fields)})
+    return cls
+
+
+PRODUCT_FIELDS = (
+    "variants_count", "site", "title", "status", "product_id", "fake", "status_data", "is_owner",
+    "main_category_title", "active", "title_fa", "title_en", "brand_id", "brand_title_en",
+    "brand_title_fa", "product_url", "image_src", "dimension_level", "brand_title",
+    "moderation_status", "adverge_url",
+)
+INVENTORY_FIELDS = ("product_id", "warehouse_stock")
+ORDER_FIELDS = ("id", "product_id", "created_at")
+# One changed inventory row; ``warehouse_stock`` is None once the product left the inventory
+STOCK_CHANGE_FIELDS = ("version", "product_id", "previous", "warehouse_stock")
+
+ProductRecord = record_type("ProductRecord", PRODUCT_FIELDS)
+InventoryRow = record_type("InventoryRow", INVENTORY_FIELDS)
+OrderRecord = record_type("OrderRecord", ORDER_FIELDS)
+StockChange = record_type("StockChange", STOCK_CHANGE_FIELDS)
@@ -0,0 +1,281 @@
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, make_response, request
+
+import config
+from http_encoding import compress, compressible, etag_for, negotiate, not_modified, set_not_modified
+
+log = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class CachedResponse:
+    """Encoded response body with its ETag and the compressed variants served so far."""
+
+    def __init__(self, body, status, content_type, stored_at=None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.stored_at = stored_at if stored_at is not None else time.time()
+        self.etag = etag_for(body)
+        self.encoded = {}
+
+    def age(self):
+        return time.time() - self.stored_at
+
+    def encode(self, encoding):
+        body = self.encoded.get(encoding)
+        if body is None:
+            body = self.encoded[encoding] = compress(self.body, encoding)
+        return body
+
+    def to_response(self, cache_status, request=None):
+        """Build the response; with ``request``, answer its conditional GET and content coding from the cache."""
+        response = Response(self.body, status=self.status, content_type=self.content_type)
+        response.headers['X-Cache'] = cache_status
+        response.headers['Age'] = str(int(self.age()))
+        response.set_etag(self.etag, weak=True)
+        if request is None:
+            return response
+        response.vary.add('Accept-Encoding')
+        if not_modified(request, self.etag):
+            set_not_modified(response)
+        elif compressible(response) and len(self.body) >= config.COMPRESS_MIN_BYTES:
+            encoding = negotiate(request)
+            if encoding:
+                response.set_data(self.encode(encoding))
+                response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class LRUBackend:
+    """In-process cache holding the ``max_entries`` most recently used responses."""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or config.RESPONSE_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key, response, expire):
+        with self._lock:
+            self._entries[key] = (time.time() + expire, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SharedBackend:
+    """Cache stored in a shared key-value server so every worker process sees it.
+
+    ``client`` needs ``get(key)`` and ``set(key, value, ex=seconds)``, which a
+    ``redis.Redis`` connection provides; ``DictClient`` stands in for it locally.
+    """
+
+    def __init__(self, client, prefix="digi-seller-central:response:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, response, expire):
+        self.client.set(self.prefix + key, pickle.dumps(response), ex=max(int(expire), 1))
+
+
+class DictClient:
+    """Local stand-in for a shared key-value server with expiring keys."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            expires_at, value = self._values.get(key, (0, None))
+            return value if expires_at > time.time() else None
+
+    def set(self, key, value, ex):
+        with self._lock:
+            self._values[key] = (time.time() + ex, value)
+
+
+class ResponseCache:
+    """TTL + stale-while-revalidate cache for GET routes, with request coalescing.
+
+    A response younger than ``ttl`` is served as is. Until ``ttl + stale``
+    the stale copy is served while a single background request refreshes
+    it. Concurrent misses for the same key wait for the first one instead
+    of each calling upstream.
+    """
+
+    def __init__(self, backend=None, max_body_bytes=None, coalesce_timeout=None):
+        self.backend = backend or LRUBackend()
+        self.max_body_bytes = max_body_bytes or config.RESPONSE_CACHE_MAX_BODY_BYTES
+        self.coalesce_timeout = coalesce_timeout or config.RESPONSE_CACHE_COALESCE_TIMEOUT
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "uncacheable": 0}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _claim(self, key):
+        """Return ``(True, event)`` for the caller that should fetch ``key``, else ``(False, event)``."""
+        with self._lock:
+            event = self._inflight.get(key)
+            if event is not None:
+                return False, event
+            event = self._inflight[key] = threading.Event()
+            return True, event
+
+    def _release(self, key, event):
+        with self._lock:
+            if self._inflight.get(key) is event:
+                del self._inflight[key]
+        event.set()
+
+    def _store(self, key, body, response, expire):
+        self.backend.set(key, CachedResponse(body, response.status_code, response.content_type), expire)
+
+    def _capture(self, key, response, expire, event):
+        """Store ``response`` once its body is known, then wake up coalesced waiters."""
+        if response.status_code != 200:
+            self._count("uncacheable")
+            self._release(key, event)
+            return response
+
+        if not response.is_streamed:
+            body = response.get_data()
+            if len(body) <= self.max_body_bytes:
+                self._store(key, body, response, expire)
+            else:
+                self._count("uncacheable")
+            self._release(key, event)
+            return response
+
+        # Streamed bodies are stored after the last chunk went out
+        chunks = response.iter_encoded()
+
+        def tee():
+            buffered, size, complete = [], 0, False
+            try:
+                for chunk in chunks:
+                    yield chunk
+                    if buffered is not None:
+                        size += len(chunk)
+                        if size <= self.max_body_bytes:
+                            buffered.append(chunk)
+                        else:
+                            buffered = None
+                complete = True
+            finally:
+                if complete and buffered is not None:
+                    self._store(key, b''.join(buffered), response, expire)
+                elif complete:
+                    self._count("uncacheable")
+                self._release(key, event)
+
+        response.response = tee()
+        return response
+
+    def _refresh(self, app, key, view, args, kwargs, expire, event):
+        try:
+            with app.test_request_context(key, method='GET'):
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    body = b''.join(response.iter_encoded())
+                    if len(body) <= self.max_body_bytes:
+                        self._store(key, body, response, expire)
+        except Exception as e:
+            log.warning("background refresh failed key=%s error=%s", key, e)
+        finally:
+            self._release(key, event)
+
+    def cached(self, ttl, stale=0):
+        """Cache a GET view for ``ttl`` seconds and serve it stale for ``stale`` more while refreshing."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = request.full_path
+                expire = ttl + stale
+                entry = self.backend.get(key)
+                if entry is not None:
+                    age = entry.age()
+                    if age < ttl:
+                        self._count("hits")
+                        return entry.to_response("HIT", request)
+                    if age < expire:
+                        self._count("stale_hits")
+                        leader, event = self._claim(key)
+                        if leader:
+                            self._count("refreshes")
+                            threading.Thread(
+                                target=self._refresh, daemon=True,
+                                args=(current_app._get_current_object(), key, view, args, kwargs,
+                                      expire, event)).start()
+                        return entry.to_response("STALE", request)
+
+                leader, event = self._claim(key)
+                if not leader:
+                    self._count("coalesced")
+                    event.wait(self.coalesce_timeout)
+                    entry = self.backend.get(key)
+                    if entry is not None:
+                        return entry.to_response("HIT", request)
+                    leader, event = self._claim(key)
+
+                self._count("misses")
+                try:
+                    response = make_response(view(*args, **kwargs))
+                except Exception:
+                    if leader:
+                        self._release(key, event)
+                    raise
+                response.headers['X-Cache'] = 'MISS'
+                if not leader:
+                    return response
+                return self._capture(key, response, expire, event)
+
+            return wrapper
+        return decorator
+
+
+def create_backend():
+    """Build the backend selected by RESPONSE_CACHE_BACKEND ("memory", "shared" or "redis")."""
+    if config.RESPONSE_CACHE_BACKEND == "redis":
+        if redis is None:
+            raise Exception("RESPONSE_CACHE_BACKEND=redis requires the redis package")
+        return SharedBackend(redis.Redis.from_url(config.REDIS_URL))
+    if config.RESPONSE_CACHE_BACKEND == "shared":
+        return SharedBackend(DictClient())
+    return LRUBackend()
@@ -1,45 +1,218 @@
-import requests
+import asyncio
+from urllib.parse import urlencode
+
+import numpy as np
+
+from diginext_client import get_async_client, get_client
+from metrics import timed
+
+
+class SalesTable:
+    """Columnar view of a sales report with one NumPy array per metric.
+
+    Each column is loaded the first time it is used. Aggregates and
+    rankings then run as vectorized passes over it; the raw items are only
+    touched again to build the rows that are returned. The mean is the
+    exception: it is summed in Python, as the report's average conversion
+    rate always was, since NumPy's pairwise sum can differ in the last bit
+    and move products across it.
+    """
+
+    # Report item keys that can feed each metric column, in order of preference
+    METRIC_KEYS = {
+        "conversion_rate": ("conversion_rate",),
+        "revenue": ("revenue", "sales_amount", "gmv"),
+        "units": ("units", "sold_quantity", "quantity"),
+    }
+
+    def __init__(self, items):
+        self.items = items
+        self.keys = {}
+        self.columns = {}
+        self.means = {}
+
+    def key(self, metric):
+        """The report item key holding ``metric``."""
+        if metric not in self.METRIC_KEYS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if metric not in self.keys:
+            keys = self.METRIC_KEYS[metric]
+            self.keys[metric] = next((key for key in keys if any(key in item for item in self.items[:100])), keys[0])
+        return self.keys[metric]
+
+    def __len__(self):
+        return len(self.items)
+
+    def values(self, metric):
+        """Iterate the values of ``metric`` straight from the items, without loading its column."""
+        key = self.key(metric)
+        return (item.get(key) or 0 for item in self.items)
+
+    def column(self, metric):
+        if metric not in self.columns:
+            self.columns[metric] = np.fromiter(self.values(metric), dtype=np.float64, count=len(self))
+        return self.columns[metric]
+
+    def mean(self, metric):
+        if metric not in self.means:
+            self.means[metric] = sum(self.values(metric)) / len(self) if len(self) else 0
+        return self.means[metric]
+
+    def rows(self, indices):
+        """The items at ``indices`` (an array of row indices), in that order."""
+        return list(map(self.items.__getitem__, indices.tolist()))
+
+    def percentile(self, metric, q):
+        return float(np.percentile(self.column(metric), q)) if len(self) else 0
+
+    def zscores(self, metric):
+        values = self.column(metric)
+        std = values.std() if len(self) else 0
+        return (values - values.mean()) / std if std else np.zeros_like(values)
+
+    def top_k(self, metric, k):
+        """Indices of the ``k`` largest values of ``metric``, largest first."""
+        values = self.column(metric)
+        k = min(k, len(values))
+        if k <= 0:
+            return np.array([], dtype=np.intp)
+        top = np.argpartition(-values, k - 1)[:k]
+        return top[np.argsort(-values[top], kind="stable")]
+
+
+# Campaign ranking strategies: ``func(table, metric, **params) -> iterable of the selected items``
+CAMPAIGN_STRATEGIES = {}
+
+
+def campaign_strategy(name):
+    def decorator(func):
+        CAMPAIGN_STRATEGIES[name] = func
+        return func
+    return decorator
+
+
+@campaign_strategy("above_mean")
+def above_mean(table, metric, **params):
+    # Lazy, so the items are selected in the same pass that builds the suggestions, as before the table:
+    # with one comparison per item that beats loading the column first (bench_sales_report.py)
+    mean = table.mean(metric)
+    key = table.key(metric)
+    return (item for item in table.items if (item.get(key) or 0) > mean)
+
+
+@campaign_strategy("percentile")
+def above_percentile(table, metric, percentile=90, **params):
+    return table.rows(np.flatnonzero(table.column(metric) >= table.percentile(metric, float(percentile))))
+
+
+@campaign_strategy("zscore")
+def above_zscore(table, metric, z=1.0, **params):
+    return table.rows(np.flatnonzero(table.zscores(metric) >= float(z)))
+
+
+@campaign_strategy("top_k")
+def top_k(table, metric, k=10, **params):
+    return table.rows(table.top_k(metric, int(k)))
+
 
 class DigikalaSalesReport:
-    def __init__(self, api_url, headers=None):
+    PATH = "insight/sales-reports"
+
+    def __init__(self, api_url, headers=None, client=None, async_client=None):
         self.api_url = api_url
-        self.headers = headers if headers else {
-            "accept": "application/json",
-            "x-response-code": "200"
-        }
+        self.headers = headers
+        self.client = client or get_client()
+        self.async_client = async_client
         self.data = {}
+        self._table = None
+
+    @classmethod
+    def url_for(cls, report_range="last_7_days", **params):
+        """Report URL for a named range (``last_7_days``, ``last_30_days``, ``custom`` + dates)."""
+        return f"{cls.PATH}?{urlencode(dict(range=report_range, **params))}"
+
+    @classmethod
+    def from_data(cls, report_range, data, **params):
+        """Report of a named range holding already fetched report ``data``."""
+        report = cls(cls.url_for(report_range, **params))
+        report.data = data
+        return report
+
+    @classmethod
+    def fetch_ranges(cls, ranges, executor, **params):
+        """Fetch the reports of several ranges in parallel; returns ``{range: report}``."""
+        reports = {report_range: cls(cls.url_for(report_range, **params)) for report_range in ranges}
+        futures = [executor.submit(report.fetch_sales_report) for report in reports.values()]
+        for future in futures:
+            future.result()
+        return reports
+
+    @classmethod
+    async def afetch_ranges(cls, ranges, **params):
+        """Async version of ``fetch_ranges``; the reports are fetched concurrently."""
+        reports = {report_range: cls(cls.url_for(report_range, **params)) for report_range in ranges}
+        await asyncio.gather(*(report.afetch_sales_report() for report in reports.values()))
+        return reports
 
     @staticmethod
     def extract_image_url(url):
         end_pos = url.find('.jpg') + len('.jpg')
         return url[:end_pos]
 
+    @timed()
     def fetch_sales_report(self):
-        response = requests.get(self.api_url, headers=self.headers)
+        self._set_report(self.client.get(self.api_url, endpoint="insight", headers=self.headers))
+
+    @timed()
+    async def afetch_sales_report(self):
+        client = self.async_client or get_async_client()
+        self._set_report(await client.get(self.api_url, endpoint="insight", headers=self.headers))
+
+    def _set_report(self, response):
         if response.status_code == 200:
             self.data = response.json().get('data', {})
+            self._table = None
         else:
             raise Exception(f"Failed to retrieve data, status code: {response.status_code}")
 
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = SalesTable(self.data.get('items', [[]])[0])
+        return self._table
+
     def get_average_conversion_rate(self):
-        items = self.data.get('items', [[]])[0]
-        total_conversion_rate = sum(item.get('conversion_rate', 0) for item in items)
-        return total_conversion_rate / len(items) if items else 0
+        return self.table.mean('conversion_rate')
 
-    def suggest_campaigns(self):
+    @timed()
+    def suggest_campaigns(self, strategy="above_mean", metric="conversion_rate", **params):
+        """Suggest campaigns for the products selected by a ranking ``strategy`` on ``metric``.
+
+        The default keeps the products converting above the average.
+        """
+        if strategy not in CAMPAIGN_STRATEGIES:
+            raise ValueError(f"Unknown campaign strategy: {strategy}")
+
+        table = self.table
+        selected = CAMPAIGN_STRATEGIES[strategy](table, metric, **params)
+        if metric != 'conversion_rate':
+            # Walked a second time below to add the metric's values
+            selected = list(selected)
         average_conversion_rate = self.get_average_conversion_rate()
-        high_conversion_products = []
-
-        items = self.data.get('items', [[]])[0]
-        for item in items:
-            if item.get('conversion_rate', 0) > average_conversion_rate:
-                high_conversion_products.append({
-                    "product_id": item['product_id'],
-                    "title": item['title'],
-                    "image": self.extract_image_url(item['image']),
-                    "conversion_rate": item['conversion_rate'],
-                    "avg_conversion_rate": average_conversion_rate,
-                    "suggested_campaign": f"Campaign for {item['title']}"
-                })
-
-        return high_conversion_products
\ No newline at end of file
+
+        extract_image_url = self.extract_image_url
+        high_conversion_products = [{
+            "product_id": item['product_id'],
+            "title": item['title'],
+            "image": extract_image_url(item['image']),
+            "conversion_rate": item['conversion_rate'],
+            "avg_conversion_rate": average_conversion_rate,
+            "suggested_campaign": f"Campaign for {item['title']}"
+        } for item in selected]
+
+        if metric != 'conversion_rate':
+            key = table.key(metric)
+            for suggestion, item in zip(high_conversion_products, selected):
+                suggestion[metric] = float(item.get(key) or 0)
+
+        return high_conversion_products
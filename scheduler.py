@@ -0,0 +1,493 @@
+import fcntl
+import logging
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from digikala_inventory import DigikalaInventory
+from digikala_order_history import DigikalaOrderHistory
+from metrics import span
+from sale_insight import DigikalaSalesReport
+from seller_products import SellerProducts
+
+log = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """One successful sync of a source; ``data`` is never mutated after publishing."""
+
+    __slots__ = ("source", "version", "data", "created_at", "duration")
+
+    def __init__(self, source, version, data, created_at, duration):
+        self.source = source
+        self.version = version
+        self.data = data
+        self.created_at = created_at
+        self.duration = duration
+
+    def age(self):
+        return time.time() - self.created_at
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "created_at": self.created_at,
+            "duration": self.duration,
+            "items": len(self.data) if hasattr(self.data, "__len__") else None,
+        }
+
+
+class SyncJob:
+    """Periodically runs ``func`` for one source and publishes the result as a new snapshot.
+
+    Runs are ``interval`` seconds apart, moved by up to ``jitter`` (a
+    fraction of the interval) either way so sources and worker processes
+    do not hit Diginext in lockstep. A failed run keeps the previous
+    snapshot.
+    """
+
+    # Status of the job's runs, shared by the snapshot share's leader with the processes that do not run it
+    RUN_STATUS = ("running", "runs", "failures", "last_started", "last_success", "last_duration", "last_error",
+                  "next_run")
+
+    def __init__(self, scheduler, source, func, interval, jitter=None, dump=None, load=None):
+        self.scheduler = scheduler
+        self.source = source
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter if jitter is not None else config.SYNC_JITTER
+        # ``dump`` turns snapshot data into what a ``SnapshotShare`` stores, ``load`` turns that back
+        # into snapshot data in another process
+        self.dump = dump or (lambda data: data)
+        self.load = load or (lambda shared: shared)
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_success = None
+        self.last_error = None
+        self.last_duration = None
+        self.next_run = None
+        self._started_at = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._done = threading.Condition()
+
+    def delay(self):
+        return max(self.interval * (1 + random.uniform(-self.jitter, self.jitter)), 0)
+
+    def run_once(self):
+        started = time.monotonic()
+        with self._done:
+            self.running = True
+            self._started_at = started
+            self.last_started = time.time()
+        self.scheduler.write_status(self)
+        try:
+            with span(f"sync.{self.source}"):
+                data = self.func()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            log.warning("sync failed source=%s error=%s", self.source, e)
+        else:
+            self.last_duration = time.monotonic() - started
+            self.last_success = time.time()
+            self.last_error = None
+            self.scheduler.publish(self.source, data, self.last_duration)
+        finally:
+            with self._done:
+                self.runs += 1
+                self.running = False
+                self._done.notify_all()
+
+    def _run(self):
+        while not self.scheduler.stopped.is_set():
+            self.run_once()
+            delay = self.delay()
+            self.next_run = time.time() + delay
+            self.scheduler.write_status(self)
+            self._wake.wait(delay)
+            self._wake.clear()
+        self.next_run = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"sync-{self.source}", daemon=True)
+            self._thread.start()
+
+    def trigger(self):
+        """Run as soon as the current run (if any) has finished."""
+        self._wake.set()
+
+    def wait_for_run(self, requested, timeout=None):
+        """Block until a run started at or after ``requested`` (monotonic) has finished."""
+        with self._done:
+            return self._done.wait_for(
+                lambda: not self.running and self._started_at is not None and self._started_at >= requested,
+                timeout)
+
+    def run_status(self):
+        return {name: getattr(self, name) for name in self.RUN_STATUS}
+
+    def get_status(self):
+        """Status of the job; outside the snapshot share's leader, the runs are the leader's."""
+        snapshot = self.scheduler.snapshot(self.source)
+        run_status = self.run_status() if self.scheduler.leader else self.scheduler.read_status(self.source)
+        if run_status is None:
+            # The leader has not shared its status yet; the snapshot still tells when it last synced
+            run_status = dict.fromkeys(self.RUN_STATUS)
+            run_status.update(running=False, runs=0, failures=0)
+            if snapshot is not None:
+                run_status.update(last_success=snapshot.created_at, last_duration=snapshot.duration)
+        return {
+            "interval": self.interval,
+            **run_status,
+            "leader": self.scheduler.leader,
+            "snapshot": snapshot.describe() if snapshot else None,
+            "versions": [entry["version"] for entry in self.scheduler.history[self.source]],
+        }
+
+
+class SnapshotShare:
+    """Snapshots of one process handed to the other worker processes of a server through files.
+
+    The process holding the lock on ``leader.lock`` is the leader: it runs
+    the sync jobs, writes every new snapshot to ``<source>.pickle`` and the
+    status of the source's job to ``<source>.status``. The others read
+    those files instead of syncing, and ask the leader for a sync by
+    touching ``<source>.requested``. The lock is released with its
+    process, so another one takes over when the leader exits. ``directory``
+    must be writable only by the server's user, as the files are pickles.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock_file = None
+        self._seen = {}
+        self._requested = {}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def acquire(self, sources):
+        """Try to become the leader; True once this process is."""
+        if self._lock_file is not None:
+            return True
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        lock_file = open(self._path("leader.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        # Requests made before this process led were served by the previous leader
+        self.requested(sources)
+        return True
+
+    def _replace(self, name, *objects):
+        """Atomically replace file ``name`` with the pickles of ``objects``, one after the other."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for obj in objects:
+                    pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def write(self, snapshot, shared):
+        self._replace(f"{snapshot.source}.pickle", (snapshot.version, snapshot.created_at, snapshot.duration), shared)
+
+    def write_status(self, source, status):
+        self._replace(f"{source}.status", status)
+
+    def read_status(self, source):
+        """The status the leader last wrote for ``source``, or None."""
+        try:
+            with open(self._path(f"{source}.status"), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def read(self, source, newer_than=None):
+        """``(version, created_at, duration, shared)`` of ``source`` if it was published after ``newer_than``.
+
+        Returns None when there is no such snapshot, or when the file has
+        not changed since the previous call.
+        """
+        try:
+            stat = os.stat(self._path(f"{source}.pickle"))
+            if self._seen.get(source) == (stat.st_ino, stat.st_mtime_ns):
+                return None
+            self._seen[source] = (stat.st_ino, stat.st_mtime_ns)
+            with open(self._path(f"{source}.pickle"), "rb") as f:
+                version, created_at, duration = pickle.load(f)
+                if newer_than is not None and created_at <= newer_than:
+                    return None
+                return version, created_at, duration, pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def request(self, source):
+        """Ask the leader to sync ``source`` now."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with open(self._path(f"{source}.requested"), "a"):
+            pass
+        os.utime(self._path(f"{source}.requested"))
+
+    def requested(self, sources):
+        """The ``sources`` requested since the previous call."""
+        requested = []
+        for source in sources:
+            try:
+                mtime = os.stat(self._path(f"{source}.requested")).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if self._requested.get(source) != mtime:
+                requested.append(source)
+                self._requested[source] = mtime
+        return requested
+
+
+class Scheduler:
+    """Background sync of the Diginext sources into versioned in-memory snapshots.
+
+    Each source has its own job thread. Routes read the latest snapshot
+    instead of calling Diginext, and subscribers (the product index) are
+    called with every new snapshot's data. The scheduler is started lazily
+    so that it survives gunicorn's fork. Without a ``share`` every process
+    syncs for itself; with a ``SnapshotShare`` only its leader does, and the
+    other processes load and publish the leader's snapshots.
+    """
+
+    def __init__(self, history=None, share=None):
+        self.jobs = {}
+        self.snapshots = {}
+        self.history = {}
+        self.history_size = history or config.SNAPSHOT_HISTORY
+        self.subscribers = {}
+        self.share = share
+        self.leader = share is None
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._published = threading.Condition(self._lock)
+        self._started = False
+
+    def add_job(self, source, func, interval, jitter=None, dump=None, load=None):
+        self.jobs[source] = SyncJob(self, source, func, interval, jitter, dump, load)
+        self.history[source] = deque(maxlen=self.history_size)
+        return self.jobs[source]
+
+    def subscribe(self, source, callback):
+        """Call ``callback(data)`` with the data of every new snapshot of ``source``."""
+        self.subscribers.setdefault(source, []).append(callback)
+
+    def publish(self, source, data, duration):
+        with self._lock:
+            previous = self.snapshots.get(source)
+            snapshot = Snapshot(source, previous.version + 1 if previous else 1, data, time.time(), duration)
+        self._publish(snapshot)
+        if self.share is not None:
+            self._write_shared(snapshot)
+        return snapshot
+
+    def _publish(self, snapshot):
+        # Subscribers see the data before readers of the snapshot do, so the views stay consistent
+        for callback in self.subscribers.get(snapshot.source, ()):
+            try:
+                callback(snapshot.data)
+            except Exception as e:
+                log.warning("snapshot subscriber failed source=%s error=%s", snapshot.source, e)
+        with self._published:
+            self.snapshots[snapshot.source] = snapshot
+            self.history[snapshot.source].append(snapshot.describe())
+            self._published.notify_all()
+
+    def _write_shared(self, snapshot):
+        try:
+            self.share.write(snapshot, self.jobs[snapshot.source].dump(snapshot.data))
+        except Exception as e:
+            log.warning("snapshot share write failed source=%s error=%s", snapshot.source, e)
+
+    def write_status(self, job):
+        """Share the run status of ``job`` with the other processes, when this one is the leader."""
+        if self.share is None or not self.leader:
+            return
+        try:
+            self.share.write_status(job.source, job.run_status())
+        except Exception as e:
+            log.warning("snapshot share status write failed source=%s error=%s", job.source, e)
+
+    def read_status(self, source):
+        """Run status of ``source``'s job as shared by the leader, or None."""
+        try:
+            return self.share.read_status(source)
+        except Exception as e:
+            log.warning("snapshot share status read failed source=%s error=%s", source, e)
+            return None
+
+    def _load_shared(self):
+        for source, job in self.jobs.items():
+            current = self.snapshots.get(source)
+            shared = self.share.read(source, current.created_at if current else None)
+            if shared is None:
+                continue
+            version, created_at, duration, data = shared
+            try:
+                data = job.load(data)
+            except Exception as e:
+                log.warning("shared snapshot load failed source=%s error=%s", source, e)
+                continue
+            self._publish(Snapshot(source, version, data, created_at, duration))
+
+    def _follow(self):
+        """Load the leader's snapshots until this process can take the lead, then sync and serve requests."""
+        while not self.stopped.is_set():
+            try:
+                if not self.leader:
+                    # Loaded first, so a new leader carries on from the latest shared snapshots
+                    self._load_shared()
+                    if self.share.acquire(self.jobs):
+                        log.info("snapshot share leader pid=%d", os.getpid())
+                        self.leader = True
+                        for snapshot in list(self.snapshots.values()):
+                            self._write_shared(snapshot)
+                        for job in self.jobs.values():
+                            job.start()
+                else:
+                    for source in self.share.requested(self.jobs):
+                        self.jobs[source].trigger()
+            except Exception as e:
+                log.warning("snapshot share failed error=%s", e)
+            self.stopped.wait(config.SNAPSHOT_SHARE_POLL)
+
+    def snapshot(self, source):
+        """Latest snapshot of ``source``, or None before its first successful sync."""
+        return self.snapshots.get(source)
+
+    def wait_for(self, source, timeout=None):
+        """Latest snapshot of ``source``, waiting up to ``timeout`` seconds for the first one."""
+        snapshot = self.snapshots.get(source)
+        if snapshot is not None:
+            return snapshot
+        with self._published:
+            self._published.wait_for(lambda: source in self.snapshots, timeout)
+            return self.snapshots.get(source)
+
+    def start(self):
+        """Start every job thread (or the snapshot share's thread) once; safe to call from every request."""
+        if self._started:
+            return
+        with self._lock:
+            if not self._started:
+                if self.share is None:
+                    for job in self.jobs.values():
+                        job.start()
+                else:
+                    threading.Thread(target=self._follow, name="sync-share", daemon=True).start()
+                self._started = True
+
+    def stop(self):
+        self.stopped.set()
+        for job in self.jobs.values():
+            job.trigger()
+
+    def refresh(self, sources=None, wait=False, timeout=None):
+        """Sync ``sources`` (default: all) now; with ``wait`` block until those runs finish.
+
+        Outside the leader the sync is requested from it, and ``wait``
+        blocks until this process has loaded snapshots of runs started
+        after the request. Returns False when ``wait`` timed out.
+        """
+        self.start()
+        sources = list(sources or self.jobs)
+        if not self.leader:
+            return self._request_shared(sources, wait, timeout)
+        requested = time.monotonic()
+        jobs = [self.jobs[source] for source in sources]
+        for job in jobs:
+            job.trigger()
+        if not wait:
+            return True
+        deadline = None if timeout is None else requested + timeout
+        return all(job.wait_for_run(requested, None if deadline is None else max(deadline - time.monotonic(), 0))
+                   for job in jobs)
+
+    def _request_shared(self, sources, wait, timeout):
+        requested = time.time()
+        for source in sources:
+            self.share.request(source)
+        if not wait:
+            return True
+
+        def synced(source):
+            snapshot = self.snapshots.get(source)
+            return snapshot is not None and snapshot.created_at - snapshot.duration >= requested
+
+        with self._published:
+            return self._published.wait_for(lambda: all(synced(source) for source in sources), timeout)
+
+    def get_status(self):
+        return {source: job.get_status() for source, job in self.jobs.items()}
+
+
+def sync_catalog():
+    return list(SellerProducts().iter_records())
+
+
+def sync_sales_reports():
+    """``{range: DigikalaSalesReport}`` for the configured report ranges."""
+    with ThreadPoolExecutor(max_workers=len(config.SYNC_SALES_RANGES)) as executor:
+        return DigikalaSalesReport.fetch_ranges(config.SYNC_SALES_RANGES, executor)
+
+
+def sync_images(scheduler, image_index):
+    """Index the main images of the latest catalog snapshot; returns the product_ids that changed."""
+    catalog = scheduler.wait_for("catalog", config.SNAPSHOT_READY_TIMEOUT)
+    if catalog is None:
+        raise Exception("No catalog snapshot to index images from")
+    return image_index.update_catalog(catalog.data)
+
+
+def create_scheduler(order_store=None, product_index=None, inventory=None, image_index=None):
+    """Scheduler with the catalog, inventory, orders and sales jobs, feeding ``product_index``.
+
+    Inventory snapshots hold only the ``StockChange``s of each fetch; the
+    full, indexed stock stays in ``inventory`` (a ``DigikalaInventory``).
+    With an ``image_index`` (a ``CatalogImageIndex``) an "images" job
+    hashes the main images of the latest catalog snapshot. With
+    ``SNAPSHOT_SHARE_DIR`` set the processes sharing it sync once between
+    them; the others rebuild ``inventory`` and ``image_index`` from the
+    shared state instead of fetching it.
+    """
+    inventory = inventory or DigikalaInventory()
+    scheduler = Scheduler(share=SnapshotShare(config.SNAPSHOT_SHARE_DIR) if config.SNAPSHOT_SHARE_DIR else None)
+    scheduler.add_job("catalog", sync_catalog, config.SYNC_INTERVALS["catalog"])
+    # The index applies each batch of stock changes before the inventory commits it, so none is lost
+    stock_changes = product_index.apply_stock_changes if product_index is not None else None
+    scheduler.add_job("inventory", lambda: inventory.fetch_inventory_data(stock_changes),
+                      config.SYNC_INTERVALS["inventory"],
+                      dump=lambda changes: (inventory.inventory_data, inventory.version),
+                      load=lambda shared: inventory.load(*shared, on_changes=stock_changes))
+    scheduler.add_job("orders", lambda: DigikalaOrderHistory().get_orders_last_month(order_store),
+                      config.SYNC_INTERVALS["orders"])
+    scheduler.add_job("sales", sync_sales_reports, config.SYNC_INTERVALS["sales"],
+                      dump=lambda reports: {report_range: report.data for report_range, report in reports.items()},
+                      load=lambda shared: {report_range: DigikalaSalesReport.from_data(report_range, data)
+                                           for report_range, data in shared.items()})
+    if product_index is not None:
+        scheduler.subscribe("catalog", product_index.update_catalog)
+        scheduler.subscribe("orders", product_index.update_sales)
+    if image_index is not None:
+        scheduler.add_job("images", lambda: sync_images(scheduler, image_index), config.SYNC_INTERVALS["images"],
+                          dump=lambda changed: image_index.export_state(), load=image_index.load_state)
+    return scheduler
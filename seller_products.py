@@ -1,60 +1,176 @@
-import requests
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from diginext_client import get_async_client, get_client
+from metrics import timed
+from records import PRODUCT_FIELDS, record_type
 
 
 class SellerProducts:
-    BASE_URL = "https://sandbox.diginext.ir/api/v3/products/seller"
+    PATH = "products/seller"
+    # Catalog fields whose value is not simply ``item.get(field)``
+    FIELD_GETTERS = {
+        "moderation_status": lambda item: item.get("moderation_status", {}).get("title"),
+    }
 
-    def __init__(self, page=1, size=50, sort="id", order="asc"):
+    def __init__(self, page=1, size=50, sort="id", order="asc", client=None, async_client=None):
         self.page = page
         self.size = size
         self.sort = sort
         self.order = order
-        self.headers = {
-            "accept": "application/json",
-            "x-response-code": "200"
-        }
+        self.client = client or get_client()
+        self.async_client = async_client
 
-    def get_products(self):
-        params = {
-            "page": self.page,
+    def params(self, page=None):
+        return {
+            "page": self.page if page is None else page,
             "size": self.size,
             "sort": self.sort,
             "order": self.order,
             "search[moderation_status]": "approved"
         }
-        response = requests.get(self.BASE_URL, headers=self.headers, params=params)
+
+    @timed()
+    def get_products(self, page=None):
+        response = self.client.get(self.PATH, endpoint="products", params=self.params(page))
+        response.raise_for_status()
+        return response.json()
+
+    @timed()
+    async def aget_products(self, page=None):
+        client = self.async_client or get_async_client()
+        response = await client.get(self.PATH, endpoint="products", params=self.params(page))
         response.raise_for_status()
         return response.json()
 
+    @staticmethod
+    def total_pages(response):
+        pager = response.get("data", {}).get("pager") or {}
+        return pager.get("total_pages")
+
+    def iter_pages(self, pages_in_flight=None):
+        """Yield the raw response of every catalog page, starting at ``self.page``.
+
+        While a page is being consumed, up to ``pages_in_flight`` following
+        pages are already being fetched in the background. Iteration stops at
+        the pager's ``total_pages``, or at the first short or empty page when
+        the response carries no pager.
+        """
+        pages_in_flight = pages_in_flight or config.CATALOG_PAGES_IN_FLIGHT
+        first_page = self.page or 1
+        response = self.get_products(page=first_page)
+        yield response
+
+        total_pages = self.total_pages(response)
+        if len(response.get("data", {}).get("items", [])) < self.size and total_pages is None:
+            return
+
+        next_page = first_page + 1
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=pages_in_flight)
+        try:
+            while True:
+                while len(pending) < pages_in_flight and (total_pages is None or next_page <= total_pages):
+                    pending.append(executor.submit(self.get_products, next_page))
+                    next_page += 1
+                if not pending:
+                    return
+
+                response = pending.popleft().result()
+                items = response.get("data", {}).get("items", [])
+                if not items:
+                    return
+                yield response
+                if total_pages is None and len(items) < self.size:
+                    return
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def aiter_pages(self, pages_in_flight=None):
+        """Async version of ``iter_pages``; the prefetched pages are tasks on the running loop."""
+        pages_in_flight = pages_in_flight or config.CATALOG_PAGES_IN_FLIGHT
+        first_page = self.page or 1
+        response = await self.aget_products(page=first_page)
+        yield response
+
+        total_pages = self.total_pages(response)
+        if len(response.get("data", {}).get("items", [])) < self.size and total_pages is None:
+            return
+
+        next_page = first_page + 1
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < pages_in_flight and (total_pages is None or next_page <= total_pages):
+                    pending.append(asyncio.ensure_future(self.aget_products(next_page)))
+                    next_page += 1
+                if not pending:
+                    return
+
+                response = await pending.popleft()
+                items = response.get("data", {}).get("items", [])
+                if not items:
+                    return
+                yield response
+                if total_pages is None and len(items) < self.size:
+                    return
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def parse_product(self, item):
+        return {
+            "variants_count": item.get("variants_count"),
+            "site": item.get("site"),
+            "title": item.get("title"),
+            "status": item.get("status"),
+            "product_id": item.get("product_id"),
+            "fake": item.get("fake"),
+            "status_data": item.get("status_data"),
+            "is_owner": item.get("is_owner"),
+            "main_category_title": item.get("main_category_title"),
+            "active": item.get("active"),
+            "title_fa": item.get("title_fa"),
+            "title_en": item.get("title_en"),
+            "brand_id": item.get("brand_id"),
+            "brand_title_en": item.get("brand_title_en"),
+            "brand_title_fa": item.get("brand_title_fa"),
+            "product_url": item.get("product_url"),
+            "image_src": item.get("image_src"),
+            "dimension_level": item.get("dimension_level"),
+            "brand_title": item.get("brand_title"),
+            "moderation_status": item.get("moderation_status", {}).get("title"),
+            "adverge_url": item.get("adverge_url")
+        }
+
     def parse_products(self, response):
-        products = response.get("data", {}).get("items", [])
-        parsed_products = []
-        for item in products:
-            parsed_products.append({
-                "variants_count": item.get("variants_count"),
-                "site": item.get("site"),
-                "title": item.get("title"),
-                "status": item.get("status"),
-                "product_id": item.get("product_id"),
-                "fake": item.get("fake"),
-                "status_data": item.get("status_data"),
-                "is_owner": item.get("is_owner"),
-                "main_category_title": item.get("main_category_title"),
-                "active": item.get("active"),
-                "title_fa": item.get("title_fa"),
-                "title_en": item.get("title_en"),
-                "brand_id": item.get("brand_id"),
-                "brand_title_en": item.get("brand_title_en"),
-                "brand_title_fa": item.get("brand_title_fa"),
-                "product_url": item.get("product_url"),
-                "image_src": item.get("image_src"),
-                "dimension_level": item.get("dimension_level"),
-                "brand_title": item.get("brand_title"),
-                "moderation_status": item.get("moderation_status", {}).get("title"),
-                "adverge_url": item.get("adverge_url")
-            })
-        return parsed_products
+        """Lazily parse the items of one page response."""
+        for item in response.get("data", {}).get("items", []):
+            yield self.parse_product(item)
+
+    def iter_products(self, pages_in_flight=None):
+        """Yield parsed products across the whole catalog without holding it in memory."""
+        for response in self.iter_pages(pages_in_flight):
+            yield from self.parse_products(response)
+
+    def iter_records(self, fields=None, pages_in_flight=None):
+        """Yield compact ``ProductRecord``s across the whole catalog.
+
+        ``fields`` projects each record to just those catalog fields.
+        """
+        record_cls = record_type("ProductRecord", fields or PRODUCT_FIELDS)
+        for response in self.iter_pages(pages_in_flight):
+            for item in response.get("data", {}).get("items", []):
+                yield record_cls.from_item(item, self.FIELD_GETTERS)
+
+    async def aiter_record_pages(self, fields=None, pages_in_flight=None):
+        """Async version of ``iter_records`` that yields the records of one catalog page at a time."""
+        record_cls = record_type("ProductRecord", fields or PRODUCT_FIELDS)
+        async for response in self.aiter_pages(pages_in_flight):
+            yield [record_cls.from_item(item, self.FIELD_GETTERS) for item in response.get("data", {}).get("items", [])]
 
     def get_and_parse_products(self):
         response = self.get_products()
-        return self.parse_products(response)
+        return list(self.parse_products(response))
@@ -0,0 +1,221 @@
+import asyncio
+import statistics
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+from digikala_product import DigikalaProduct
+from http_encoding import dumps
+from metrics import timed
+from seo_rules import SeoRuleEngine
+
+
+def extract_image_url(url):
+    end_pos = url.find('.jpg') + len('.jpg')
+    return url[:end_pos]
+
+
+seo_engine = SeoRuleEngine()
+
+
+@timed()
+def audit_product(product_id, executor, rules=None):
+    """Run the SEO rules (all, or only ``rules``) for one product.
+
+    ``executor`` runs the upstream calls the selected rules need in parallel;
+    inputs no selected rule needs, such as the image, are never fetched.
+    """
+    product = DigikalaProduct(product_id)
+    seo_info = seo_engine.evaluate(product, only=rules, executor=executor, require=("product_data",))
+    return _complete_audit(product, seo_info)
+
+
+@timed()
+async def aaudit_product(product_id, rules=None):
+    """Async version of ``audit_product``; the upstream calls run concurrently on the event loop."""
+    product = DigikalaProduct(product_id)
+    seo_info = await seo_engine.aevaluate(product, only=rules, require=("product_data",))
+    return _complete_audit(product, seo_info)
+
+
+def _complete_audit(product, seo_info):
+    product_info = product.extract_product_info()
+
+    # Collecting the information
+    seo_info['main_image_link'] = extract_image_url(product_info.get('productImage', 'Not available'))
+    seo_info['product_title'] = product_info.get('name', 'Not available')
+    seo_info['score'], seo_info['score_percent'] = seo_engine.score(seo_info)
+
+    return seo_info
+
+
+def competitor_analysis(product_id):
+    return {
+        "Sales": {
+            "product_id": product_id,
+            "value": 76953,
+            "top_5_competitors_avg": 52907
+        },
+        "Revenue": {
+            "product_id": product_id,
+            "value": 768760.47,
+            "top_5_competitors_avg": 531363.81
+        },
+        "Price": {
+            "product_id": product_id,
+            "value": 9.99,
+            "top_5_competitors_avg": 10.97
+        },
+        "BSR": {
+            "product_id": product_id,
+            "value": 106,
+            "top_5_competitors_avg": 1283
+        },
+        "Number of Reviews": {
+            "product_id": product_id,
+            "value": 2250,
+            "top_5_competitors_avg": 43525
+        },
+        "Rating": {
+            "product_id": product_id,
+            "value": 4.4,
+            "top_5_competitors_avg": 4.5
+        }
+    }
+
+
+def keyword_analysis():
+    return {
+        "total_keywords": 5451,
+        "top_10_keywords": 877,
+        "total_search_volume": 6491241,
+        "top_10_search_volume": 1905035
+    }
+
+
+# End of input for the auditors; None is a product id like any other here
+_DONE = object()
+
+
+class SeoAuditor:
+    """Audit many products on a bounded worker pool and stream the results as they finish.
+
+    Only ``2 * workers`` products are in flight at a time, so a whole
+    catalog walk can feed the auditor lazily. Per-host concurrency is
+    capped by the shared HTTP client's connection pool. The ``a``-prefixed
+    methods do the same on the event loop and need no ``executor``.
+    """
+
+    def __init__(self, executor=None, workers=None, rules=None):
+        if workers is not None and (not isinstance(workers, int) or isinstance(workers, bool) or workers < 1):
+            raise ValueError("workers must be a positive integer")
+        self.executor = executor
+        self.rules = rules
+        self.workers = min(workers or config.SEO_AUDIT_WORKERS, config.SEO_AUDIT_MAX_WORKERS)
+
+    @staticmethod
+    def check_product_ids(product_ids):
+        """Raise ValueError unless every id is an int or a string."""
+        for product_id in product_ids:
+            if isinstance(product_id, bool) or not isinstance(product_id, (int, str)):
+                raise ValueError(f"Invalid product id: {product_id!r}; product ids are integers or strings")
+
+    def _audit(self, product_id):
+        try:
+            return {"product_id": product_id, "result": audit_product(product_id, self.executor, self.rules)}
+        except Exception as e:
+            return {"product_id": product_id, "error": str(e)}
+
+    def iter_audits(self, product_ids):
+        """Yield one result per product id in completion order."""
+        product_ids = iter(product_ids)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < 2 * self.workers:
+                    product_id = next(product_ids, _DONE)
+                    if product_id is _DONE:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(self._audit, product_id))
+                if not pending:
+                    return
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    async def _aaudit(self, product_id):
+        try:
+            return {"product_id": product_id, "result": await aaudit_product(product_id, self.rules)}
+        except Exception as e:
+            return {"product_id": product_id, "error": str(e)}
+
+    async def aiter_audits(self, product_ids):
+        """Async version of ``iter_audits``; ``product_ids`` may be an async iterable."""
+        if not hasattr(product_ids, '__anext__'):
+            product_ids = _aiter(product_ids)
+        pending = set()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < 2 * self.workers:
+                    product_id = await anext(product_ids, _DONE)
+                    if product_id is _DONE:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(self._aaudit(product_id)))
+                if not pending:
+                    return
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def summarize(audits, scores):
+        """Aggregate score statistics over the finished audits."""
+        summary = {
+            "audited": len(scores),
+            "failed": audits - len(scores),
+        }
+        if scores:
+            summary.update({
+                "score_percent_mean": statistics.mean(scores),
+                "score_percent_median": statistics.median(scores),
+                "score_percent_min": min(scores),
+                "score_percent_max": max(scores),
+            })
+        return summary
+
+    def iter_ndjson(self, product_ids):
+        """Yield one JSON line per product, then a final ``{"summary": ...}`` line."""
+        audits = 0
+        scores = []
+        for audit in self.iter_audits(product_ids):
+            audits += 1
+            if "result" in audit:
+                scores.append(audit["result"]["score_percent"])
+            yield dumps(audit) + b'\n'
+
+        yield dumps({"summary": self.summarize(audits, scores)}) + b'\n'
+
+    async def aiter_ndjson(self, product_ids):
+        """Async version of ``iter_ndjson``."""
+        audits = 0
+        scores = []
+        async for audit in self.aiter_audits(product_ids):
+            audits += 1
+            if "result" in audit:
+                scores.append(audit["result"]["score_percent"])
+            yield dumps(audit) + b'\n'
+
+        yield dumps({"summary": self.summarize(audits, scores)}) + b'\n'
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
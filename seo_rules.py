@@ -0,0 +1,238 @@
+import asyncio
+from collections import OrderedDict
+
+from metrics import timed
+
+# Cost classes, cheapest first
+CHEAP = 0
+NETWORK = 1
+IMAGE = 2
+
+# Inputs a rule can depend on, with the cost of loading them
+INPUT_COSTS = {
+    "product_data": NETWORK,
+    "edit_data": NETWORK,
+    "image": IMAGE,
+}
+
+
+class SeoRule:
+    def __init__(self, name, check, inputs, cost, weight):
+        self.name = name
+        self.check = check
+        self.inputs = frozenset(inputs)
+        self.cost = cost
+        self.weight = weight
+
+
+# Registered SEO rules, keyed by their SEO field name
+SEO_RULES = OrderedDict()
+
+
+def seo_rule(name, inputs=("product_data",), cost=CHEAP, weight=1):
+    """Register ``func(product) -> bool | None`` as an SEO rule.
+
+    ``inputs`` are the product inputs the rule reads (see ``INPUT_COSTS``),
+    ``cost`` is its cost class and ``weight`` its share of the score. A rule
+    returning None is left out of the score.
+    """
+    def decorator(func):
+        SEO_RULES[name] = SeoRule(name, func, inputs, cost, weight)
+        return func
+    return decorator
+
+
+class _InputLoader:
+    """Loads the inputs a set of rules needs, each at most once.
+
+    With an executor the edit data is fetched alongside the product data and
+    the image stage starts as soon as the product data (and so
+    ``productImage``) is known.
+    """
+
+    def __init__(self, product, inputs, executor=None):
+        self.product = product
+        self.inputs = inputs
+        self.executor = executor
+        self.futures = {}
+        self.loaded = set()
+
+    def _load(self, name):
+        if name == "product_data":
+            self.product.fetch_product_data()
+        elif name == "edit_data":
+            self.product.fetch_product_edit_data()
+        elif name == "image":
+            self.require(("product_data",))
+            self.product.run_image_checks()
+
+    def start(self):
+        if self.executor is None:
+            return self
+        if "edit_data" in self.inputs:
+            self.futures["edit_data"] = self.executor.submit(self._load, "edit_data")
+        if "product_data" in self.inputs or "image" in self.inputs:
+            try:
+                self.require(("product_data",))
+            except Exception:
+                for future in self.futures.values():
+                    future.cancel()
+                raise
+        if "image" in self.inputs:
+            self.futures["image"] = self.executor.submit(self._load, "image")
+        return self
+
+    def require(self, names):
+        for name in sorted(names, key=INPUT_COSTS.get):
+            if name in self.loaded:
+                continue
+            future = self.futures.get(name)
+            if future is not None:
+                future.result()
+            else:
+                self._load(name)
+            self.loaded.add(name)
+
+
+class _AsyncInputLoader:
+    """``_InputLoader`` for the async wrappers: each input is a task on the running loop."""
+
+    def __init__(self, product, inputs):
+        self.product = product
+        self.inputs = inputs
+        self.tasks = {}
+
+    async def _load_image(self):
+        await self.require(("product_data",))
+        await self.product.arun_image_checks()
+
+    def _loader(self, name):
+        if name == "product_data":
+            return self.product.afetch_product_data()
+        if name == "edit_data":
+            return self.product.afetch_product_edit_data()
+        return self._load_image()
+
+    def start(self):
+        for name in sorted(self.inputs, key=INPUT_COSTS.get):
+            self.tasks[name] = asyncio.ensure_future(self._loader(name))
+        return self
+
+    def cancel(self):
+        """Cancel unfinished loads and retrieve the errors of failed ones."""
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()
+
+    async def require(self, names):
+        for name in sorted(names, key=INPUT_COSTS.get):
+            task = self.tasks.get(name)
+            if task is None:
+                task = self.tasks[name] = asyncio.ensure_future(self._loader(name))
+            await task
+
+
+class SeoRuleEngine:
+    """Evaluates registered SEO rules, cheapest first, loading only the inputs they need."""
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else SEO_RULES
+
+    def select(self, only=None):
+        """Return the rules named in ``only`` (all rules when None), cheapest first."""
+        if only is None:
+            rules = list(self.rules.values())
+        else:
+            unknown = [name for name in only if name not in self.rules]
+            if unknown:
+                raise ValueError(f"Unknown SEO rules: {', '.join(unknown)}")
+            rules = [self.rules[name] for name in only]
+        return sorted(rules, key=lambda rule: rule.cost)
+
+    @timed()
+    def evaluate(self, product, only=None, executor=None, require=()):
+        """Run the selected rules on ``product`` and return ``{rule name: result}``.
+
+        ``require`` names inputs to load even if no selected rule needs them.
+        """
+        rules = self.select(only)
+        inputs = set(require).union(*(rule.inputs for rule in rules))
+        loader = _InputLoader(product, inputs, executor).start()
+        loader.require(require)
+
+        results = {}
+        for rule in rules:
+            loader.require(rule.inputs)
+            results[rule.name] = rule.check(product)
+        return results
+
+    @timed()
+    async def aevaluate(self, product, only=None, require=()):
+        """Async version of ``evaluate`` using the product's async fetch methods."""
+        rules = self.select(only)
+        inputs = set(require).union(*(rule.inputs for rule in rules))
+        loader = _AsyncInputLoader(product, inputs).start()
+        try:
+            await loader.require(require)
+            results = {}
+            for rule in rules:
+                await loader.require(rule.inputs)
+                results[rule.name] = rule.check(product)
+            return results
+        finally:
+            loader.cancel()
+
+    def score(self, results):
+        """Return ``(score, score_percent)`` over the rules that produced a boolean."""
+        score = 0
+        total = 0
+        for name, value in results.items():
+            if name not in self.rules or not isinstance(value, bool):
+                continue
+            weight = self.rules[name].weight
+            total += weight
+            if value:
+                score += weight
+        return score, (score / total) * 100 if total > 0 else 0
+
+
+@seo_rule('title_emoji')
+def title_emoji(product):
+    return product.check_emojies()
+
+
+@seo_rule('title_length_valid')
+def title_length_valid(product):
+    return product.is_title_length_valid()
+
+
+@seo_rule('white_background', inputs=("product_data", "image"), cost=IMAGE)
+def white_background(product):
+    return product.is_white_background()
+
+
+@seo_rule('image_size_valid', inputs=("product_data", "image"), cost=IMAGE)
+def image_size_valid(product):
+    return product.is_image_size_valid()
+
+
+@seo_rule('seven_or_more_images')
+def seven_or_more_images(product):
+    return product.has_seven_or_more_images()
+
+
+@seo_rule('video_content')
+def video_content(product):
+    return product.has_video_content()
+
+
+@seo_rule('long_description')
+def long_description(product):
+    return product.has_long_description()
+
+
+@seo_rule('at_least_five_attributes')
+def at_least_five_attributes(product):
+    return product.has_at_least_five_attributes()
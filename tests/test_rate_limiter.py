@@ -0,0 +1,71 @@
+"""Rate limits shared between worker processes through a ``SharedBucketState`` file."""
+import multiprocessing
+import time
+
+import pytest
+
+from rate_limiter import TokenBucket
+
+TIMEOUT = 30
+RATE = 40
+BURST = 5
+PROCESSES = 3
+REQUESTS = 20
+
+
+def send(path, start, sent):
+    """Acquire ``REQUESTS`` tokens from the shared bucket once ``start`` is set; report when each was granted."""
+    bucket = TokenBucket("test", RATE, BURST, share_path=path)
+    start.wait(TIMEOUT)
+    for _ in range(REQUESTS):
+        bucket.acquire()
+        sent.put(time.monotonic())
+
+
+def throttle(path, pause):
+    TokenBucket("test", RATE, BURST, share_path=path).on_throttle(pause)
+
+
+@pytest.fixture
+def context():
+    return multiprocessing.get_context("fork")
+
+
+def run(context, path, before=None):
+    """Start ``PROCESSES`` senders on the bucket at ``path``; returns the sorted times their tokens were granted."""
+    start, sent = context.Event(), context.Queue()
+    processes = [context.Process(target=send, args=(path, start, sent), daemon=True) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    if before is not None:
+        before()
+    started = time.monotonic()
+    start.set()
+    try:
+        times = sorted(sent.get(timeout=TIMEOUT) for _ in range(PROCESSES * REQUESTS))
+    finally:
+        for process in processes:
+            process.kill()
+            process.join()
+    return started, times
+
+
+def test_processes_sharing_a_bucket_stay_within_its_rate(tmp_path, context):
+    started, times = run(context, str(tmp_path / "test.bucket"))
+    # The burst goes out at once, then the processes together get RATE tokens per second
+    assert times[-1] - started >= (PROCESSES * REQUESTS - BURST) / RATE * 0.95
+    for first, last in zip(times, times[BURST + RATE // 2:]):
+        assert last - first >= 0.5 * 0.95
+
+
+def test_a_throttle_in_one_process_pauses_the_others(tmp_path, context):
+    path = str(tmp_path / "test.bucket")
+
+    def throttled():
+        process = context.Process(target=throttle, args=(path, 1.0))
+        process.start()
+        process.join()
+
+    started, times = run(context, path, throttled)
+    # No token is granted before the pause another process set is over
+    assert times[0] - started >= 0.95
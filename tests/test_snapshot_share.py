@@ -0,0 +1,122 @@
+"""Snapshot sharing between worker processes: one leader syncs, the others load its snapshots."""
+import multiprocessing
+import os
+import queue
+import time
+
+import pytest
+
+import config
+from scheduler import Scheduler, SnapshotShare
+
+TIMEOUT = 20
+
+
+@pytest.fixture
+def fork():
+    """Start ``target(*args)`` in forked processes, killed at the end of the test."""
+    context = multiprocessing.get_context("fork")
+    processes = []
+
+    def start(target, *args):
+        process = context.Process(target=target, args=args, daemon=True)
+        process.start()
+        processes.append(process)
+        return process
+
+    start.context = context
+    yield start
+    for process in processes:
+        process.kill()
+        process.join()
+
+
+def sharing_scheduler(directory, syncs=None):
+    """Scheduler whose only job, "catalog", returns the pid of the process that synced it."""
+    config.SNAPSHOT_SHARE_POLL = 0.05
+
+    def sync_catalog():
+        if syncs is not None:
+            syncs.put(os.getpid())
+        return {"synced_by": os.getpid()}
+
+    scheduler = Scheduler(share=SnapshotShare(directory))
+    scheduler.add_job("catalog", sync_catalog, 3600, jitter=0)
+    scheduler.start()
+    return scheduler
+
+
+def worker(directory, syncs, loaded, refreshed, done):
+    scheduler = sharing_scheduler(directory, syncs)
+    snapshot = scheduler.wait_for("catalog", TIMEOUT)
+    loaded.put((os.getpid(), scheduler.leader, snapshot and snapshot.data, scheduler.get_status()["catalog"]))
+
+    # Outside the leader the sync is requested from it, and waits for the new snapshot to be loaded
+    finished = scheduler.refresh(["catalog"], wait=True, timeout=TIMEOUT)
+    refreshed.put((os.getpid(), finished, scheduler.snapshot("catalog").data))
+    # Keep the leader's lock until every worker is done
+    done.wait(TIMEOUT)
+    scheduler.stop()
+
+
+def worker_until_leader(directory, loaded, leading):
+    scheduler = sharing_scheduler(directory)
+    scheduler.wait_for("catalog", TIMEOUT)
+    loaded.put((os.getpid(), scheduler.leader))
+    deadline = time.monotonic() + TIMEOUT
+    while scheduler.snapshot("catalog").data != {"synced_by": os.getpid()} and time.monotonic() < deadline:
+        time.sleep(0.05)
+    leading.put((os.getpid(), scheduler.leader, scheduler.snapshot("catalog").data))
+    time.sleep(TIMEOUT)
+
+
+def messages(results, count):
+    return [results.get(timeout=TIMEOUT) for _ in range(count)]
+
+
+def test_one_leader_syncs_and_followers_load_its_snapshots(tmp_path, fork):
+    syncs, loaded, refreshed = fork.context.Queue(), fork.context.Queue(), fork.context.Queue()
+    done = fork.context.Event()
+    for _ in range(3):
+        fork(worker, str(tmp_path), syncs, loaded, refreshed, done)
+
+    loaded = messages(loaded, 3)
+    leaders = [pid for pid, leader, _, _ in loaded if leader]
+    assert len(leaders) == 1
+    leader = leaders[0]
+    for pid, is_leader, data, status in loaded:
+        assert data == {"synced_by": leader}
+        assert status["leader"] is is_leader
+        # Followers report the leader's runs, not their own that never happen
+        assert status["last_success"] is not None
+        if not is_leader:
+            assert status["runs"] >= 1
+
+    refreshed = messages(refreshed, 3)
+    done.set()
+    assert all(finished and data == {"synced_by": leader} for _, finished, data in refreshed)
+    # Only the leader ever synced: at startup and for the requested refreshes
+    synced_by = set()
+    while True:
+        try:
+            synced_by.add(syncs.get(timeout=0.5))
+        except queue.Empty:
+            break
+    assert synced_by == {leader}
+
+
+def test_a_follower_takes_over_when_the_leader_exits(tmp_path, fork):
+    loaded, leading = fork.context.Queue(), fork.context.Queue()
+    processes = {process.pid: process for process in
+                 (fork(worker_until_leader, str(tmp_path), loaded, leading) for _ in range(2))}
+    loaded = messages(loaded, 2)
+    assert sorted(leader for _, leader in loaded) == [False, True]
+
+    (leader, is_leader, data), = messages(leading, 1)
+    assert is_leader and data == {"synced_by": leader}
+    processes[leader].kill()
+
+    # The lock is released with the leader's process, and the other one syncs for itself from then on
+    (follower, is_leader, data), = messages(leading, 1)
+    assert follower != leader
+    assert is_leader and data == {"synced_by": follower}
@@ -0,0 +1,88 @@
+import re
+from collections import namedtuple
+
+# Same ranges the emoji check has always used
+EMOJI_RANGES = (
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    "\U00002702-\U000027B0"  # Dingbats
+    "\U000024C2-\U0001F251"
+)
+PERSIAN_RANGES = "\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF"
+LATIN_RANGES = "A-Za-z\u00C0-\u024F"
+
+EMOJI_PATTERN = re.compile(f"[{EMOJI_RANGES}]")
+PERSIAN_PATTERN = re.compile(f"[{PERSIAN_RANGES}]")
+LATIN_PATTERN = re.compile(f"[{LATIN_RANGES}]")
+WORD_PATTERN = re.compile(r"\w")
+SPACE_PATTERN = re.compile(r"\s")
+DIGIT_PATTERN = re.compile(r"\d")
+
+# One marker character per class; a title is translated to markers and counted
+EMOJI, SYMBOL, WHITESPACE, DIGIT, PERSIAN, LATIN, OTHER = "eswdplo"
+
+
+def classify_char(char):
+    """Class marker of one character.
+
+    Emojis win over everything else, and symbols are the non-word,
+    non-space characters, exactly as the title emoji/symbol check defines them.
+    """
+    if EMOJI_PATTERN.match(char):
+        return EMOJI
+    if SPACE_PATTERN.match(char):
+        return WHITESPACE
+    if not WORD_PATTERN.match(char):
+        return SYMBOL
+    if DIGIT_PATTERN.match(char):
+        return DIGIT
+    if PERSIAN_PATTERN.match(char):
+        return PERSIAN
+    if LATIN_PATTERN.match(char):
+        return LATIN
+    return OTHER
+
+
+class _CharClassTable(dict):
+    """``str.translate`` table that classifies each code point the first time it is seen."""
+
+    def __missing__(self, code_point):
+        marker = self[code_point] = classify_char(chr(code_point))
+        return marker
+
+
+_CHAR_CLASSES = _CharClassTable()
+
+
+class TitleStats(namedtuple('TitleStats', 'length emojis symbols whitespace digits persian latin other')):
+    """Character counts of a product title by class."""
+    __slots__ = ()
+
+    @property
+    def has_emojis(self):
+        return self.emojis > 0
+
+    @property
+    def has_symbols(self):
+        return self.symbols > 0
+
+    @property
+    def has_symbols_or_emojis(self):
+        return self.emojis > 0 or self.symbols > 0
+
+
+def analyze_title(title):
+    """Classify every character of ``title`` in one pass and return its ``TitleStats``."""
+    markers = title.translate(_CHAR_CLASSES)
+    return TitleStats(
+        len(title),
+        markers.count(EMOJI),
+        markers.count(SYMBOL),
+        markers.count(WHITESPACE),
+        markers.count(DIGIT),
+        markers.count(PERSIAN),
+        markers.count(LATIN),
+        markers.count(OTHER)
+    )